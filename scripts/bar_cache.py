@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Memory-mapped columnar cache of bars for simulation workloads.
+
+Each (interval, ticker) is a directory of raw little-endian column files
+(key.i8, open/high/low/close.f8, volume.i8) plus meta.json with the valid row
+count. open_bars() maps them read-only, so a process can open years of minute
+bars with no copy and near-zero startup; BarArrays.between() slices by time
+with a binary search and still doesn't copy.
+
+The 1m job calls update_cache() after each insert. Rows from the first touched
+session onward are rewritten from SQLite, so appends and gap backfills both
+keep the cache equal to the database. Column files only ever grow (meta.json
+is replaced atomically after the data is written), so readers holding an old
+mapping never fault. rebuild_cache() recreates everything from SQLite.
+
+Layout: data/bar_cache/<interval>/<TICKER>/, next to stock_ticker_1m_data.db.
+
+Example:
+    from bar_cache import open_bars
+    bars = open_bars('GME')                       # 1m; '5m', '15m', '1h', '1d' also cached
+    day = bars.between('2025-06-02', '2025-06-03')
+    returns = np.diff(np.log(day.close))
+
+Rebuild from SQLite (from repo root):
+    python scripts/bar_cache.py [--intervals 1m 1d] [--tickers GME KOSS]
+"""
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+from bars_1m import DB_PATH, MARKET_TZ, NS_PER_MINUTE, bound_minute, from_epoch_minutes
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.path.join(os.path.dirname(DB_PATH), 'bar_cache')
+CACHE_INTERVALS = os.getenv('BAR_CACHE_INTERVALS', '1m,5m,15m,1h,1d').split(',')  # Kept current by the 1m job
+TABLES = {'1m': ('bars_1m', 'epoch_minute'), '5m': ('bars_5m', 'bucket'), '15m': ('bars_15m', 'bucket'),
+          '1h': ('bars_1h', 'bucket'), '1d': ('bars_1d', 'bucket')}
+COLUMNS = [('key', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8'), ('volume', '<i8')]
+
+class BarArrays:
+    """One ticker's bars as read-only NumPy columns; key is the bar start in epoch minutes (UTC)."""
+    def __init__(self, ticker: str, interval: str, key, open, high, low, close, volume):
+        self.ticker = ticker
+        self.interval = interval
+        self.key = key
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+
+    def __len__(self) -> int:
+        return len(self.key)
+
+    def between(self, start=None, end=None, tz: str = MARKET_TZ) -> 'BarArrays':
+        """Bars in [start, end) as views of the same mapping (naive bounds are read in `tz`)."""
+        lo = 0 if start is None else np.searchsorted(self.key, bound_minute(start, tz))
+        hi = len(self.key) if end is None else np.searchsorted(self.key, bound_minute(end, tz))
+        return BarArrays(self.ticker, self.interval, *(getattr(self, name)[lo:hi] for name, _ in COLUMNS))
+
+    def to_frame(self, tz: str = MARKET_TZ) -> pd.DataFrame:
+        """Copy into a read_bars()-style frame on a tz-aware index."""
+        return pd.DataFrame({'Open': self.open, 'High': self.high, 'Low': self.low, 'Close': self.close,
+                             'Volume': self.volume}, index=from_epoch_minutes(self.key, tz).rename('Datetime'))
+
+def _ticker_dir(cache_dir: str, interval: str, ticker: str) -> str:
+    return os.path.join(cache_dir, interval, ticker)
+
+def read_meta(cache_dir: str, interval: str, ticker: str) -> dict:
+    path = os.path.join(_ticker_dir(cache_dir, interval, ticker), 'meta.json')
+    if not os.path.exists(path):
+        return {'rows': 0, 'last_key': None}
+    with open(path) as f:
+        return json.load(f)
+
+def open_bars(ticker: str, interval: str = '1m', cache_dir: str = CACHE_DIR) -> BarArrays:
+    """Map one ticker's cached bars read-only; raises KeyError if it was never cached."""
+    meta = read_meta(cache_dir, interval, ticker)
+    if not meta['rows']:
+        raise KeyError(f"No cached {interval} bars for {ticker} in {cache_dir}")
+    folder = _ticker_dir(cache_dir, interval, ticker)
+    columns = [np.memmap(os.path.join(folder, f'{name}.{dtype[1:]}'), dtype=dtype, mode='r', shape=(meta['rows'],))
+               for name, dtype in COLUMNS]
+    return BarArrays(ticker, interval, *columns)
+
+def cached_tickers(interval: str = '1m', cache_dir: str = CACHE_DIR) -> list:
+    folder = os.path.join(cache_dir, interval)
+    return sorted(os.listdir(folder)) if os.path.isdir(folder) else []
+
+def _read_table(conn, interval: str, ticker: str, since: int) -> np.ndarray:
+    table, key = TABLES[interval]
+    rows = conn.execute(f'''
+    SELECT b.{key}, b.open, b.high, b.low, b.close, b.volume
+    FROM {table} b JOIN tickers t ON t.ticker_id = b.ticker_id
+    WHERE t.ticker = ? AND b.{key} >= ? ORDER BY b.{key}
+    ''', (ticker, since)).fetchall()
+    return np.array(rows, dtype=np.float64).reshape(-1, len(COLUMNS))
+
+def _write_from(cache_dir: str, interval: str, ticker: str, start_row: int, data: np.ndarray) -> int:
+    """Overwrite/append rows from start_row onward, then publish the new row count; returns rows written."""
+    folder = _ticker_dir(cache_dir, interval, ticker)
+    os.makedirs(folder, exist_ok=True)
+    for i, (name, dtype) in enumerate(COLUMNS):
+        values = data[:, i]
+        if dtype == '<i8':
+            values = np.nan_to_num(values)  # NULL volume -> 0, as in read_bars
+        path = os.path.join(folder, f'{name}.{dtype[1:]}')
+        with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+            f.seek(start_row * np.dtype(dtype).itemsize)
+            f.write(np.ascontiguousarray(values, dtype=dtype).tobytes())
+    rows = start_row + len(data)
+    meta = {'rows': rows, 'last_key': int(data[-1, 0]) if len(data) else None, 'updated_at': time.time()}
+    tmp = os.path.join(folder, 'meta.json.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(folder, 'meta.json'))
+    return len(data)
+
+def refresh_ticker(conn, ticker: str, interval: str, since: int = None, cache_dir: str = CACHE_DIR) -> int:
+    """Rewrite the cached rows with key >= since from SQLite (since=None rebuilds the ticker); returns rows written."""
+    start_row = 0
+    if since is not None:
+        meta = read_meta(cache_dir, interval, ticker)
+        if meta['rows']:
+            keys = np.memmap(os.path.join(_ticker_dir(cache_dir, interval, ticker), 'key.i8'), dtype='<i8',
+                             mode='r', shape=(meta['rows'],))
+            start_row = int(np.searchsorted(keys, since))  # Cached rows before `since` are kept as-is
+            del keys
+        else:
+            since = None
+    data = _read_table(conn, interval, ticker, -2**62 if since is None else since)
+    return _write_from(cache_dir, interval, ticker, start_row, data)
+
+def update_cache(conn, frames: list, intervals=CACHE_INTERVALS, cache_dir: str = CACHE_DIR) -> int:
+    """Bring the cache up to date for the tickers in freshly written bar frames (ticker, epoch_minute, ...)."""
+    since = {}
+    for df in frames:
+        ticker = df['ticker'].iloc[0]
+        since[ticker] = min(since.get(ticker, 2**62), int(df['epoch_minute'].min()))
+    written = 0
+    for ticker, first_minute in since.items():
+        # Rollup buckets start at or after the touched session's midnight, so refresh from there
+        day_start = int(pd.Timestamp(first_minute * NS_PER_MINUTE, tz='UTC').tz_convert(MARKET_TZ)
+                        .normalize().value // NS_PER_MINUTE)
+        for interval in intervals:
+            written += refresh_ticker(conn, ticker, interval, min(first_minute, day_start), cache_dir)
+    return written
+
+def rebuild_cache(db_path: str = DB_PATH, cache_dir: str = CACHE_DIR, intervals=CACHE_INTERVALS, tickers=None) -> int:
+    conn = sqlite3.connect(db_path)
+    tickers = tickers or [t for (t,) in conn.execute('SELECT ticker FROM tickers ORDER BY ticker')]
+    tables = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    written = 0
+    for interval in intervals:
+        if TABLES[interval][0] not in tables:
+            logger.warning(f"{TABLES[interval][0]} not found; skipping {interval} cache.")
+            continue
+        for ticker in tickers:
+            written += refresh_ticker(conn, ticker, interval, None, cache_dir)
+    conn.close()
+    return written
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    parser.add_argument('--intervals', nargs='+', default=CACHE_INTERVALS, choices=list(TABLES))
+    parser.add_argument('--tickers', nargs='+')
+    args = parser.parse_args()
+    start = time.time()
+    rows = rebuild_cache(args.db, args.cache_dir, args.intervals, args.tickers)
+    logger.info(f"Rebuilt {args.cache_dir}: {rows:,} rows across {len(args.intervals)} intervals in {time.time() - start:.1f}s")
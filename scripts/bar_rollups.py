@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Incremental 5m/15m/1h/1d OHLCV rollups of bars_1m, stored next to it in
+stock_ticker_1m_data.db (bars_5m, bars_15m, bars_1h, bars_1d).
+
+Buckets are aligned to the regular session: each day's grid starts at the
+09:30 New York open, so hourly bars are 09:30-10:30 ... 15:30-16:00, and the
+daily bar covers the whole session (to 13:00 on early-close days). Minutes
+outside the session are left out of every rollup. Each bucket keeps
+open=first, high=max, low=min, close=last, volume=sum and the number of 1m
+bars it was built from.
+
+stock_ticker_1m_pull.py calls update_rollups() after each insert, which
+rebuilds only the buckets containing the minutes just downloaded.
+get_bars() answers a request from the coarsest table that can represent it
+exactly.
+
+Example:
+    from bar_rollups import get_bars
+    df = get_bars('GME', '2025-06-02', '2025-06-07', interval='30m')  # built from bars_15m
+
+Rebuild every rollup from bars_1m (from repo root):
+    python scripts/bar_rollups.py [path/to/stock_ticker_1m_data.db]
+"""
+import logging
+import re
+import sqlite3
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from bars_1m import DB_PATH, MARKET_TZ, NS_PER_MINUTE, bound_minute, from_epoch_minutes, ticker_ids
+from database import bulk_write
+from minute_gaps import EARLY_CLOSE_MINUTES, SESSION_MINUTES, SESSION_OPEN, early_close_dates
+
+logger = logging.getLogger(__name__)
+
+DAY = 'D'  # Size marker for session (daily) buckets
+ROLLUPS = {'bars_5m': 5, 'bars_15m': 15, 'bars_1h': 60, 'bars_1d': DAY}
+OHLCV = ['Open', 'High', 'Low', 'Close', 'Volume']
+ROLLUP_VALUES = ['open', 'high', 'low', 'close', 'volume', 'bar_count']
+
+def create_rollup_schema(conn):
+    for table in ROLLUPS:
+        conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {table} (
+            ticker_id INTEGER NOT NULL,
+            bucket INTEGER NOT NULL,
+            open REAL,
+            high REAL,
+            low REAL,
+            close REAL,
+            volume INTEGER,
+            bar_count INTEGER NOT NULL,
+            PRIMARY KEY (ticker_id, bucket)
+        ) WITHOUT ROWID
+        ''')
+
+def session_bounds(minutes: np.ndarray):
+    """(open minute, session length) of the New York trading day each epoch minute falls on."""
+    local = from_epoch_minutes(minutes, MARKET_TZ)
+    codes, days = pd.factorize(local.strftime('%Y-%m-%d'))
+    opens = pd.DatetimeIndex(days + ' ' + SESSION_OPEN).tz_localize(MARKET_TZ).asi8 // NS_PER_MINUTE
+    day_dates = pd.DatetimeIndex(days).date
+    early = early_close_dates({d.year for d in day_dates})
+    lengths = np.where(np.isin(day_dates, list(early)), EARLY_CLOSE_MINUTES, SESSION_MINUTES)
+    return opens[codes], lengths[codes]
+
+def bucket_starts(minutes: np.ndarray, size) -> np.ndarray:
+    """Session-aligned bucket start for each in-session minute (-1 for minutes outside the session)."""
+    opens, lengths = session_bounds(minutes)
+    offset = minutes - opens
+    in_session = (offset >= 0) & (offset < lengths)
+    buckets = opens if size == DAY else opens + (offset // size) * size
+    return np.where(in_session, buckets, -1)
+
+def aggregate(bars: pd.DataFrame, size) -> pd.DataFrame:
+    """Roll minute bars (ticker_id, epoch_minute, OHLCV; sorted by minute per ticker) up to `size` buckets."""
+    buckets = bucket_starts(bars['epoch_minute'].to_numpy(), size)
+    bars = bars.assign(bucket=buckets)[buckets >= 0]
+    out = bars.groupby(['ticker_id', 'bucket'], sort=True).agg(
+        open=('Open', 'first'), high=('High', 'max'), low=('Low', 'min'), close=('Close', 'last'),
+        volume=('Volume', 'sum'), bar_count=('epoch_minute', 'size'))
+    return out.reset_index()
+
+def _read_minutes(conn, ticker_id: int, lo: int, hi: int) -> pd.DataFrame:
+    rows = conn.execute('''
+    SELECT ticker_id, epoch_minute, open, high, low, close, volume FROM bars_1m
+    WHERE ticker_id = ? AND epoch_minute >= ? AND epoch_minute < ? ORDER BY epoch_minute
+    ''', (ticker_id, lo, hi)).fetchall()
+    return pd.DataFrame(rows, columns=['ticker_id', 'epoch_minute', *OHLCV])
+
+def _write(conn, table: str, rollup: pd.DataFrame):
+    bulk_write(conn, table, rollup, key=['ticker_id', 'bucket'], update=ROLLUP_VALUES, commit=False)
+
+def update_rollups(conn, frames: list) -> int:
+    """Rebuild every rollup bucket containing a minute of the given bar frames (ticker, epoch_minute, ...); returns buckets written."""
+    create_rollup_schema(conn)
+    ids = ticker_ids(conn, {df['ticker'].iloc[0] for df in frames})
+    touched = {}
+    for df in frames:
+        touched.setdefault(ids[df['ticker'].iloc[0]], []).append(df['epoch_minute'].to_numpy(dtype=np.int64))
+    written = 0
+    try:
+        for ticker_id, parts in touched.items():
+            minutes = np.unique(np.concatenate(parts))
+            day_starts = bucket_starts(minutes, DAY)
+            days = np.unique(day_starts[day_starts >= 0])
+            if days.size == 0:
+                continue
+            # Whole sessions around the new minutes cover every bucket size; read them in one range scan
+            bars = _read_minutes(conn, int(ticker_id), int(days.min()), int(days.max()) + SESSION_MINUTES)
+            for table, size in ROLLUPS.items():
+                touched_buckets = np.unique(bucket_starts(minutes, size))
+                rollup = aggregate(bars, size)
+                rollup = rollup[rollup['bucket'].isin(touched_buckets)]
+                _write(conn, table, rollup)
+                written += len(rollup)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return written
+
+def rebuild_rollups(conn) -> int:
+    """Recompute every rollup table from bars_1m, one ticker at a time."""
+    create_rollup_schema(conn)
+    written = 0
+    for (ticker_id,) in conn.execute('SELECT ticker_id FROM tickers').fetchall():
+        bars = _read_minutes(conn, ticker_id, -2**62, 2**62)
+        for table, size in ROLLUPS.items():
+            conn.execute(f'DELETE FROM {table} WHERE ticker_id = ?', (ticker_id,))
+            rollup = aggregate(bars, size)
+            _write(conn, table, rollup)
+            written += len(rollup)
+        conn.commit()
+    return written
+
+def parse_interval(interval: str):
+    """'30m' -> 30, '2h' -> 120, '1d' -> DAY (multi-day intervals aren't supported)."""
+    match = re.fullmatch(r'(\d+)\s*(m|min|h|d)', interval.strip().lower())
+    if not match:
+        raise ValueError(f"Unsupported interval {interval!r}; use e.g. '5m', '30m', '1h', '1d'")
+    n, unit = int(match.group(1)), match.group(2)
+    if unit == 'd':
+        if n != 1:
+            raise ValueError("Only '1d' is supported for daily bars")
+        return DAY
+    return n * 60 if unit == 'h' else n
+
+def _aligned(minute: int, size) -> bool:
+    """True if a range bound at `minute` doesn't cut through a `size` bucket."""
+    opens, lengths = session_bounds(np.array([minute], dtype=np.int64))
+    offset = minute - opens[0]
+    if offset <= 0 or offset >= lengths[0]:
+        return True
+    return size != DAY and offset % size == 0
+
+def choose_table(size, start_minute: int = None, end_minute: int = None) -> tuple:
+    """(table, table size) of the coarsest stored bars that build `size` bars (minutes or DAY) exactly over [start, end)."""
+    candidates = [('bars_1d', DAY), ('bars_1h', 60), ('bars_15m', 15), ('bars_5m', 5), ('bars_1m', 1)]
+    for table, table_size in candidates:
+        # Intraday buckets never straddle a session, so any of them can build daily bars
+        if size != DAY and (table_size == DAY or size % table_size):
+            continue
+        if all(b is None or _aligned(b, table_size) for b in (start_minute, end_minute)):
+            return table, table_size
+    return 'bars_1m', 1
+
+def get_bars(ticker: str, start=None, end=None, interval: str = '1h', tz: str = MARKET_TZ,
+             db_path: str = DB_PATH) -> pd.DataFrame:
+    """OHLCV bars of `interval` for one ticker in [start, end), on a tz-aware index of bucket starts.
+
+    Reads the coarsest of bars_1d/1h/15m/5m/1m whose buckets tile the request, then merges them up to
+    the session-aligned `interval` grid if the table isn't already at that size.
+    """
+    size = parse_interval(interval)
+    lo = None if start is None else bound_minute(start, tz)
+    hi = None if end is None else bound_minute(end, tz)
+    table, table_size = choose_table(size, lo, hi)
+    value_cols = 'b.open, b.high, b.low, b.close, b.volume'
+    key = 'b.epoch_minute' if table == 'bars_1m' else 'b.bucket'
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute(f'''
+    SELECT {key}, {value_cols} FROM {table} b JOIN tickers t ON t.ticker_id = b.ticker_id
+    WHERE t.ticker = ? AND {key} >= ? AND {key} < ? ORDER BY {key}
+    ''', (ticker, -2**62 if lo is None else lo, 2**62 if hi is None else hi)).fetchall()
+    conn.close()
+    bars = pd.DataFrame(rows, columns=['epoch_minute', *OHLCV]).assign(ticker_id=0)
+    if table_size != size and not bars.empty:
+        bars = aggregate(bars, size).rename(columns={'bucket': 'epoch_minute', 'open': 'Open', 'high': 'High',
+                                                     'low': 'Low', 'close': 'Close', 'volume': 'Volume'})
+    index = from_epoch_minutes(bars['epoch_minute'].to_numpy(dtype=np.int64), tz).rename('Datetime')
+    df = pd.DataFrame(bars[OHLCV].to_numpy(), columns=OHLCV, index=index).astype({c: 'float64' for c in OHLCV[:4]})
+    df['Volume'] = pd.to_numeric(df['Volume']).fillna(0).astype(np.int64)
+    df.attrs['source_table'] = table
+    return df
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    db_path = sys.argv[1] if len(sys.argv) > 1 else DB_PATH
+    start = time.time()
+    conn = sqlite3.connect(db_path)
+    buckets = rebuild_rollups(conn)
+    conn.close()
+    logger.info(f"{db_path}: rebuilt {buckets:,} rollup buckets in {time.time() - start:.1f}s")
@@ -0,0 +1,148 @@
+"""
+Integer-time storage for 1-minute bars in stock_ticker_1m_data.db.
+
+bars_1m is keyed by (ticker_id, epoch_minute) in a WITHOUT ROWID table, so the
+primary key is the only index and one ticker's bars sit contiguously in time
+order. tickers maps symbols to ids. A historical_1m view keeps the old
+Datetime/ticker TEXT layout for existing queries.
+
+Example:
+    from bars_1m import read_bars
+    df = read_bars('GME', start='2025-06-02', end='2025-06-03')  # tz-aware index
+"""
+import logging
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from database import bulk_write
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = os.path.join('data', 'stock_ticker_1m_data.db')
+MARKET_TZ = 'America/New_York'
+NS_PER_MINUTE = 60_000_000_000
+
+def create_bars_schema(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS tickers (
+        ticker_id INTEGER PRIMARY KEY,
+        ticker TEXT NOT NULL UNIQUE
+    )
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS bars_1m (
+        ticker_id INTEGER NOT NULL,
+        epoch_minute INTEGER NOT NULL,
+        open REAL,
+        high REAL,
+        low REAL,
+        close REAL,
+        volume INTEGER,
+        PRIMARY KEY (ticker_id, epoch_minute)
+    ) WITHOUT ROWID
+    ''')
+    # Same columns as the old historical_1m table, so existing queries keep working
+    conn.execute('''
+    CREATE VIEW IF NOT EXISTS historical_1m AS
+    SELECT strftime('%Y-%m-%d %H:%M:%S', b.epoch_minute * 60, 'unixepoch') AS Datetime, t.ticker,
+           b.open AS Open, b.high AS High, b.low AS Low, b.close AS Close, b.volume AS Volume
+    FROM bars_1m b
+    JOIN tickers t ON t.ticker_id = b.ticker_id
+    ''')
+
+def migrate_legacy_bars(conn) -> int:
+    """Convert a TEXT-keyed historical_1m table to tickers + bars_1m in place; returns rows migrated."""
+    kind = conn.execute("SELECT type FROM sqlite_master WHERE name = 'historical_1m'").fetchone()
+    if not kind or kind[0] != 'table':
+        return 0
+    logger.warning("Legacy historical_1m table found; migrating to integer-time bars_1m.")
+    try:
+        conn.execute('DROP INDEX IF EXISTS idx_ticker_datetime')
+        conn.execute('ALTER TABLE historical_1m RENAME TO historical_1m_legacy')
+        create_bars_schema(conn)
+        conn.execute('INSERT OR IGNORE INTO tickers (ticker) SELECT DISTINCT ticker FROM historical_1m_legacy')
+        migrated = conn.execute('''
+        INSERT OR IGNORE INTO bars_1m (ticker_id, epoch_minute, open, high, low, close, volume)
+        SELECT t.ticker_id, CAST(strftime('%s', h.Datetime) AS INTEGER) / 60, h.Open, h.High, h.Low, h.Close, h.Volume
+        FROM historical_1m_legacy h
+        JOIN tickers t ON t.ticker = h.ticker
+        ORDER BY t.ticker_id, h.Datetime
+        ''').rowcount
+        conn.execute('DROP TABLE historical_1m_legacy')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    logger.info(f"Migrated {migrated:,} 1m bars to integer-time layout.")
+    return migrated
+
+def ticker_ids(conn, tickers, create: bool = False) -> dict:
+    """{ticker: ticker_id}; with create=True unknown tickers are added (no commit)."""
+    tickers = list(tickers)
+    if create:
+        conn.executemany('INSERT OR IGNORE INTO tickers (ticker) VALUES (?)', [(t,) for t in tickers])
+    placeholders = ', '.join('?' * len(tickers))
+    return dict(conn.execute(f'SELECT ticker, ticker_id FROM tickers WHERE ticker IN ({placeholders})', tickers).fetchall())
+
+def to_epoch_minutes(values) -> np.ndarray:
+    """Datetimes (naive = UTC, or tz-aware) -> int64 minutes since 1970-01-01 UTC."""
+    index = pd.DatetimeIndex(pd.to_datetime(values, utc=True))
+    return index.asi8 // NS_PER_MINUTE
+
+def from_epoch_minutes(minutes, tz: str = MARKET_TZ) -> pd.DatetimeIndex:
+    index = pd.DatetimeIndex(np.asarray(minutes, dtype=np.int64) * NS_PER_MINUTE).tz_localize('UTC')
+    return index.tz_convert(tz) if tz else index
+
+def last_minutes(conn, tickers) -> dict:
+    """{ticker: last stored epoch minute}; tickers with no bars are absent."""
+    placeholders = ', '.join('?' * len(tickers))
+    rows = conn.execute(f'''
+    SELECT t.ticker, (SELECT MAX(b.epoch_minute) FROM bars_1m b WHERE b.ticker_id = t.ticker_id)
+    FROM tickers t WHERE t.ticker IN ({placeholders})
+    ''', list(tickers)).fetchall()
+    return {t: m for t, m in rows if m is not None}
+
+def bound_minute(value, tz: str = MARKET_TZ) -> int:
+    """Epoch minute of a query bound (naive values are read in `tz`)."""
+    ts = pd.Timestamp(value)
+    ts = ts.tz_localize(tz) if ts.tzinfo is None else ts
+    return ts.value // NS_PER_MINUTE
+
+def read_bars(ticker: str, start=None, end=None, tz: str = MARKET_TZ, conn=None, db_path: str = DB_PATH) -> pd.DataFrame:
+    """OHLCV for one ticker in [start, end) as a frame on a tz-aware DatetimeIndex (naive bounds are read in `tz`)."""
+    lo = -2**62 if start is None else bound_minute(start, tz)
+    hi = 2**62 if end is None else bound_minute(end, tz)
+    own = conn is None
+    conn = conn or sqlite3.connect(db_path)
+    rows = conn.execute('''
+    SELECT b.epoch_minute, b.open, b.high, b.low, b.close, b.volume
+    FROM bars_1m b JOIN tickers t ON t.ticker_id = b.ticker_id
+    WHERE t.ticker = ? AND b.epoch_minute >= ? AND b.epoch_minute < ?
+    ORDER BY b.epoch_minute
+    ''', (ticker, lo, hi)).fetchall()
+    if own:
+        conn.close()
+    data = np.array(rows, dtype=np.float64).reshape(-1, 6)
+    df = pd.DataFrame(data[:, 1:], columns=['Open', 'High', 'Low', 'Close', 'Volume'],
+                      index=from_epoch_minutes(data[:, 0].astype(np.int64), tz).rename('Datetime'))
+    df['Volume'] = df['Volume'].fillna(0).astype(np.int64)
+    return df
+
+def write_bars(conn, frames: list) -> int:
+    """Insert per-ticker frames (ticker, epoch_minute, OHLCV) in one transaction; returns rows actually inserted."""
+    if not frames:
+        return 0
+    try:
+        ids = ticker_ids(conn, {df['ticker'].iloc[0] for df in frames}, create=True)  # Committed with the bars
+        bars = pd.concat([
+            df[['epoch_minute', 'Open', 'High', 'Low', 'Close', 'Volume']].assign(ticker_id=ids[df['ticker'].iloc[0]])
+            for df in frames
+        ], ignore_index=True)
+    except Exception:
+        conn.rollback()
+        raise
+    bars = bars[['ticker_id', 'epoch_minute', 'Open', 'High', 'Low', 'Close', 'Volume']].rename(columns=str.lower)
+    return bulk_write(conn, 'bars_1m', bars, key=['ticker_id', 'epoch_minute'])
\ No newline at end of file
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Benchmark the 1m bar job offline: per-ticker sequential downloads (the old loop)
+vs batched downloads on a worker pool, for growing ticker counts. yf.download is
+replaced by a stub that returns a yfinance-shaped multi-index frame after a
+fixed per-call latency plus a small per-ticker cost.
+
+Usage (from repo root): python scripts/bench_1m_pull.py [--tickers 2 50 500] [--latency 0.3]
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+import stock_ticker_1m_pull as pull
+
+def make_stub(latency: float, per_ticker: float, minutes: int):
+    """Downloader stand-in: sleeps like a network call, returns one day of bars per ticker."""
+    def stub(tickers, start, end):
+        time.sleep(latency + per_ticker * len(tickers))
+        index = pd.date_range(end=pd.Timestamp(end).floor('min'), periods=minutes, freq='min', name='Datetime')
+        fields = ['Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']
+        columns = pd.MultiIndex.from_product([tickers, fields], names=['Ticker', 'Price'])
+        values = np.random.default_rng(len(tickers)).uniform(1, 100, (len(index), len(columns)))
+        return pd.DataFrame(values, index=index, columns=columns)
+    return stub
+
+def timed_run(tickers, stub, workers, batch_size, now_utc):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench_1m.db')
+        start = time.perf_counter()
+        rows, errors, batches = pull.run(tickers, db_path, stub, workers=workers, batch_size=batch_size,
+                                         max_rps=0, now_utc=now_utc)
+        return time.perf_counter() - start, rows, batches
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tickers', type=int, nargs='+', default=[2, 10, 50, 100, 500])
+    parser.add_argument('--latency', type=float, default=0.3, help='Seconds per download call')
+    parser.add_argument('--per-ticker', type=float, default=0.005, help='Extra seconds per ticker in a call')
+    parser.add_argument('--minutes', type=int, default=390, help='Bars per ticker returned by the stub')
+    parser.add_argument('--workers', type=int, default=pull.YF_WORKERS)
+    parser.add_argument('--batch-size', type=int, default=pull.YF_BATCH_SIZE)
+    args = parser.parse_args()
+    stub = make_stub(args.latency, args.per_ticker, args.minutes)
+    now_utc = datetime.now(timezone.utc) - timedelta(days=1)
+    print(f"{'tickers':>8} {'sequential':>12} {'batched':>10} {'speedup':>8} {'batches':>8} {'rows':>10}")
+    for n in args.tickers:
+        tickers = [f"T{i:04d}" for i in range(n)]
+        seq, seq_rows, _ = timed_run(tickers, stub, 1, 1, now_utc)
+        bat, bat_rows, batches = timed_run(tickers, stub, args.workers, args.batch_size, now_utc)
+        assert seq_rows == bat_rows, "Row counts differ"
+        print(f"{n:8d} {seq:11.2f}s {bat:9.2f}s {seq / bat:7.1f}x {batches:8d} {bat_rows:10,d}")
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Benchmark database.bulk_write against the write paths it replaced, on a
+bars_1m-shaped table (ticker_id, epoch_minute, OHLCV; WITHOUT ROWID) in a
+scratch database file:
+
+  to_sql multi   COUNT(*) + DataFrame.to_sql(method='multi') + COUNT(*), the old
+                 insert_data (chunked so it stays under SQLite's bound-variable limit);
+                 a batch holding any stored key fails as a whole
+  itertuples     .astype(object).where(notna) + executemany INSERT OR IGNORE, the
+                 per-module pattern (bars_1m, ftd/options stages, historical)
+  bulk_write     fresh insert, a re-run where every key conflicts, and an upsert
+                 that rewrites every row
+
+Every strategy must leave the same rows behind.
+
+Usage (from repo root): python scripts/bench_bulk_write.py [--rows 1000000] [--db /tmp/bench_bulk.db]
+"""
+import argparse
+import os
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+from database import bulk_write
+
+SCHEMA = '''
+CREATE TABLE bars (
+    ticker_id INTEGER NOT NULL,
+    epoch_minute INTEGER NOT NULL,
+    open REAL, high REAL, low REAL, close REAL,
+    volume INTEGER,
+    PRIMARY KEY (ticker_id, epoch_minute)
+) WITHOUT ROWID
+'''
+
+def make_bars(rows: int, seed: int = 7) -> pd.DataFrame:
+    """`rows` minute bars over 20 tickers, ~1% NaN prices (NULLs must round-trip)."""
+    rng = np.random.default_rng(seed)
+    per = -(-rows // 20)
+    df = pd.DataFrame({
+        'ticker_id': np.repeat(np.arange(1, 21), per)[:rows],
+        'epoch_minute': np.tile(np.arange(29_000_000, 29_000_000 + per), 20)[:rows],
+    })
+    for col in ('open', 'high', 'low', 'close'):
+        values = rng.uniform(5, 50, rows).round(4)
+        values[rng.random(rows) < 0.01] = np.nan
+        df[col] = values
+    df['volume'] = rng.integers(0, 100_000, rows)
+    return df
+
+def fresh(db_path: str):
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    conn = sqlite3.connect(db_path)
+    conn.execute(SCHEMA)
+    return conn
+
+def to_sql_multi(conn, df) -> int:
+    pre = conn.execute('SELECT COUNT(*) FROM bars').fetchone()[0]
+    df.to_sql('bars', conn, if_exists='append', index=False, method='multi', chunksize=32766 // len(df.columns))
+    conn.commit()
+    return conn.execute('SELECT COUNT(*) FROM bars').fetchone()[0] - pre
+
+def itertuples(conn, df) -> int:
+    before = conn.total_changes
+    out = df.astype(object).where(df.notna(), None)
+    conn.executemany('INSERT OR IGNORE INTO bars VALUES (?, ?, ?, ?, ?, ?, ?)', out.itertuples(index=False, name=None))
+    conn.commit()
+    return conn.total_changes - before
+
+def timed(label: str, fn, rows: int):
+    start = time.perf_counter()
+    changed = fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:28s} {elapsed:8.2f}s {rows / elapsed / 1e3:9.0f}k rows/s  changes {changed:,}")
+    return elapsed
+
+def snapshot(conn) -> pd.DataFrame:
+    return pd.read_sql_query('SELECT * FROM bars ORDER BY ticker_id, epoch_minute', conn)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--db', default=os.path.join('data', 'bench_bulk_write.db'))
+    args = parser.parse_args()
+    df = make_bars(args.rows)
+    n = len(df)
+    print(f"{n:,} rows, {len(df.columns)} columns -> {args.db}\n")
+
+    conn = fresh(args.db)
+    legacy = timed('to_sql multi + COUNT(*)', lambda: to_sql_multi(conn, df), n)
+    expected = snapshot(conn)
+    try:
+        to_sql_multi(conn, df.iloc[-1000:])
+    except sqlite3.IntegrityError as e:
+        conn.rollback()
+        print(f"{'to_sql multi re-run':28s} fails: {e}")
+    conn.close()
+
+    conn = fresh(args.db)
+    rowwise = timed('itertuples executemany', lambda: itertuples(conn, df), n)
+    pd.testing.assert_frame_equal(snapshot(conn), expected)
+    conn.close()
+
+    conn = fresh(args.db)
+    bulk = timed('bulk_write insert', lambda: bulk_write(conn, 'bars', df), n)
+    pd.testing.assert_frame_equal(snapshot(conn), expected)
+    timed('bulk_write re-run (no-op)', lambda: bulk_write(conn, 'bars', df, key=['ticker_id', 'epoch_minute']), n)
+    timed('bulk_write upsert (all rows)', lambda: bulk_write(
+        conn, 'bars', df, key=['ticker_id', 'epoch_minute'], update=['open', 'high', 'low', 'close', 'volume']), n)
+    pd.testing.assert_frame_equal(snapshot(conn), expected)
+    conn.close()
+    os.remove(args.db)
+    print(f"\nResults identical; bulk_write insert time vs to_sql multi {bulk / legacy:.2f}x, "
+          f"vs itertuples {bulk / rowwise:.2f}x")
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark ETF shares-outstanding extraction: full BeautifulSoup parse vs the
+regex fast path, reporting parse time and peak Python memory (tracemalloc) per
+page. Every page must give the same value from both extractors.
+
+Pages come from --pages (a directory of saved profile pages, e.g. collected with
+ETF_PAGE_DIR=data/etf_pages during a normal pull); without it, synthetic pages
+shaped like MarketChameleon's ETF profile (scripts, navigation, several stat
+tables, with the label in a few markup variants) are generated.
+
+Usage (from repo root): python scripts/bench_etf_parse.py [--pages data/etf_pages] [--synthetic 20] [--repeat 3]
+"""
+import argparse
+import glob
+import os
+import random
+import time
+import tracemalloc
+
+from etf_data_pull import fast_shares_outstanding, parse_shares_outstanding, soup_shares_outstanding
+
+LABEL_VARIANTS = [
+    '<td class="label">Shares Outstanding:</td><td class="value">{v}</td>',
+    '<td><b>Shares Outstanding:</b></td>\n    <td>{v}</td>',
+    '<td>Shares Outstanding: </td><td><span class="num">{v}</span></td>',
+    '<div class="stat">Shares Outstanding: {v}</div>',
+    '',  # Label missing: both extractors must return None
+]
+
+def make_page(i: int, rng: random.Random) -> str:
+    """~250 KB page: script blobs, nav, stat tables and one shares-outstanding variant."""
+    value = f"{rng.randint(1_000_000, 900_000_000):,}"
+    script = '<script>var d=' + ','.join(str(rng.random()) for _ in range(2000)) + ';</script>\n'
+    nav = '<ul>' + ''.join(f'<li><a href="/Overview/T{j}">T{j}</a></li>' for j in range(400)) + '</ul>\n'
+    rows = ''.join(f'<tr><td>Stat {j}:</td><td>{rng.randint(0, 10**6):,}</td></tr>' for j in range(300))
+    label = LABEL_VARIANTS[i % len(LABEL_VARIANTS)].format(v=value)
+    tables = f'<table>{rows}</table><table><tr>{label}</tr>{rows}</table><table>{rows}</table>\n'
+    return f'<html><head>{script * 3}</head><body>{nav}{tables}{script * 2}</body></html>'
+
+def measure(fn, html: str, repeat: int):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(html)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    fn(html)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', help='Directory of saved .html pages')
+    parser.add_argument('--synthetic', type=int, default=20, help='Synthetic pages when --pages is not given')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    if args.pages:
+        paths = sorted(glob.glob(os.path.join(args.pages, '*.html')))
+        pages = {}
+        for path in paths:
+            with open(path, encoding='utf-8', errors='replace') as f:
+                pages[os.path.basename(path)] = f.read()
+    else:
+        rng = random.Random(7)
+        pages = {f'synthetic_{i:03d}': make_page(i, rng) for i in range(args.synthetic)}
+    totals = {'soup': [0.0, 0], 'fast': [0.0, 0]}
+    fallbacks = 0
+    print(f"{'page':24s} {'KB':>6s} {'soup ms':>9s} {'soup MB':>8s} {'fast ms':>8s} {'fast KB':>8s}  value")
+    for name, html in pages.items():
+        expected = soup_shares_outstanding(html)
+        assert parse_shares_outstanding(html) == expected, f"{name}: extractors disagree"
+        fallbacks += fast_shares_outstanding(html) is None
+        soup_t, soup_mem = measure(soup_shares_outstanding, html, args.repeat)
+        fast_t, fast_mem = measure(fast_shares_outstanding, html, args.repeat)
+        for key, t, mem in (('soup', soup_t, soup_mem), ('fast', fast_t, fast_mem)):
+            totals[key][0] += t
+            totals[key][1] = max(totals[key][1], mem)
+        print(f"{name[:24]:24s} {len(html) / 1024:6.0f} {soup_t * 1e3:9.1f} {soup_mem / 2**20:8.1f} "
+              f"{fast_t * 1e3:8.3f} {fast_mem / 1024:8.1f}  {expected}")
+    soup_total, fast_total = totals['soup'][0], totals['fast'][0]
+    print(f"\n{len(pages)} pages, results identical; {fallbacks} needed the soup fallback")
+    print(f"soup {soup_total:.3f}s (peak {totals['soup'][1] / 2**20:.1f} MB)  "
+          f"fast {fast_total:.4f}s (peak {totals['fast'][1] / 1024:.1f} KB)  speedup {soup_total / fast_total:.0f}x")
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Benchmark FTD half-month parsing: legacy in-memory path vs streaming chunked path.
+Each (file, method) run happens in a fresh process so peak RSS is not shared.
+
+Usage (from repo root, like the other scripts):
+    python scripts/bench_ftd_parse.py data/cnsfails202401a.zip ...   # real SEC ZIPs
+    python scripts/bench_ftd_parse.py --synthetic 80000              # generated half-month
+"""
+import argparse
+import io
+import multiprocessing as mp
+import os
+import random
+import resource
+import tempfile
+import time
+import zipfile
+
+def make_synthetic_zip(path: str, rows: int):
+    """Write a ZIP shaped like cnsfailsYYYYMMx.zip (header, pipe rows, trailer)."""
+    rng = random.Random(42)
+    lines = ['SETTLEMENT DATE|CUSIP|SYMBOL|QUANTITY (FAILS)|DESCRIPTION|PRICE']
+    for i in range(rows):
+        day = 1 + i % 15
+        sym = f"S{rng.randrange(12000):05d}"
+        lines.append(f"202401{day:02d}|{rng.randrange(10**9):09d}|{sym}|{rng.randrange(1, 10**6)}|"
+                     f"{sym} CORP COM NEW CLASS A|{rng.uniform(0.01, 500):.2f}")
+    lines.append(f"Trailer record count {rows}")
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as z:
+        z.writestr('cnsfails202401a.txt', '\n'.join(lines).encode('utf-8'))
+
+def legacy_parse(content: bytes):
+    """Pre-streaming path: resp.content -> BytesIO -> f.read() -> str -> StringIO -> read_csv."""
+    import pandas as pd
+    with zipfile.ZipFile(io.BytesIO(content)) as z:
+        with z.open(z.namelist()[0]) as f:
+            df = pd.read_csv(io.StringIO(f.read().decode('utf-8-sig')), sep='|', header=None,
+                             names=['settlement_date', 'cusip', 'symbol', 'quantity', 'description', 'price'],
+                             dtype=str, on_bad_lines='skip')
+    df['date'] = pd.to_datetime(df['settlement_date'], format='%Y%m%d', errors='coerce').dt.strftime('%Y-%m-%d')
+    df = df.dropna(subset=['date'])
+    df['quantity'] = pd.to_numeric(df['quantity'], errors='coerce').astype('Int64')
+    df['price'] = pd.to_numeric(df['price'], errors='coerce')
+    for col in ('symbol', 'cusip', 'description'):
+        df[col] = df[col].str.strip()
+    return df.dropna(subset=['symbol']).drop_duplicates(subset=['date', 'symbol'])
+
+def run_one(path: str, method: str, out):
+    from ftd_data_pull import parse_ftd_zip, DOWNLOAD_SPOOL_BYTES
+    base_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    if method == 'legacy':
+        with open(path, 'rb') as fh:
+            content = fh.read()  # Stands in for resp.content
+        rows = len(legacy_parse(content))
+    else:
+        with open(path, 'rb') as fh, tempfile.SpooledTemporaryFile(max_size=DOWNLOAD_SPOOL_BYTES) as buf:
+            for block in iter(lambda: fh.read(256 * 1024), b''):  # Stands in for resp.iter_content
+                buf.write(block)
+            buf.seek(0)
+            rows = len(parse_ftd_zip(buf, os.path.basename(path)))
+    elapsed = time.perf_counter() - start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    out.put((rows, elapsed, base_rss, peak_rss))
+
+def measure(path: str, method: str):
+    ctx = mp.get_context('spawn')
+    q = ctx.Queue()
+    p = ctx.Process(target=run_one, args=(path, method, q))
+    p.start()
+    result = q.get()
+    p.join()
+    return result
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('zips', nargs='*', help='Half-month ZIP files to parse')
+    parser.add_argument('--synthetic', type=int, default=0, help='Generate a synthetic half-month with N rows')
+    args = parser.parse_args()
+    paths = list(args.zips)
+    tmpdir = tempfile.TemporaryDirectory()
+    if args.synthetic or not paths:
+        synth = os.path.join(tmpdir.name, 'cnsfails_synthetic.zip')
+        make_synthetic_zip(synth, args.synthetic or 80_000)
+        paths.append(synth)
+    print(f"{'file':32s} {'method':10s} {'rows':>8s} {'time_s':>8s} {'peak_rss_mb':>12s} {'parse_rss_mb':>13s}")
+    for path in paths:
+        size_mb = os.path.getsize(path) / 1e6
+        for method in ('legacy', 'streaming'):
+            rows, elapsed, base_rss, peak_rss = measure(path, method)
+            print(f"{os.path.basename(path)[:32]:32s} {method:10s} {rows:8d} {elapsed:8.3f} "
+                  f"{peak_rss / 1024:12.1f} {(peak_rss - base_rss) / 1024:13.1f}")
+        print(f"  (zip size {size_mb:.1f} MB)")
+    tmpdir.cleanup()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark OCC series-search parsing: legacy per-line loop vs vectorized parse_series_text.
+Builds a synthetic series file (default 100k lines), checks both parsers agree, and reports
+throughput.
+
+Usage (from repo root): python scripts/bench_occ_parse.py [--lines 100000] [--repeat 3]
+"""
+import argparse
+import random
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from occ_series_fetcher import parse_series_text
+
+def make_series_text(lines: int, symbol: str = 'GME') -> str:
+    """Header + series rows shaped like OCC's response, with a few irregular/noise lines."""
+    rng = random.Random(7)
+    out = [f"Series Search Results for {symbol}",
+           "ProductSymbol year Month Day Integer Dec C P Call Put Position Limit"]
+    for i in range(lines - 2):
+        root = symbol if rng.random() < 0.9 else f"{symbol}1"
+        fields = [root, str(rng.choice([2025, 2026, 2027])), str(rng.randint(1, 12)), str(rng.randint(1, 28)),
+                  str(rng.randint(1, 400)), rng.choice(['0', '500', '250']), 'C', 'P',
+                  str(rng.choice([0, rng.randint(1, 90000)])), str(rng.choice([0, rng.randint(1, 90000)])), '250000']
+        if i % 5000 == 4999:
+            fields.append('EXTRA')  # Irregular: logged and skipped by both parsers
+        out.append('   '.join(fields))
+    return '\n'.join(out)
+
+def legacy_parse(text: str) -> pd.DataFrame:
+    """Pre-vectorization parser from OCCSeriesFetcher.fetch (11-field rows only; see commit notes)."""
+    data_rows = []
+    missed_lines = []
+    for line in text.splitlines():
+        fields = line.split()
+        if len(fields) < 10 or not fields[0].startswith('GME'):
+            continue
+        if len(fields) == 11 and fields[6] == 'C' and fields[7] == 'P':
+            data_rows.append(fields)
+        else:
+            missed_lines.append(line)
+    df_raw = pd.DataFrame(data_rows, columns=['ProductSymbol', 'year', 'Month', 'Day', 'Integer', 'Dec',
+                                              'C_indicator', 'P_indicator', 'call_oi', 'put_oi', 'limit'])
+    df_raw['Integer'] = pd.to_numeric(df_raw['Integer'], errors='coerce')
+    df_raw['Dec'] = df_raw['Dec'].astype(str).str.zfill(3)
+    df_raw['call_oi'] = pd.to_numeric(df_raw['call_oi'], errors='coerce').fillna(0).astype(int)
+    df_raw['put_oi'] = pd.to_numeric(df_raw['put_oi'], errors='coerce').fillna(0).astype(int)
+    df_raw['strike_price'] = df_raw['Integer'] + pd.to_numeric('0.' + df_raw['Dec'])
+    df_raw['expiration_date'] = (df_raw['year'].astype(str) + '-' + df_raw['Month'].astype(str).str.zfill(2) + '-' +
+                                 df_raw['Day'].astype(str).str.zfill(2))
+    frames = []
+    for side, col in (('C', 'call_oi'), ('P', 'put_oi')):
+        part = df_raw[df_raw[col] > 0].copy()
+        part['put_call'] = side
+        part['open_interest'] = part[col]
+        part['contract_symbol'] = (part['ProductSymbol'].astype(str) + part['year'].astype(str) +
+                                   part['Month'].astype(str).str.zfill(2) + part['Day'].astype(str).str.zfill(2) +
+                                   side + part['Integer'].astype(str).str.zfill(5) + part['Dec'] + '00')
+        frames.append(part)
+    df = pd.concat(frames, ignore_index=True)
+    df['date'] = datetime.now().strftime('%Y-%m-%d')
+    return df[['date', 'contract_symbol', 'put_call', 'strike_price', 'expiration_date', 'open_interest']]
+
+def best_of(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lines', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    text = make_series_text(args.lines)
+    body = text.encode()
+    cols = ['date', 'contract_symbol', 'put_call', 'strike_price', 'expiration_date', 'open_interest']
+    legacy = legacy_parse(text)
+    vectorized = parse_series_text(body)[cols]
+    assert legacy.equals(vectorized), "Parsers disagree"
+    print(f"{args.lines:,} lines -> {len(vectorized):,} contracts (outputs identical)")
+    for name, fn in (('legacy', lambda: legacy_parse(text)), ('vectorized', lambda: parse_series_text(body))):
+        t = best_of(fn, args.repeat)
+        print(f"{name:12s} {t:8.3f}s  {args.lines / t / 1e3:10.0f}k lines/s")
@@ -1,63 +1,261 @@
 import sqlite3
+import numpy as np
 import pandas as pd
 from datetime import datetime
 import logging
 import os  # Add this line!
+from options_rollups import create_rollup_schema, write_expiry_stats
 
 DB_PATH = os.path.join('data', 'gme_data.db')
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+BULK_CHUNK_ROWS = int(os.getenv('BULK_CHUNK_ROWS', '100000'))  # Rows converted to Python objects at a time
+BULK_ROWS_PER_STATEMENT = 500  # Rows bound per prepared INSERT (capped by SQLite's variable limit)
 logger = logging.getLogger(__name__)
 
-def init_db(drop_table=False):  # Make DROP optional (default False for prod)
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    if drop_table:
-        logger.warning("Dropping table for fresh init (use sparingly).")
-        cursor.execute('DROP TABLE IF EXISTS options_data')
-    else:
-        logger.info("Initializing DB (no drop).")
-    # Schema (unchanged)
+# Days since 1970-01-01 <-> ISO date, for the integer date key of options_facts
+DATE_ORDINAL_SQL = "CAST(julianday({col}) - 2440587.5 AS INTEGER)"
+
+def create_options_schema(cursor):
+    """Create the integer-keyed options layout: contracts dimension, per-(ticker, date) loads, slim facts, compat view."""
+    # Everything fixed by the OSI symbol lives here once per contract
     cursor.execute('''
-    CREATE TABLE IF NOT EXISTS options_data (
-        date TEXT NOT NULL,
+    CREATE TABLE IF NOT EXISTS option_contracts (
+        contract_id INTEGER PRIMARY KEY,
         ticker TEXT NOT NULL,
-        contract_symbol TEXT,
+        contract_symbol TEXT NOT NULL,
         put_call TEXT,
         strike_price REAL,
         expiration_date TEXT,
+        UNIQUE(ticker, contract_symbol)
+    )
+    ''')
+    # One row per ticker per pulled date; carries the per-batch source and ingest time
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS options_loads (
+        load_id INTEGER PRIMARY KEY,
+        ticker TEXT NOT NULL,
+        date TEXT NOT NULL,
+        date_ordinal INTEGER NOT NULL,
+        source TEXT NOT NULL,
+        row_count INTEGER NOT NULL DEFAULT 0,
+        ingest_timestamp TEXT NOT NULL,
+        UNIQUE(ticker, date)
+    )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_options_loads_ordinal ON options_loads (date_ordinal, ticker)')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS options_facts (
+        date_ordinal INTEGER NOT NULL,
+        contract_id INTEGER NOT NULL,
         open_interest INTEGER,
         volume INTEGER,
         last_price REAL,
         bid REAL,
         ask REAL,
-        source TEXT NOT NULL,
-        ingest_timestamp TEXT NOT NULL,
-        UNIQUE(date, ticker, contract_symbol)
-    )
+        PRIMARY KEY (date_ordinal, contract_id)
+    ) WITHOUT ROWID
+    ''')
+    # Same columns as the old options_data table, so existing queries keep working
+    cursor.execute('''
+    CREATE VIEW IF NOT EXISTS options_data AS
+    SELECT l.date, c.ticker, c.contract_symbol, c.put_call, c.strike_price, c.expiration_date, f.open_interest,
+           f.volume, f.last_price, f.bid, f.ask, l.source, l.ingest_timestamp
+    FROM options_facts f
+    JOIN option_contracts c ON c.contract_id = f.contract_id
+    JOIN options_loads l ON l.date_ordinal = f.date_ordinal AND l.ticker = c.ticker
     ''')
-    # Index (unchanged)
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_options_date_ticker ON options_data (date, ticker)')
+
+def migrate_legacy_options(conn) -> int:
+    """Convert a flat options_data table to the contracts/loads/facts layout in place; returns rows migrated."""
+    cursor = conn.cursor()
+    kind = cursor.execute("SELECT type FROM sqlite_master WHERE name = 'options_data'").fetchone()
+    if not kind or kind[0] != 'table':
+        return 0
+    logger.warning("Legacy options_data table found; migrating to integer-keyed contract layout.")
+    try:
+        cursor.execute('DROP INDEX IF EXISTS idx_options_date_ticker')
+        cursor.execute('ALTER TABLE options_data RENAME TO options_data_legacy')
+        create_options_schema(cursor)
+        cursor.execute(f'''
+        INSERT OR IGNORE INTO options_loads (ticker, date, date_ordinal, source, row_count, ingest_timestamp)
+        SELECT ticker, date, {DATE_ORDINAL_SQL.format(col='date')}, MIN(source), COUNT(*), MIN(ingest_timestamp)
+        FROM options_data_legacy GROUP BY ticker, date
+        ''')
+        cursor.execute('''
+        INSERT OR IGNORE INTO option_contracts (ticker, contract_symbol, put_call, strike_price, expiration_date)
+        SELECT ticker, contract_symbol, put_call, strike_price, expiration_date
+        FROM options_data_legacy WHERE contract_symbol IS NOT NULL GROUP BY ticker, contract_symbol
+        ''')
+        migrated = cursor.execute(f'''
+        INSERT OR IGNORE INTO options_facts (date_ordinal, contract_id, open_interest, volume, last_price, bid, ask)
+        SELECT {DATE_ORDINAL_SQL.format(col='d.date')}, c.contract_id, d.open_interest, d.volume, d.last_price, d.bid, d.ask
+        FROM options_data_legacy d
+        JOIN option_contracts c ON c.ticker = d.ticker AND c.contract_symbol = d.contract_symbol
+        ''').rowcount
+        cursor.execute('DROP TABLE options_data_legacy')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    logger.info(f"Migrated {migrated:,} options rows to integer-keyed contract layout.")
+    return migrated
+
+def init_db(drop_table=False):  # Make DROP optional (default False for prod)
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    if drop_table:
+        logger.warning("Dropping table for fresh init (use sparingly).")
+        kind = cursor.execute("SELECT type FROM sqlite_master WHERE name = 'options_data'").fetchone()
+        if kind:
+            cursor.execute(f"DROP {kind[0].upper()} options_data")  # View now; a table on a legacy DB
+        cursor.execute('DROP TABLE IF EXISTS options_facts')
+        cursor.execute('DROP TABLE IF EXISTS option_contracts')
+        cursor.execute('DROP TABLE IF EXISTS options_loads')
+    else:
+        logger.info("Initializing DB (no drop).")
+    migrate_legacy_options(conn)
+    create_options_schema(cursor)
+    create_rollup_schema(cursor)
     conn.commit()
     conn.close()
     logger.info("DB initialized.")
 
-def get_last_date(table: str, conn) -> str:
-    df = pd.read_sql(f"SELECT MAX(date) FROM {table}", conn)
+def get_last_date(table: str, conn, ticker: str = None) -> str:
+    """Max date in table, optionally for one ticker (multi-underlying tables need the per-ticker value)."""
+    if ticker is None:
+        df = pd.read_sql(f"SELECT MAX(date) FROM {table}", conn)
+    else:
+        df = pd.read_sql(f"SELECT MAX(date) FROM {table} WHERE ticker = ?", conn, params=(ticker,))
     last = df.iloc[0, 0] if not df.empty and pd.notna(df.iloc[0, 0]) else '1900-01-01'
-    logger.debug(f"Last date in {table}: {last}")
+    logger.debug(f"Last date in {table}{f' for {ticker}' if ticker else ''}: {last}")
     return last
 
+def _bind_block(df: pd.DataFrame) -> np.ndarray:
+    """df as a 2-D object array sqlite3 can bind: NaN/NaT/pd.NA -> None, datetimes as 'YYYY-MM-DD HH:MM:SS' text."""
+    block = np.empty(df.shape, dtype=object)
+    for i, name in enumerate(df.columns):
+        col = df[name]
+        if pd.api.types.is_datetime64_any_dtype(col):
+            col = col.dt.strftime('%Y-%m-%d %H:%M:%S')  # Same text to_sql stored
+        values = col.to_numpy(dtype=object)
+        missing = pd.isna(values)
+        if missing.any():
+            values[missing] = None
+        block[:, i] = values
+    return block
+
+def _max_variables(conn) -> int:
+    try:
+        return conn.getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER)
+    except AttributeError:  # Python < 3.11; 999 is SQLite's smallest default
+        return 999
+
+def bulk_write(conn, table: str, df: pd.DataFrame, key=None, update=None, commit: bool = True,
+               chunk_rows: int = BULK_CHUNK_ROWS) -> int:
+    """Write df's columns into table with prepared INSERT ... ON CONFLICT statements, in a single transaction.
+
+    Rows whose key already exists are skipped, or, if `update` lists columns, have those columns
+    overwritten from the new row (upsert; needs `key`, the conflict target). Returns changes() for the
+    write: rows inserted, plus rows updated when upserting. commit=False leaves the transaction open
+    for callers that write several tables atomically; on error it is rolled back either way.
+    """
+    if df.empty:
+        return 0
+    if update and not key:
+        raise ValueError("bulk_write: update columns need a key (conflict target)")
+    quote = lambda c: '"' + c.replace('"', '""') + '"'  # Column names like "Adj Close"
+    width = len(df.columns)
+    target = f"({', '.join(map(quote, key))})" if key else ''
+    action = ('DO UPDATE SET ' + ', '.join(f'{quote(c)} = excluded.{quote(c)}' for c in update)) if update else 'DO NOTHING'
+    row = f"({', '.join('?' * width)})"
+    # Several rows per statement: one sqlite3 step per block instead of per row
+    per_statement = max(1, min(BULK_ROWS_PER_STATEMENT, _max_variables(conn) // width))
+    head = f"INSERT INTO {table} ({', '.join(map(quote, df.columns))}) VALUES "
+    tail = f" ON CONFLICT{target} {action}"
+    block_sql, row_sql = head + ', '.join([row] * per_statement) + tail, head + row + tail
+    before = conn.total_changes
+    try:
+        for start in range(0, len(df), chunk_rows):
+            block = _bind_block(df.iloc[start:start + chunk_rows])
+            full = len(block) // per_statement * per_statement
+            if full:
+                conn.executemany(block_sql, block[:full].reshape(-1, per_statement * width).tolist())
+            if full < len(block):
+                conn.executemany(row_sql, block[full:].tolist())
+        if commit:
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return conn.total_changes - before
+
 def insert_data(df: pd.DataFrame, table: str, conn):
     if df.empty:
         logger.warning(f"Empty DataFrame for {table}, skipping insert.")
-        return
+        return 0
+    if table == 'options_data':
+        return insert_options_data(df, conn)  # A view over the contract layout; write its base tables
     try:
-        pre_count = pd.read_sql(f"SELECT COUNT(*) FROM {table}", conn).iloc[0, 0]
-        df.to_sql(table, conn, if_exists='append', index=False, method='multi')  # 'multi' for batch efficiency
-        post_count = pd.read_sql(f"SELECT COUNT(*) FROM {table}", conn).iloc[0, 0]
-        inserted = post_count - pre_count
-        logger.info(f"{table}: Attempted {len(df)} rows; {inserted} actually inserted (upserts handled by UNIQUE).")
-        conn.commit()
+        inserted = bulk_write(conn, table, df)
+        logger.info(f"{table}: Attempted {len(df)} rows; {inserted} actually inserted (duplicates ignored).")
+        return inserted
     except Exception as e:
         logger.error(f"Insert failed for {table}: {e}")
         conn.rollback()
+        return 0
+
+def insert_options_data(df: pd.DataFrame, conn) -> int:
+    """Write normalized OCC rows to options_loads/option_contracts/options_facts in one transaction; returns rows inserted.
+
+    Contract ids are assigned here at ingest (new OSI symbols get the next id); rows already stored for
+    the same (date, contract) are ignored, as the old UNIQUE(date, ticker, contract_symbol) did.
+    """
+    cols = ['date', 'ticker', 'contract_symbol', 'put_call', 'strike_price', 'expiration_date',
+            'open_interest', 'volume', 'last_price', 'bid', 'ask', 'source', 'ingest_timestamp']
+    out = df.reindex(columns=cols)
+    out = out.assign(ingest_timestamp=out['ingest_timestamp'].map(str))
+    try:
+        conn.execute('''
+        CREATE TEMP TABLE IF NOT EXISTS options_stage (
+            date TEXT, ticker TEXT, contract_symbol TEXT, put_call TEXT, strike_price REAL, expiration_date TEXT,
+            open_interest INTEGER, volume INTEGER, last_price REAL, bid REAL, ask REAL, source TEXT, ingest_timestamp TEXT
+        )
+        ''')
+        conn.execute('DELETE FROM options_stage')
+        bulk_write(conn, 'options_stage', out, commit=False)
+        conn.execute(f'''
+        INSERT OR IGNORE INTO options_loads (ticker, date, date_ordinal, source, ingest_timestamp)
+        SELECT ticker, date, {DATE_ORDINAL_SQL.format(col='date')}, MIN(source), MIN(ingest_timestamp)
+        FROM options_stage GROUP BY ticker, date
+        ''')
+        conn.execute('''
+        INSERT OR IGNORE INTO option_contracts (ticker, contract_symbol, put_call, strike_price, expiration_date)
+        SELECT ticker, contract_symbol, put_call, strike_price, expiration_date
+        FROM options_stage WHERE contract_symbol IS NOT NULL GROUP BY ticker, contract_symbol
+        ''')
+        inserted = conn.execute(f'''
+        INSERT OR IGNORE INTO options_facts (date_ordinal, contract_id, open_interest, volume, last_price, bid, ask)
+        SELECT {DATE_ORDINAL_SQL.format(col='st.date')}, c.contract_id, st.open_interest, st.volume, st.last_price, st.bid, st.ask
+        FROM options_stage st
+        JOIN option_contracts c ON c.ticker = st.ticker AND c.contract_symbol = st.contract_symbol
+        ''').rowcount
+        conn.execute('''
+        UPDATE options_loads SET row_count = (
+            SELECT COUNT(*) FROM options_facts f JOIN option_contracts c ON c.contract_id = f.contract_id
+            WHERE f.date_ordinal = options_loads.date_ordinal AND c.ticker = options_loads.ticker
+        )
+        WHERE (ticker, date) IN (SELECT DISTINCT ticker, date FROM options_stage)
+        ''')
+        # Refresh the per-expiry rollup for just the touched dates, from the stored chain, before committing
+        chain = pd.read_sql_query('''
+        SELECT ticker, date, expiration_date, put_call, strike_price, open_interest FROM options_data
+        WHERE (ticker, date) IN (SELECT DISTINCT ticker, date FROM options_stage)
+        ''', conn)
+        write_expiry_stats(conn, chain)
+        conn.execute('DELETE FROM options_stage')
+        conn.commit()
+        logger.info(f"options_data: Attempted {len(df)} rows; {inserted} actually inserted (duplicates ignored).")
+        return inserted
+    except Exception as e:
+        logger.error(f"Insert failed for options_data: {e}")
+        conn.rollback()
+        return 0
@@ -8,8 +8,14 @@ import pandas as pd
 import logging
 import time
 import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from html import unescape
 import os
+from throttle import HostRateLimiter
+from etf_flows import update_flows
+from database import bulk_write
 
 logging.basicConfig(
     level=logging.INFO,
@@ -34,57 +40,125 @@ TODAY = datetime.now().date().isoformat()  # YYYY-MM-DD for daily idempotency
 # Optional: Add proxy (format: {'https': 'http://user:pass@ip:port'} or {'https': 'http://ip:port'} for no-auth)
 PROXIES = {}  # e.g., {'https': 'http://proxy.example.com:8080'}
 
-def fetch_etf_data(tickers, proxies=PROXIES):
-    """Fetch shares outstanding like original; returns list of dicts."""
-    data = []
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/130.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Accept-Encoding': 'gzip, deflate, br',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+    'Sec-Fetch-Dest': 'document',
+    'Sec-Fetch-Mode': 'navigate',
+    'Sec-Fetch-Site': 'none',
+    'Sec-Fetch-User': '?1',
+    'Cache-Control': 'max-age=0',
+}
+ETF_WORKERS = int(os.getenv('ETF_WORKERS', '4'))  # Pages fetched concurrently
+ETF_MAX_RPS = float(os.getenv('ETF_MAX_RPS', '0.5'))  # Per-host budget (the old loop slept 2s per page)
+ETF_BURST = int(os.getenv('ETF_BURST', '2'))  # Requests a host may receive back-to-back
+MAX_RATE_LIMITED = 3  # 429/503 answers per page before giving up
+
+def make_session() -> requests.Session:
     session = requests.Session()
-    retry_strategy = Retry(total=3, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504])
+    # 429/503 are handled by the shared limiter (Retry-After pauses every worker), not per-request backoff
+    retry_strategy = Retry(total=3, backoff_factor=1, status_forcelist=[500, 502, 504])
     adapter = HTTPAdapter(max_retries=retry_strategy)
     session.mount("http://", adapter)
     session.mount("https://", adapter)
-    session.headers.update({
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/130.0.0.0 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
-        'Accept-Language': 'en-US,en;q=0.9',
-        'Accept-Encoding': 'gzip, deflate, br',
-        'Connection': 'keep-alive',
-        'Upgrade-Insecure-Requests': '1',
-        'Sec-Fetch-Dest': 'document',
-        'Sec-Fetch-Mode': 'navigate',
-        'Sec-Fetch-Site': 'none',
-        'Sec-Fetch-User': '?1',
-        'Cache-Control': 'max-age=0',
-    })
-    for ticker in tickers:
-        url = f'https://marketchameleon.com/Overview/{ticker}/ETFProfile'
-        try:
+    session.headers.update(HEADERS)
+    return session
+
+# Fast path: regex over the raw HTML, parsing only the cells right after the label
+SHARES_LABEL_RE = re.compile(r'Shares Outstanding:', re.IGNORECASE)
+SHARES_CELL_RE = re.compile(r'Shares Outstanding:\s*</td>\s*<td[^>]*>(.*?)</td>', re.IGNORECASE | re.DOTALL)
+SHARES_TEXT_RE = re.compile(r'Shares Outstanding:\s*(?:<[^>]*>\s*)*([\d,]+)', re.IGNORECASE)
+TAG_RE = re.compile(r'<[^>]*>')
+SHARES_VALUE_RE = re.compile(r'\d[\d,]*')
+SCAN_WINDOW = 2048  # Characters after the label searched for the value cell
+PAGE_DIR = os.getenv('ETF_PAGE_DIR')  # If set, raw pages are saved here (sample input for bench_etf_parse.py)
+
+def fast_shares_outstanding(html: str):
+    """Value next to the first 'Shares Outstanding:' label via regex on a small window, or None if unsure."""
+    start = html.find('Shares Outstanding:')  # Plain substring scan first; the case-insensitive regex is slower
+    if start < 0:
+        label = SHARES_LABEL_RE.search(html)
+        if not label:
+            return None
+        start = label.start()
+    window = html[start:start + len('Shares Outstanding:') + SCAN_WINDOW]
+    cell = SHARES_CELL_RE.match(window)
+    if cell:
+        value = unescape(TAG_RE.sub('', cell.group(1))).strip()
+    else:
+        text = SHARES_TEXT_RE.match(window)
+        value = text.group(1) if text else ''
+    return value.replace(',', '') if SHARES_VALUE_RE.fullmatch(value) else None
+
+def soup_shares_outstanding(html: str):
+    """Full-document BeautifulSoup parse (the original extractor); slower but tolerant of any markup."""
+    soup = BeautifulSoup(html, 'html.parser')
+    # Precise selector for table
+    label_td = soup.find('td', string=re.compile(r'Shares Outstanding:\s*$', re.IGNORECASE))
+    if label_td:
+        value_td = label_td.find_next_sibling('td')
+        if value_td:
+            return value_td.text.strip().replace(',', '')
+    # Fallback regex
+    page_text = soup.get_text()
+    match = re.search(r'Shares Outstanding:\s*([\d,]+)', page_text, re.IGNORECASE)
+    return match.group(1).replace(',', '') if match else None
+
+def parse_shares_outstanding(html: str):
+    """'Shares Outstanding:' value without commas, or None if the page doesn't have it."""
+    value = fast_shares_outstanding(html)
+    if value is None:
+        logger.debug("Fast shares extractor found nothing; falling back to full parse.")
+        value = soup_shares_outstanding(html)
+    return value
+
+def fetch_one(session, ticker: str, limiter: HostRateLimiter, proxies=PROXIES):
+    """One ETF profile page -> row dict, or None on failure."""
+    url = f'https://marketchameleon.com/Overview/{ticker}/ETFProfile'
+    try:
+        for _ in range(MAX_RATE_LIMITED + 1):
+            limiter.wait(url)
             response = session.get(url, timeout=30, proxies=proxies)
             logger.info(f"Status code for {ticker}: {response.status_code}")
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'html.parser')
-            # Precise selector for table
-            label_td = soup.find('td', string=re.compile(r'Shares Outstanding:\s*$', re.IGNORECASE))
-            if label_td:
-                value_td = label_td.find_next_sibling('td')
-                if value_td:
-                    shares_outstanding = value_td.text.strip().replace(',', '')
-                    data.append({'date': TODAY, 'ticker': ticker, 'shares_outstanding': shares_outstanding})
-                    logger.info(f"Successfully fetched data for {ticker}: {shares_outstanding}")
-                    time.sleep(2)
-                    continue
-            # Fallback regex
-            page_text = soup.get_text()
-            match = re.search(r'Shares Outstanding:\s*([\d,]+)', page_text, re.IGNORECASE)
-            if match:
-                shares_outstanding = match.group(1).replace(',', '')
-                data.append({'date': TODAY, 'ticker': ticker, 'shares_outstanding': shares_outstanding})
-                logger.info(f"Successfully fetched data for {ticker}: {shares_outstanding}")
-            else:
-                logger.warning(f"No data found for {ticker}")
-        except Exception as e:
-            logger.error(f"Error for {ticker}: {e}")
-        time.sleep(2)  # Rate limit
-    session.close()
+            if response.status_code not in (429, 503):
+                break
+            limiter.retry_after(url, response)
+        response.raise_for_status()
+        if PAGE_DIR:
+            with open(os.path.join(PAGE_DIR, f'{ticker}.html'), 'w', encoding='utf-8') as f:
+                f.write(response.text)
+        shares_outstanding = parse_shares_outstanding(response.text)
+        if shares_outstanding:
+            logger.info(f"Successfully fetched data for {ticker}: {shares_outstanding}")
+            return {'date': TODAY, 'ticker': ticker, 'shares_outstanding': shares_outstanding}
+        logger.warning(f"No data found for {ticker}")
+    except Exception as e:
+        logger.error(f"Error for {ticker}: {e}")
+    return None
+
+def fetch_etf_data(tickers, proxies=PROXIES, workers: int = ETF_WORKERS, max_rps: float = ETF_MAX_RPS,
+                   burst: int = ETF_BURST, session_factory=make_session):
+    """Fetch shares outstanding on a worker pool under a per-host token bucket; returns list of dicts in ticker order."""
+    limiter = HostRateLimiter(max_rps, burst)
+    if PAGE_DIR:
+        os.makedirs(PAGE_DIR, exist_ok=True)
+    local = threading.local()
+    sessions = []
+
+    def fetch(ticker):
+        if not hasattr(local, 'session'):
+            local.session = session_factory()  # One keep-alive session per worker thread
+            sessions.append(local.session)
+        return fetch_one(local.session, ticker, limiter, proxies)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        data = [row for row in pool.map(fetch, tickers) if row]
+    for session in sessions:
+        session.close()
     return data
 
 def normalize_data(raw_data):
@@ -117,17 +191,10 @@ def upsert_to_db(df, db_path=DB_PATH):
         )
     ''')
     # Batch upsert
-    rows = df.to_records(index=False).tolist()
-    cursor.executemany('''
-        INSERT INTO daily_etf_shares (date, ticker, shares_outstanding, source)
-        VALUES (?, ?, ?, ?)
-        ON CONFLICT(date, ticker) DO UPDATE SET
-            shares_outstanding = excluded.shares_outstanding,
-            source = excluded.source
-    ''', rows)
-    conn.commit()
-    conn.close()
+    bulk_write(conn, 'daily_etf_shares', df, key=['date', 'ticker'], update=['shares_outstanding', 'source'])
     logger.info(f"Upserted {len(df)} rows for {TODAY}")
+    update_flows(conn, df[['date', 'ticker']])
+    conn.close()
 
 
 if __name__ == '__main__':
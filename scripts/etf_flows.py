@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Implied creation/redemption flows derived from daily_etf_shares (etf_data.db).
+
+etf_flows holds, per ETF and date, the day's change in shares outstanding
+(creations > 0, redemptions < 0), the percent change, a z-score of the change
+against the previous ETF_FLOW_Z_WINDOW changes, and a signed streak (+3 = third
+creation day in a row, -2 = second redemption day, 0 = unchanged). Days
+with a missing or zero share count (failed scrapes) are skipped rather than read
+as a full redemption.
+
+etf_data_pull.py and import_etf_data.py call update_flows() for the dates they
+wrote. Each ticker is recomputed from its earliest touched date onward, seeded
+with just enough earlier rows for the z-score window and the running streak.
+
+Example:
+    from etf_flows import flow_matrix
+    changes = flow_matrix('shares_change', start='2025-01-01')   # dates x ETFs, NaN where missing
+    z = flow_matrix('zscore')
+
+Rebuild from daily_etf_shares (from repo root): python scripts/etf_flows.py
+"""
+import logging
+import os
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = os.path.join('data', 'etf_data.db')
+FLOW_Z_WINDOW = int(os.getenv('ETF_FLOW_Z_WINDOW', '20'))  # Prior daily changes the z-score is measured against
+FLOW_Z_MIN_PERIODS = 5
+FLOW_FIELDS = ['shares_outstanding', 'shares_change', 'pct_change', 'zscore', 'streak']
+
+def create_flows_schema(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS etf_flows (
+        ticker TEXT NOT NULL,
+        date TEXT NOT NULL,
+        shares_outstanding INTEGER NOT NULL,
+        shares_change INTEGER,
+        pct_change REAL,
+        zscore REAL,
+        streak INTEGER NOT NULL,
+        PRIMARY KEY (ticker, date)
+    ) WITHOUT ROWID
+    ''')
+
+def signed_streaks(change: np.ndarray, seed: int = 0) -> np.ndarray:
+    """Running signed count of consecutive same-sign changes, continuing `seed` (the streak before change[0])."""
+    sign = np.sign(np.nan_to_num(change)).astype(np.int64)
+    if sign.size == 0:
+        return sign
+    run_start = np.r_[True, sign[1:] != sign[:-1]]
+    run_id = np.cumsum(run_start) - 1
+    starts = np.flatnonzero(run_start)
+    length = np.arange(sign.size) - starts[run_id] + 1
+    if seed and np.sign(seed) == sign[0]:
+        length[run_id == 0] += abs(seed)
+    return sign * length
+
+def compute_flows(shares: pd.DataFrame) -> pd.DataFrame:
+    """Change, percent change and z-score for one ticker's (date, shares_outstanding) rows, oldest first."""
+    so = shares['shares_outstanding'].to_numpy(dtype=np.float64)
+    change = np.r_[np.nan, np.diff(so)]
+    prev = np.r_[np.nan, so[:-1]]
+    prior = pd.Series(change).shift(1).rolling(FLOW_Z_WINDOW, min_periods=FLOW_Z_MIN_PERIODS)
+    mean, std = prior.mean().to_numpy(), prior.std().to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        zscore = np.where(std > 0, (change - mean) / std, np.nan)
+        pct = change / prev
+    return pd.DataFrame({
+        'date': shares['date'].to_numpy(), 'shares_outstanding': so.astype(np.int64),
+        'shares_change': change, 'pct_change': pct, 'zscore': zscore,
+    })
+
+def _clean(rows) -> pd.DataFrame:
+    df = pd.DataFrame(rows, columns=['date', 'shares_outstanding'])
+    return df[pd.to_numeric(df['shares_outstanding'], errors='coerce').fillna(0) > 0]
+
+def refresh_ticker(conn, ticker: str, since: str = None) -> int:
+    """Recompute etf_flows rows for dates >= since (None = full history); returns rows written (no commit)."""
+    since = since or ''
+    context = _clean(conn.execute('''
+    SELECT date, shares_outstanding FROM daily_etf_shares
+    WHERE ticker = ? AND date < ? AND shares_outstanding > 0 ORDER BY date DESC LIMIT ?
+    ''', (ticker, since, FLOW_Z_WINDOW + 1)).fetchall()[::-1])
+    new = _clean(conn.execute('''
+    SELECT date, shares_outstanding FROM daily_etf_shares WHERE ticker = ? AND date >= ? ORDER BY date
+    ''', (ticker, since)).fetchall())
+    seed = conn.execute('SELECT streak FROM etf_flows WHERE ticker = ? AND date < ? ORDER BY date DESC LIMIT 1',
+                        (ticker, since)).fetchone()
+    # Context rows only feed the diff/z-score windows; the streak continues from the last stored one
+    flows = compute_flows(pd.concat([context, new], ignore_index=True)).iloc[len(context):]
+    flows = flows.assign(streak=signed_streaks(flows['shares_change'].to_numpy(), seed[0] if seed else 0))
+    conn.execute('DELETE FROM etf_flows WHERE ticker = ? AND date >= ?', (ticker, since))
+    out = flows.assign(ticker=ticker)[['ticker', 'date', *FLOW_FIELDS]]
+    out = out.astype(object).where(out.notna(), None)
+    conn.executemany('INSERT INTO etf_flows VALUES (?, ?, ?, ?, ?, ?, ?)', out.itertuples(index=False, name=None))
+    return len(out)
+
+def update_flows(conn, touched: pd.DataFrame) -> int:
+    """Refresh flows for the (date, ticker) rows just written to daily_etf_shares, in one transaction."""
+    create_flows_schema(conn)
+    if touched.empty:
+        return 0
+    written = 0
+    try:
+        for ticker, since in touched.groupby('ticker')['date'].min().items():
+            written += refresh_ticker(conn, ticker, since)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    logger.info(f"Updated {written} etf_flows rows for {touched['ticker'].nunique()} tickers")
+    return written
+
+def rebuild_flows(conn) -> int:
+    create_flows_schema(conn)
+    conn.execute('DELETE FROM etf_flows')
+    tickers = [t for (t,) in conn.execute('SELECT DISTINCT ticker FROM daily_etf_shares')]
+    written = sum(refresh_ticker(conn, ticker) for ticker in tickers)
+    conn.commit()
+    return written
+
+def flow_matrix(field: str = 'shares_change', start: str = None, end: str = None, tickers=None,
+                conn=None, db_path: str = DB_PATH) -> pd.DataFrame:
+    """One flow field as a dates x tickers frame (all tracked ETFs by default), aligned on the union of dates."""
+    if field not in FLOW_FIELDS:
+        raise ValueError(f"field must be one of {FLOW_FIELDS}")
+    query = f'SELECT date, ticker, {field} FROM etf_flows WHERE date >= ? AND date <= ?'
+    params = [start or '', end or '9999-12-31']
+    if tickers:
+        query += f" AND ticker IN ({', '.join('?' * len(tickers))})"
+        params += list(tickers)
+    own = conn is None
+    conn = conn or sqlite3.connect(db_path)
+    df = pd.read_sql_query(query, conn, params=params)
+    if own:
+        conn.close()
+    matrix = df.pivot(index='date', columns='ticker', values=field).sort_index()
+    matrix.index = pd.to_datetime(matrix.index)
+    return matrix.reindex(columns=list(tickers)) if tickers else matrix
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    start = time.time()
+    conn = sqlite3.connect(DB_PATH)
+    rows = rebuild_flows(conn)
+    conn.close()
+    logger.info(f"Rebuilt {rows} etf_flows rows in {time.time() - start:.2f}s")
+    print(flow_matrix('shares_change').tail(10))
@@ -2,12 +2,18 @@ import sqlite3
 import pandas as pd
 import os
 import glob
+import re
 from typing import Dict, Any
+from bar_cache import TABLES as BAR_CACHE_TABLES, cached_tickers, open_bars
 
 # Set your data directory path (update if needed)
 data_dir = '~/Desktop/github/fetcher/data'  # Or use '.' for current dir
 data_dir = os.path.expanduser(data_dir)  # Expands ~ to full path
 
+# Bar tables are mapped from the column cache (bar_cache.py) instead of SELECT * when it exists
+bar_cache_dir = os.path.join(data_dir, 'bar_cache')
+bar_intervals = {table: interval for interval, (table, _) in BAR_CACHE_TABLES.items()}
+
 # Find all .db files, skip cron_logs.db
 db_files = [f for f in glob.glob(os.path.join(data_dir, '*.db')) 
             if os.path.basename(f) != 'cron_logs.db']
@@ -23,12 +29,28 @@ for db_path in db_files:
     
     conn = sqlite3.connect(db_path)
     
-    # Get list of tables
-    tables = pd.read_sql_query("SELECT name FROM sqlite_master WHERE type='table';", conn)['name'].tolist()
-    print(f"Tables: {tables}")
+    # Get list of tables and views
+    objects = pd.read_sql_query("SELECT name, type, sql FROM sqlite_master WHERE type IN ('table', 'view');", conn)
+    view_sql = objects.loc[objects['type'] == 'view', 'sql']
+    # Dimension/fact tables behind compat views (options_data, ftd_data, historical_1m, ...) are internal;
+    # load the views instead. Bar tables stay, since they are mapped from the cache.
+    internal = {name for name in objects.loc[objects['type'] == 'table', 'name']
+                if name not in bar_intervals and view_sql.str.contains(rf'\b{re.escape(name)}\b').any()}
+    tables = [name for name in objects['name'] if name not in internal]
+    print(f"Tables/views: {tables}")
+    if internal:
+        print(f"Internal (read through views): {sorted(internal)}")
     
     db_dfs = {}
     for table in tables:
+        if table in bar_intervals:
+            interval = bar_intervals[table]
+            bars = {t: open_bars(t, interval, bar_cache_dir) for t in cached_tickers(interval, bar_cache_dir)}
+            if bars:
+                # {ticker: BarArrays} of memory-mapped columns; .to_frame() for pandas
+                db_dfs[table] = bars
+                print(f"Mapped {table}: {len(bars)} tickers, {sum(len(b) for b in bars.values())} rows from bar_cache")
+                continue
         try:
             # Load full table into DF (add LIMIT if tables are huge, e.g., "SELECT * FROM {} LIMIT 10000".format(table))
             query = f"SELECT * FROM {table}"
@@ -44,6 +66,7 @@ for db_path in db_files:
 
 # Now all_data has everything! Example access:
 # df = all_data['gme_data.db']['some_table']
+# closes = all_data['stock_ticker_1m_data.db']['bars_1m']['GME'].close  # memmap, no copy
 # Or merge across DBs as needed, e.g., pd.concat([all_data['db1']['table'], all_data['db2']['table']])
 
 print("\nAll data loaded into 'all_data' dict. Ready for Monte Carlo sims!")
@@ -3,14 +3,21 @@ import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 import zipfile
-import io
+import codecs
+import tempfile
 import pandas as pd
 import sqlite3
 import logging
 import time
-import json
+import hashlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date, timedelta
 import os
+from throttle import RateLimiter
+from http_cache import HTTPCache
+from ftd_queries import invalidate_cache
+from database import bulk_write
 
 # Logging setup (similar to other scripts)
 logging.basicConfig(
@@ -27,68 +34,213 @@ logger = logging.getLogger(__name__)
 DB_PATH = os.path.join('data', 'ftd_data.db')
 MAX_MONTHS_BACK = 60  # For initial load, fetch last N months; increase cautiously for full history
 MIN_START_DATE = date(2009, 7, 1)  # Half-month format starts July 2009; clamp to avoid pre-format files
+FTD_COLUMNS = ['settlement_date', 'cusip', 'symbol', 'quantity', 'description', 'price']
+PARSE_CHUNK_ROWS = 50_000  # Rows per typed chunk from the streaming CSV reader
+DOWNLOAD_SPOOL_BYTES = 16 * 1024 * 1024  # ZIPs above this spill from RAM to a temp file
+FTD_WORKERS = int(os.getenv('FTD_WORKERS', '4'))  # Concurrent ZIP downloads; 1 = old sequential behaviour
+FTD_MAX_RPS = float(os.getenv('FTD_MAX_RPS', '3'))  # Global request cap across workers (SEC fair access allows 10/s)
+FTD_RECHECK_HALF_MONTHS = int(os.getenv('FTD_RECHECK_HALF_MONTHS', '4'))  # Ingested files re-checked for revisions each run
+FTD_CACHE = os.getenv('FTD_CACHE', 'true').lower() == 'true'  # Keep ZIPs in data/http_cache; re-runs cost a 304 per file
 os.makedirs('data', exist_ok=True)  # Ensure data dir
 
+# Maps an ISO date column to the half-month file it belongs to (e.g., '2024-01-16' -> '202401b')
+HALF_MONTH_SQL = "substr({col}, 1, 4) || substr({col}, 6, 2) || CASE WHEN substr({col}, 9, 2) <= '15' THEN 'a' ELSE 'b' END"
+
+def create_schema(cursor):
+    """Create the dictionary-encoded FTD layout: securities dimension, slim fact table, ledger, compat view."""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS ftd_files (
+        file_id INTEGER PRIMARY KEY,
+        half_month TEXT NOT NULL UNIQUE,
+        content_hash TEXT NOT NULL,
+        row_count INTEGER NOT NULL,
+        date_min TEXT,
+        date_max TEXT,
+        ingest_timestamp TEXT NOT NULL
+    )
+    ''')
+    # Text attributes use '' instead of NULL so the UNIQUE key dedupes them (NULLs never compare equal)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS ftd_securities (
+        security_id INTEGER PRIMARY KEY,
+        cusip TEXT NOT NULL DEFAULT '',
+        symbol TEXT NOT NULL,
+        description TEXT NOT NULL DEFAULT '',
+        UNIQUE(cusip, symbol, description)
+    )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ftd_securities_symbol ON ftd_securities (symbol)')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS ftd_facts (
+        date TEXT NOT NULL,
+        security_id INTEGER NOT NULL,
+        quantity INTEGER,
+        price REAL,
+        file_id INTEGER NOT NULL,
+        PRIMARY KEY (date, security_id)
+    ) WITHOUT ROWID
+    ''')
+    # Symbol-first covering index: per-security time series are read without touching the table
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ftd_facts_security ON ftd_facts (security_id, date, quantity, price)')
+    # Same columns as the old ftd_data table, so existing queries keep working
+    cursor.execute('''
+    CREATE VIEW IF NOT EXISTS ftd_data AS
+    SELECT f.date, NULLIF(s.cusip, '') AS cusip, s.symbol, f.quantity, NULLIF(s.description, '') AS description,
+           f.price, 'sec_ftd' AS source, l.ingest_timestamp
+    FROM ftd_facts f
+    JOIN ftd_securities s ON s.security_id = f.security_id
+    LEFT JOIN ftd_files l ON l.file_id = f.file_id
+    ''')
+
+def migrate_legacy_schema(conn) -> int:
+    """Convert a pre-dictionary ftd_data table (and a file_id-less ledger) in place; returns rows migrated."""
+    cursor = conn.cursor()
+    objects = dict(cursor.execute("SELECT name, type FROM sqlite_master WHERE name IN ('ftd_data', 'ftd_files')").fetchall())
+    ledger_cols = [r[1] for r in cursor.execute('PRAGMA table_info(ftd_files)').fetchall()]
+    legacy_ledger = bool(ledger_cols) and 'file_id' not in ledger_cols
+    legacy_table = objects.get('ftd_data') == 'table'
+    if not legacy_ledger and not legacy_table:
+        return 0
+    logger.warning("Legacy FTD layout found; migrating to dictionary-encoded tables.")
+    migrated = 0
+    try:
+        if legacy_ledger:
+            cursor.execute('ALTER TABLE ftd_files RENAME TO ftd_files_legacy')
+        if legacy_table:
+            cursor.execute('DROP INDEX IF EXISTS idx_ftd_date_symbol')
+            cursor.execute('ALTER TABLE ftd_data RENAME TO ftd_data_legacy')
+        create_schema(cursor)
+        if legacy_ledger:
+            cursor.execute('''
+            INSERT INTO ftd_files (half_month, content_hash, row_count, date_min, date_max, ingest_timestamp)
+            SELECT half_month, content_hash, row_count, date_min, date_max, ingest_timestamp FROM ftd_files_legacy
+            ''')
+            cursor.execute('DROP TABLE ftd_files_legacy')
+        if legacy_table:
+            # Rows ingested before the ledger existed get a placeholder entry per half-month; 'legacy'
+            # never matches a real hash, so re-checking that file replaces them
+            cursor.execute(f'''
+            INSERT OR IGNORE INTO ftd_files (half_month, content_hash, row_count, date_min, date_max, ingest_timestamp)
+            SELECT {HALF_MONTH_SQL.format(col='date')}, 'legacy', COUNT(*), MIN(date), MAX(date), MAX(ingest_timestamp)
+            FROM ftd_data_legacy GROUP BY 1
+            ''')
+            cursor.execute('''
+            INSERT OR IGNORE INTO ftd_securities (cusip, symbol, description)
+            SELECT DISTINCT COALESCE(cusip, ''), symbol, COALESCE(description, '') FROM ftd_data_legacy
+            ''')
+            migrated = cursor.execute(f'''
+            INSERT OR IGNORE INTO ftd_facts (date, security_id, quantity, price, file_id)
+            SELECT d.date, s.security_id, d.quantity, d.price, l.file_id
+            FROM ftd_data_legacy d
+            JOIN ftd_securities s ON s.cusip = COALESCE(d.cusip, '') AND s.symbol = d.symbol
+                                 AND s.description = COALESCE(d.description, '')
+            JOIN ftd_files l ON l.half_month = {HALF_MONTH_SQL.format(col='d.date')}
+            ''').rowcount
+            cursor.execute('DROP TABLE ftd_data_legacy')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    logger.info(f"Migrated {migrated:,} FTD rows to dictionary-encoded layout.")
+    return migrated
+
 def init_db(drop_table=False):
-    """Initialize FTD database table."""
+    """Initialize FTD tables (dimension, facts, ledger) and the ftd_data compatibility view."""
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
     if drop_table:
         logger.warning("Dropping table for fresh init (use sparingly).")
-        cursor.execute('DROP TABLE IF EXISTS ftd_data')
+        kind = cursor.execute("SELECT type FROM sqlite_master WHERE name = 'ftd_data'").fetchone()
+        if kind:
+            cursor.execute(f"DROP {kind[0].upper()} ftd_data")  # View now; a table on a legacy DB
+        cursor.execute('DROP TABLE IF EXISTS ftd_facts')
+        cursor.execute('DROP TABLE IF EXISTS ftd_securities')
+        cursor.execute('DROP TABLE IF EXISTS ftd_files')  # Ledger must not claim files the table no longer has
     else:
         logger.info("Initializing FTD DB (no drop).")
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS ftd_data (
-        date TEXT NOT NULL,
-        cusip TEXT,
-        symbol TEXT NOT NULL,
-        quantity INTEGER,
-        description TEXT,
-        price REAL,
-        source TEXT NOT NULL,
-        ingest_timestamp TEXT NOT NULL,
-        UNIQUE(date, symbol)
-    )
-    ''')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ftd_date_symbol ON ftd_data (date, symbol)')
+    migrate_legacy_schema(conn)
+    create_schema(cursor)
     conn.commit()
     conn.close()
     logger.info("FTD DB initialized.")
 
-def get_last_date(table: str, conn) -> str:
-    """Get max date from table."""
-    df = pd.read_sql(f"SELECT MAX(date) FROM {table}", conn)
-    last = df.iloc[0, 0] if not df.empty and pd.notna(df.iloc[0, 0]) else '1900-01-01'
-    logger.debug(f"Last date in {table}: {last}")
-    return last
-
-def insert_data(df: pd.DataFrame, table: str, conn):
-    """Insert DataFrame to table in chunks to avoid SQLite variable limit."""
-    if df.empty:
-        logger.warning(f"Empty DataFrame for {table}, skipping insert.")
-        return 0
+def load_ledger(conn) -> dict:
+    """Return {half_month: {content_hash, row_count, date_min, date_max}} for every ingested file."""
+    rows = conn.execute('SELECT half_month, content_hash, row_count, date_min, date_max FROM ftd_files').fetchall()
+    return {r[0]: {'content_hash': r[1], 'row_count': r[2], 'date_min': r[3], 'date_max': r[4]} for r in rows}
+
+def ingest_ftd_file(conn, half_month: str, content_hash: str, df: pd.DataFrame) -> int:
+    """Replace one half-month's rows and record it in the ledger in a single transaction; returns rows inserted.
+
+    Only rows this file stored before (its ledger file_id) are replaced. A (date, security) also
+    stored by another, overlapping file is taken over: the most recently ingested file wins.
+    """
+    now = datetime.now().isoformat()
+    date_min = df['date'].min() if not df.empty else None
+    date_max = df['date'].max() if not df.empty else None
     try:
-        pre_count = pd.read_sql(f"SELECT COUNT(*) FROM {table}", conn).iloc[0, 0]
-        chunk_size = 1000  # Increased for faster inserts (still safe under 999 vars)
-        total_attempted = len(df)
-        num_chunks = (total_attempted + chunk_size - 1) // chunk_size
-        for i in range(0, total_attempted, chunk_size):
-            chunk = df.iloc[i:i + chunk_size]
-            chunk.to_sql(table, conn, if_exists='append', index=False, method=None)  # method=None for speed on small chunks
-            logger.debug(f"Inserted chunk {i//chunk_size + 1}/{num_chunks} ({len(chunk)} rows)")
-        post_count = pd.read_sql(f"SELECT COUNT(*) FROM {table}", conn).iloc[0, 0]
-        actual_inserted = post_count - pre_count
-        logger.info(f"{table}: Inserted {actual_inserted} rows (attempted {total_attempted} in {num_chunks} chunks).")
+        conn.execute('''
+        INSERT INTO ftd_files (half_month, content_hash, row_count, date_min, date_max, ingest_timestamp)
+        VALUES (?, ?, 0, ?, ?, ?)
+        ON CONFLICT(half_month) DO UPDATE SET
+            content_hash = excluded.content_hash, date_min = excluded.date_min,
+            date_max = excluded.date_max, ingest_timestamp = excluded.ingest_timestamp
+        ''', (half_month, content_hash, date_min, date_max, now))
+        file_id = conn.execute('SELECT file_id FROM ftd_files WHERE half_month = ?', (half_month,)).fetchone()[0]
+        # A revised file replaces exactly the rows its earlier version wrote
+        deleted = conn.execute('DELETE FROM ftd_facts WHERE file_id = ?', (file_id,)).rowcount
+        if deleted:
+            logger.info(f"{half_month}: Replacing {deleted} previously ingested rows")
+        inserted = 0
+        if not df.empty:
+            # Stage the file, then let SQLite assign security ids and write the slim fact rows
+            conn.execute('''
+            CREATE TEMP TABLE IF NOT EXISTS ftd_stage (
+                date TEXT, cusip TEXT, symbol TEXT, quantity INTEGER, description TEXT, price REAL
+            )
+            ''')
+            conn.execute('DELETE FROM ftd_stage')
+            bulk_write(conn, 'ftd_stage', df[['date', 'cusip', 'symbol', 'quantity', 'description', 'price']], commit=False)
+            conn.execute('''
+            INSERT OR IGNORE INTO ftd_securities (cusip, symbol, description)
+            SELECT DISTINCT COALESCE(cusip, ''), symbol, COALESCE(description, '') FROM ftd_stage
+            ''')
+            # Overlapping rows owned by other files move to this one; their ledger counts drop accordingly
+            taken = conn.execute('''
+            SELECT f.file_id, COUNT(*) FROM ftd_stage st
+            JOIN ftd_securities s ON s.cusip = COALESCE(st.cusip, '') AND s.symbol = st.symbol
+                                 AND s.description = COALESCE(st.description, '')
+            JOIN ftd_facts f ON f.date = st.date AND f.security_id = s.security_id
+            WHERE f.file_id != ? GROUP BY f.file_id
+            ''', (file_id,)).fetchall()
+            inserted = conn.execute('''
+            INSERT INTO ftd_facts (date, security_id, quantity, price, file_id)
+            SELECT st.date, s.security_id, st.quantity, st.price, ?
+            FROM ftd_stage st
+            JOIN ftd_securities s ON s.cusip = COALESCE(st.cusip, '') AND s.symbol = st.symbol
+                                 AND s.description = COALESCE(st.description, '')
+            WHERE true
+            ON CONFLICT(date, security_id) DO UPDATE SET
+                quantity = excluded.quantity, price = excluded.price, file_id = excluded.file_id
+            ''', (file_id,)).rowcount
+            conn.executemany('UPDATE ftd_files SET row_count = row_count - ? WHERE file_id = ?',
+                             [(count, other) for other, count in taken])
+            conn.execute('DELETE FROM ftd_stage')
+        conn.execute('UPDATE ftd_files SET row_count = ? WHERE file_id = ?', (inserted, file_id))
         conn.commit()
-        return actual_inserted
+        logger.info(f"ftd_data: Inserted {inserted} rows from {half_month} (hash {content_hash[:12]})")
+        return inserted
     except Exception as e:
-        logger.error(f"Insert failed for {table}: {e}")
+        logger.error(f"Insert failed for {half_month}: {e}")
         conn.rollback()
         return 0
 
-def get_half_months(start_dt: date, end_dt: date) -> list:
-    """Generate list of half-month identifiers (e.g., '202509a') to cover from start_dt to end_dt."""
+def get_half_months(start_dt: date, end_dt: date, ledger: dict = None, recheck: int = FTD_RECHECK_HALF_MONTHS) -> list:
+    """Generate list of half-month identifiers (e.g., '202509a') to cover from start_dt to end_dt.
+
+    With a ledger, files already ingested are skipped except the latest `recheck` ones, which are
+    re-fetched (a 304 when cached) so SEC revisions are noticed by their content hash.
+    """
     half_months = []
     current = max(start_dt, MIN_START_DATE)  # Ensure we don't go pre-format
     while current <= end_dt:
@@ -113,13 +265,17 @@ def get_half_months(start_dt: date, end_dt: date) -> list:
                 next_year += 1
             next_day = 1
         current = date(next_year, next_month, next_day)
-    return sorted(list(set(half_months)))  # Dedup and sort
+    half_months = sorted(list(set(half_months)))  # Dedup and sort
+    if ledger:
+        recent = set(half_months[-recheck:]) if recheck > 0 else set()
+        half_months = [hm for hm in half_months if hm not in ledger or hm in recent]
+    return half_months
 
-def create_session():
-    """Create a requests session with headers to avoid 403 errors."""
+def create_session(pool_size: int = 10):
+    """Create a requests session with headers to avoid 403 errors (pool sized for concurrent workers)."""
     session = requests.Session()
     retry_strategy = Retry(total=3, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504])
-    adapter = HTTPAdapter(max_retries=retry_strategy)
+    adapter = HTTPAdapter(max_retries=retry_strategy, pool_connections=pool_size, pool_maxsize=pool_size)
     session.mount("http://", adapter)
     session.mount("https://", adapter)
     session.headers.update({
@@ -132,59 +288,151 @@ def create_session():
     })
     return session
 
-def fetch_and_parse_ftd(half_month: str, session) -> pd.DataFrame:
-    """Download and parse a single half-month FTD ZIP file using session."""
-    url = f"https://www.sec.gov/files/data/fails-deliver-data/cnsfails{half_month}.zip"
-    content = None
+def ftd_url(half_month: str) -> str:
+    return f"https://www.sec.gov/files/data/fails-deliver-data/cnsfails{half_month}.zip"
+
+def download_ftd_zip(half_month: str, session, cache: HTTPCache = None):
+    """Return (readable file object, sha256 of the ZIP) for one half-month.
+
+    With a cache, the ZIP is revalidated (ETag/Last-Modified) and opened from local disk;
+    otherwise it is streamed into a spooled temp file (RAM up to DOWNLOAD_SPOOL_BYTES, disk beyond).
+    """
+    url = ftd_url(half_month)
+    if cache is not None:
+        fh, cached = cache.fetch_file(session, url)
+        return fh, cached.sha256
+    resp = session.get(url, timeout=30, stream=True)
+    digest = hashlib.sha256()
     try:
-        resp = session.get(url, timeout=30)
         resp.raise_for_status()
-        content = resp.content  # Save bytes once
-        with zipfile.ZipFile(io.BytesIO(content)) as z:
-            if not z.namelist():
-                raise ValueError("Empty ZIP")
-            file_name = z.namelist()[0]
-            with z.open(file_name) as f:
-                # Try encodings: utf-8-sig first (BOM), then utf-8, then latin-1
-                encodings = ['utf-8-sig', 'utf-8', 'latin-1']
-                df = None
-                for enc in encodings:
-                    try:
-                        csv_io = io.StringIO(f.read().decode(enc))
-                        df = pd.read_csv(
-                            csv_io,
-                            sep='|',
-                            header=None,
-                            names=['settlement_date', 'cusip', 'symbol', 'quantity', 'description', 'price'],
-                            dtype=str,
-                            on_bad_lines='skip'
-                        )
-                        logger.debug(f"Successfully read {half_month} with {enc}")
-                        break
-                    except (UnicodeDecodeError, UnicodeError):
-                        continue
-                if df is None:
-                    raise ValueError("All encodings failed")
-        if df.empty:
-            return df
-        # Convert date
-        df['date'] = pd.to_datetime(df['settlement_date'], format='%Y%m%d', errors='coerce').dt.strftime('%Y-%m-%d')
-        df = df.dropna(subset=['date'])  # Drop invalid dates
-        # Clean columns
-        df['quantity'] = pd.to_numeric(df['quantity'], errors='coerce').astype('Int64')
-        df['price'] = pd.to_numeric(df['price'], errors='coerce')
-        df['symbol'] = df['symbol'].str.strip()
-        df['cusip'] = df['cusip'].str.strip()
-        df['description'] = df['description'].str.strip()
-        # Drop rows without symbol
-        df = df.dropna(subset=['symbol'])
-        # Drop duplicates within file (unlikely but safe)
-        df = df.drop_duplicates(subset=['date', 'symbol'])
-        logger.info(f"Parsed {len(df)} rows from {half_month} (date range: {df['date'].min()} to {df['date'].max()})")
-        return df
+        buf = tempfile.SpooledTemporaryFile(max_size=DOWNLOAD_SPOOL_BYTES)
+        for block in resp.iter_content(chunk_size=256 * 1024):
+            digest.update(block)
+            buf.write(block)
+    finally:
+        resp.close()
+    buf.seek(0)
+    return buf, digest.hexdigest()
+
+def detect_encoding(z: zipfile.ZipFile, member: str, block_size: int = 1024 * 1024) -> str:
+    """Encoding for the whole member: BOM -> utf-8-sig, valid UTF-8 throughout -> utf-8, else latin-1.
+
+    Every block is checked (pure-ASCII blocks cheaply), so a non-UTF-8 byte deep in the file selects
+    latin-1, which decodes any byte losslessly, instead of being replaced later.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    bom = False
+    with z.open(member) as f:
+        try:
+            for i, block in enumerate(iter(lambda: f.read(block_size), b'')):
+                if i == 0:
+                    bom = block.startswith(codecs.BOM_UTF8)
+                if not block.isascii() or decoder.getstate()[0]:  # Non-ASCII, or a char split at the last edge
+                    decoder.decode(block)
+            decoder.decode(b'', final=True)
+        except UnicodeDecodeError:
+            return 'latin-1'
+    return 'utf-8-sig' if bom else 'utf-8'
+
+def clean_ftd_chunk(df: pd.DataFrame) -> pd.DataFrame:
+    """Type one raw chunk: ISO date, Int64 quantity, float price, stripped text; drops header/trailer lines."""
+    df = df.assign(date=pd.to_datetime(df['settlement_date'], format='%Y%m%d', errors='coerce').dt.strftime('%Y-%m-%d'))
+    df = df.dropna(subset=['date'])  # Drop invalid dates (header row, trailer record)
+    df = df.assign(
+        quantity=pd.to_numeric(df['quantity'], errors='coerce').astype('Int64'),
+        price=pd.to_numeric(df['price'], errors='coerce'),
+        symbol=df['symbol'].str.strip(),
+        cusip=df['cusip'].str.strip(),
+        description=df['description'].str.strip()
+    )
+    return df.dropna(subset=['symbol'])  # Drop rows without symbol
+
+def iter_ftd_chunks(zip_source, chunk_rows: int = PARSE_CHUNK_ROWS):
+    """Yield typed DataFrame chunks straight from the first ZIP member's byte stream (no full-file decode/copy)."""
+    with zipfile.ZipFile(zip_source) as z:
+        if not z.namelist():
+            raise ValueError("Empty ZIP")
+        file_name = z.namelist()[0]
+        encoding = detect_encoding(z, file_name)
+        logger.debug(f"{file_name}: detected encoding {encoding}")
+        with z.open(file_name) as f:
+            reader = pd.read_csv(
+                f,
+                sep='|',
+                header=None,
+                names=FTD_COLUMNS,
+                dtype=str,
+                encoding=encoding,  # Checked against the whole member, so strict decoding can't fail
+                on_bad_lines='skip',
+                chunksize=chunk_rows
+            )
+            with reader:
+                for chunk in reader:
+                    yield clean_ftd_chunk(chunk)
+
+def parse_ftd_zip(zip_source, half_month: str) -> pd.DataFrame:
+    """Parse a half-month ZIP (path or file object) into the cleaned FTD frame."""
+    chunks = [c for c in iter_ftd_chunks(zip_source) if not c.empty]
+    if not chunks:
+        return pd.DataFrame()
+    df = pd.concat(chunks, ignore_index=True)
+    # Drop duplicates within file (unlikely but safe)
+    df = df.drop_duplicates(subset=['date', 'symbol'])
+    logger.info(f"Parsed {len(df)} rows from {half_month} (date range: {df['date'].min()} to {df['date'].max()})")
+    return df
+
+def fetch_ftd_file(half_month: str, session, cache: HTTPCache = None, known_hash: str = None):
+    """Download one half-month and return (content_hash, df).
+
+    df is None when the hash matches known_hash (parse skipped); content_hash is None on failure.
+    """
+    try:
+        buf, content_hash = download_ftd_zip(half_month, session, cache)
+        with buf:
+            if content_hash == known_hash:
+                logger.info(f"{half_month} unchanged since last ingest (hash {content_hash[:12]}), skipping parse")
+                return content_hash, None
+            return content_hash, parse_ftd_zip(buf, half_month)
     except Exception as e:
         logger.error(f"Failed to fetch/parse {half_month}: {e}")
-        return pd.DataFrame()
+        return None, pd.DataFrame()
+
+def fetch_and_parse_ftd(half_month: str, session, cache: HTTPCache = None) -> pd.DataFrame:
+    """Download and parse a single half-month FTD ZIP file using session."""
+    return fetch_ftd_file(half_month, session, cache)[1]
+
+def iter_half_months(half_months: list, session, workers: int = FTD_WORKERS, max_rps: float = FTD_MAX_RPS,
+                     cache: HTTPCache = None, known_hashes: dict = None):
+    """Yield (half_month, content_hash, df) in input order while up to `workers` downloads run ahead.
+
+    Every request goes through one shared RateLimiter, so traffic to sec.gov stays under
+    max_rps whatever the worker count. At most 2 * workers parsed files are held in memory;
+    the caller remains the single, ordered DB writer.
+    """
+    workers = max(1, workers)
+    limiter = RateLimiter(max_rps)
+
+    def task(hm):
+        limiter.wait()
+        return fetch_ftd_file(hm, session, cache, (known_hashes or {}).get(hm))
+
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ftd')
+    pending = deque()
+    remaining = iter(half_months)
+    try:
+        for hm in remaining:
+            pending.append((hm, pool.submit(task, hm)))
+            if len(pending) >= workers * 2:
+                break
+        while pending:
+            hm, future = pending.popleft()
+            nxt = next(remaining, None)
+            if nxt is not None:
+                pending.append((nxt, pool.submit(task, nxt)))
+            content_hash, df = future.result()
+            yield hm, content_hash, df
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)  # Don't leave downloads running if the writer stops early
 
 if __name__ == '__main__':
     start_time = time.time()
@@ -193,49 +441,48 @@ if __name__ == '__main__':
     notes = ""
     init_db(drop_table=False)  # Set to True for fresh start / backfill
     conn = sqlite3.connect(DB_PATH)
-    last_date = get_last_date('ftd_data', conn)
-    logger.info(f"Last date in DB: {last_date}")
+    ledger = load_ledger(conn)
+    logger.info(f"Ledger: {len(ledger)} half-month files ingested")
     today = date.today()
-    if last_date == '1900-01-01':
-        # Initial load: last MAX_MONTHS_BACK months
-        start_dt = today - timedelta(days=30 * MAX_MONTHS_BACK)
-        start_dt = max(start_dt, MIN_START_DATE)  # Clamp to SEC format start
+    start_dt = today - timedelta(days=30 * MAX_MONTHS_BACK)
+    start_dt = max(start_dt, MIN_START_DATE)  # Clamp to SEC format start
+    if not ledger:
         notes = f"Initial load from ~{start_dt.strftime('%Y-%m')}"
-    else:
-        start_dt = (pd.to_datetime(last_date) + timedelta(days=1)).date()
-    half_months = get_half_months(start_dt, today)
+    half_months = get_half_months(start_dt, today, ledger=ledger)
     logger.info(f"Fetching {len(half_months)} half-months: {half_months[:5]}...{half_months[-5:]}")  # Truncated log for long lists
-    session = create_session()
+    logger.info(f"Download workers: {FTD_WORKERS} | Rate cap: {FTD_MAX_RPS} req/s")
+    session = create_session(pool_size=max(FTD_WORKERS, 1))
+    cache = HTTPCache() if FTD_CACHE else None
+    known_hashes = {hm: entry['content_hash'] for hm, entry in ledger.items()}
     processed_files = 0
-    for i, hm in enumerate(half_months, 1):
-        df = fetch_and_parse_ftd(hm, session)
-        if df.empty:
-            continue
-        # Filter to new dates only
-        df_new = df[df['date'] > last_date].copy()
-        if df_new.empty:
-            logger.info(f"No new data in {hm} (all dates <= {last_date})")
+    unchanged_files = 0
+    revised_files = 0
+    for i, (hm, content_hash, df) in enumerate(iter_half_months(half_months, session, cache=cache, known_hashes=known_hashes), 1):
+        if content_hash is None:
+            continue  # Fetch failed (e.g., not yet published); already logged
+        if df is None:
+            unchanged_files += 1
             continue
-        # Add metadata
-        df_new['source'] = 'sec_ftd'
-        df_new['ingest_timestamp'] = datetime.now().isoformat()
-        # Select columns
-        df_new = df_new[['date', 'cusip', 'symbol', 'quantity', 'description', 'price', 'source', 'ingest_timestamp']]
-        # Insert and get actual count
-        inserted = insert_data(df_new, 'ftd_data', conn)
+        if hm in ledger:
+            revised_files += 1
+            logger.info(f"{hm} changed since last ingest ({ledger[hm]['content_hash'][:12]} -> {content_hash[:12]}), re-ingesting")
+        inserted = ingest_ftd_file(conn, hm, content_hash, df)
         total_inserted += inserted
-        if inserted == 0:
+        if inserted == 0 and not df.empty:
             errors.append(f"Insert failed for {hm} (0 rows inserted)")
-        last_date = max(last_date, df_new['date'].max())  # Update for next filter
         processed_files += 1
         if i % 10 == 0:  # Progress every 10 files
             logger.info(f"Progress: {i}/{len(half_months)} files processed, {total_inserted:,} rows so far")
-        time.sleep(0.3)  # Slightly faster rate limit
     session.close()
     conn.close()
+    if processed_files:
+        invalidate_cache()  # Cached query results for this process; other processes see the new ledger version
     duration = time.time() - start_time
     status = 'success' if total_inserted > 0 and not errors else ('warning' if errors else 'error')
     notes += f" | Processed {processed_files}/{len(half_months)} files"
+    notes += f" | Unchanged: {unchanged_files} | Revised: {revised_files}"
+    if cache is not None:
+        notes += f" | Cache: {cache.stats['hit']} hits (304), {cache.stats['miss']} downloads"
     if errors:
         notes += f" | Errors: {len(errors)}"
     logger.info(f"Total new rows inserted: {total_inserted:,}")
@@ -0,0 +1,115 @@
+"""
+Read-side helpers for ftd_data.db: per-symbol series, top-N symbols per settlement
+date and rolling sums. Queries hit ftd_securities -> ftd_facts through the
+symbol-first covering index idx_ftd_facts_security, and results come back as
+NumPy-typed frames (datetime64 dates, int64 quantities, float64 prices).
+
+Results are held in an LRU cache keyed on the ingestion ledger's state, so a new
+or revised half-month from ftd_data_pull.py invalidates them automatically.
+
+Example:
+    from ftd_queries import get_symbol_series
+    df = get_symbol_series(['GME', 'XRT'], start='2021-01-01')
+"""
+import logging
+import os
+import sqlite3
+from functools import lru_cache
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = os.path.join('data', 'ftd_data.db')
+CACHE_SIZE = 128  # Cached result frames per query type
+
+def _connect(db_path: str):
+    return sqlite3.connect(db_path)
+
+def ledger_version(db_path: str = DB_PATH) -> tuple:
+    """Cheap fingerprint of ftd_files; changes whenever a half-month is ingested or replaced."""
+    conn = _connect(db_path)
+    version = conn.execute('SELECT COUNT(*), MAX(ingest_timestamp), SUM(row_count) FROM ftd_files').fetchone()
+    conn.close()
+    return version
+
+def invalidate_cache():
+    """Drop every cached result (the ledger-version key already covers other processes)."""
+    _symbol_series.cache_clear()
+    _top_symbols.cache_clear()
+    _settlement_dates.cache_clear()
+
+def _typed(df: pd.DataFrame) -> pd.DataFrame:
+    df['date'] = pd.to_datetime(df['date'], format='%Y-%m-%d')
+    df['quantity'] = df['quantity'].fillna(0).astype('int64')
+    df['price'] = df['price'].astype('float64')
+    df['value'] = df['quantity'] * df['price']  # Dollar value of fails
+    return df
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _symbol_series(db_path: str, symbols: tuple, start: str, end: str, version: tuple) -> pd.DataFrame:
+    placeholders = ', '.join('?' * len(symbols))
+    conn = _connect(db_path)
+    df = pd.read_sql_query(f'''
+    SELECT f.date, s.symbol, f.quantity, f.price
+    FROM ftd_securities s
+    JOIN ftd_facts f ON f.security_id = s.security_id
+    WHERE s.symbol IN ({placeholders}) AND f.date BETWEEN ? AND ?
+    ORDER BY f.date, s.symbol
+    ''', conn, params=(*symbols, start, end))
+    conn.close()
+    return _typed(df)
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _top_symbols(db_path: str, start: str, end: str, n: int, by: str, version: tuple) -> pd.DataFrame:
+    order = 'f.quantity' if by == 'quantity' else 'f.quantity * f.price'
+    conn = _connect(db_path)
+    df = pd.read_sql_query(f'''
+    SELECT date, symbol, quantity, price, rank FROM (
+        SELECT f.date, s.symbol, f.quantity, f.price,
+               ROW_NUMBER() OVER (PARTITION BY f.date ORDER BY {order} DESC) AS rank
+        FROM ftd_facts f
+        JOIN ftd_securities s ON s.security_id = f.security_id
+        WHERE f.date BETWEEN ? AND ?
+    ) WHERE rank <= ?
+    ORDER BY date, rank
+    ''', conn, params=(start, end, n))
+    conn.close()
+    df['rank'] = df['rank'].astype('int64')
+    return _typed(df)
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _settlement_dates(db_path: str, start: str, end: str, version: tuple) -> pd.DatetimeIndex:
+    conn = _connect(db_path)
+    dates = [r[0] for r in conn.execute('SELECT DISTINCT date FROM ftd_facts WHERE date BETWEEN ? AND ? ORDER BY date',
+                                        (start, end)).fetchall()]
+    conn.close()
+    return pd.DatetimeIndex(pd.to_datetime(dates, format='%Y-%m-%d'), name='date')
+
+def get_symbol_series(symbols, start: str = '1900-01-01', end: str = '9999-12-31', db_path: str = DB_PATH) -> pd.DataFrame:
+    """All FTD rows for one or more symbols: date, symbol, quantity, price, value (sorted by date)."""
+    if isinstance(symbols, str):
+        symbols = [symbols]
+    symbols = tuple(sorted(set(s.upper() for s in symbols)))
+    return _symbol_series(db_path, symbols, start, end, ledger_version(db_path)).copy()
+
+def top_symbols(start: str, end: str = None, n: int = 10, by: str = 'quantity', db_path: str = DB_PATH) -> pd.DataFrame:
+    """Top-n symbols per settlement date in [start, end], ranked by 'quantity' or dollar 'value'."""
+    if by not in ('quantity', 'value'):
+        raise ValueError(f"by must be 'quantity' or 'value', got {by!r}")
+    return _top_symbols(db_path, start, end or start, n, by, ledger_version(db_path)).copy()
+
+def rolling_fails(symbol: str, window: int = 20, start: str = '1900-01-01', end: str = '9999-12-31',
+                  db_path: str = DB_PATH) -> pd.DataFrame:
+    """Per-settlement-date quantity/value for one symbol with `window`-date rolling sums.
+
+    Dates with no reported fails for the symbol count as zero (they are present for other symbols).
+    """
+    version = ledger_version(db_path)
+    series = _symbol_series(db_path, (symbol.upper(),), start, end, version)
+    daily = series.groupby('date')[['quantity', 'value']].sum()
+    daily = daily.reindex(_settlement_dates(db_path, start, end, version), fill_value=0)
+    daily['quantity'] = daily['quantity'].astype('int64')
+    daily[f'quantity_{window}d'] = daily['quantity'].rolling(window, min_periods=1).sum().astype('int64')
+    daily[f'value_{window}d'] = daily['value'].rolling(window, min_periods=1).sum()
+    return daily.reset_index()
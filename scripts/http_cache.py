@@ -0,0 +1,185 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.path.join('data', 'http_cache')
+MAX_CACHE_BYTES = int(os.getenv('HTTP_CACHE_MAX_MB', '2048')) * 1024 * 1024  # Eviction threshold for stored blobs
+
+CacheResult = namedtuple('CacheResult', ['path', 'sha256', 'size', 'status'])  # status: 'hit' (304) or 'miss' (200)
+
+class HTTPCache:
+    """Content-addressed on-disk cache for (nearly) immutable downloads, revalidated via ETag/Last-Modified.
+
+    Blobs live under <cache_dir>/blobs/<sha[:2]>/<sha>; index.db maps URL -> blob plus validators.
+    Identical bodies served from different URLs are stored once. Least-recently-used URLs are
+    evicted until distinct blob bytes fit under max_bytes.
+    """
+    def __init__(self, cache_dir: str = CACHE_DIR, max_bytes: int = MAX_CACHE_BYTES):
+        self.cache_dir = cache_dir
+        self.blob_dir = os.path.join(cache_dir, 'blobs')
+        self.index_path = os.path.join(cache_dir, 'index.db')
+        self.max_bytes = max_bytes
+        self.stats = {'hit': 0, 'miss': 0, 'evicted': 0}
+        self._lock = threading.Lock()  # Serializes index writes/eviction across download workers
+        os.makedirs(self.blob_dir, exist_ok=True)
+        conn = sqlite3.connect(self.index_path)
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS entries (
+            url TEXT PRIMARY KEY,
+            sha256 TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            etag TEXT,
+            last_modified TEXT,
+            fetched_at TEXT NOT NULL,
+            last_access REAL NOT NULL
+        )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_entries_sha ON entries (sha256)')
+        conn.commit()
+        conn.close()
+
+    def blob_path(self, sha256: str) -> str:
+        return os.path.join(self.blob_dir, sha256[:2], sha256)
+
+    def _lookup(self, url: str):
+        conn = sqlite3.connect(self.index_path)
+        row = conn.execute('SELECT sha256, size, etag, last_modified FROM entries WHERE url = ?', (url,)).fetchone()
+        conn.close()
+        if row and os.path.exists(self.blob_path(row[0])):
+            return row
+        return None  # Unknown URL, or blob deleted out from under the index
+
+    def fetch(self, session, url: str, timeout: int = 30, revalidate: bool = True) -> CacheResult:
+        """GET url through the cache; a 304 reuses the stored blob, a 200 stores the new body.
+
+        revalidate=False skips the conditional headers and always downloads the body.
+        """
+        entry = self._lookup(url) if revalidate else None
+        headers = {}
+        if entry:
+            if entry[2]:
+                headers['If-None-Match'] = entry[2]
+            if entry[3]:
+                headers['If-Modified-Since'] = entry[3]
+        resp = session.get(url, headers=headers, timeout=timeout, stream=True)
+        try:
+            if resp.status_code == 304 and entry:
+                sha256, size = entry[0], entry[1]
+                with self._lock:
+                    if os.path.exists(self.blob_path(sha256)):
+                        self._touch(url)
+                        self.stats['hit'] += 1
+                        logger.debug(f"Cache hit (304): {url}")
+                        return CacheResult(self.blob_path(sha256), sha256, size, 'hit')
+                sha256 = None  # Evicted or replaced since the lookup; refetch the body below
+            else:
+                resp.raise_for_status()
+                sha256, size = self._store_body(resp)
+        finally:
+            resp.close()
+        if sha256 is None:
+            logger.debug(f"Cache blob gone after 304, refetching: {url}")
+            return self.fetch(session, url, timeout, revalidate=False)
+        with self._lock:
+            conn = sqlite3.connect(self.index_path)
+            previous = conn.execute('SELECT sha256 FROM entries WHERE url = ?', (url,)).fetchone()
+            conn.execute('''
+            INSERT INTO entries (url, sha256, size, etag, last_modified, fetched_at, last_access)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(url) DO UPDATE SET
+                sha256 = excluded.sha256, size = excluded.size, etag = excluded.etag,
+                last_modified = excluded.last_modified, fetched_at = excluded.fetched_at,
+                last_access = excluded.last_access
+            ''', (url, sha256, size, resp.headers.get('ETag'), resp.headers.get('Last-Modified'),
+                  datetime.now().isoformat(), time.time()))
+            if previous and previous[0] != sha256:
+                self._drop_blob_if_unused(conn, previous[0])  # The URL's old body, unless another URL shares it
+            conn.commit()
+            conn.close()
+            self.stats['miss'] += 1
+            self._evict(keep_url=url)
+        logger.debug(f"Cache miss: {url} ({size:,} bytes, sha256 {sha256[:12]})")
+        return CacheResult(self.blob_path(sha256), sha256, size, 'miss')
+
+    def fetch_file(self, session, url: str, timeout: int = 30):
+        """fetch() and open the blob, returning (binary file object, CacheResult).
+
+        The blob is opened under the lock, so another worker's eviction can't remove it between
+        lookup and read; once open, the handle stays readable even if the blob is later unlinked.
+        If it is already gone, the URL is downloaded again as a miss.
+        """
+        result = self.fetch(session, url, timeout)
+        for attempt in range(2):
+            with self._lock:
+                try:
+                    return open(result.path, 'rb'), result
+                except FileNotFoundError:
+                    if attempt:
+                        raise
+            logger.debug(f"Cache blob evicted before read, refetching: {url}")
+            result = self.fetch(session, url, timeout, revalidate=False)
+
+    def _store_body(self, resp):
+        """Stream the body to a temp file while hashing, then move it to its content address."""
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                for block in resp.iter_content(chunk_size=256 * 1024):
+                    digest.update(block)
+                    out.write(block)
+                    size += len(block)
+            sha256 = digest.hexdigest()
+            dest = self.blob_path(sha256)
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            os.replace(tmp_path, dest)  # Same content -> same path, so a re-download just overwrites itself
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return sha256, size
+
+    def _touch(self, url: str):
+        conn = sqlite3.connect(self.index_path)
+        conn.execute('UPDATE entries SET last_access = ? WHERE url = ?', (time.time(), url))
+        conn.commit()
+        conn.close()
+
+    def _evict(self, keep_url: str = None):
+        """Drop least-recently-used URLs until distinct blob bytes fit max_bytes (caller holds the lock)."""
+        conn = sqlite3.connect(self.index_path)
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT sha256, size FROM entries)').fetchone()[0]
+        if total <= self.max_bytes:
+            conn.close()
+            return
+        victims = conn.execute('SELECT url, sha256, size FROM entries WHERE url != ? ORDER BY last_access',
+                               (keep_url or '',)).fetchall()
+        for url, sha256, size in victims:
+            if total <= self.max_bytes:
+                break
+            conn.execute('DELETE FROM entries WHERE url = ?', (url,))
+            if self._drop_blob_if_unused(conn, sha256):
+                total -= size
+            self.stats['evicted'] += 1
+            logger.debug(f"Evicted {url} from cache")
+        conn.commit()
+        conn.close()
+
+    def _drop_blob_if_unused(self, conn, sha256: str) -> bool:
+        """Delete a blob no entry references any more (caller holds the lock); True if it was unreferenced."""
+        if conn.execute('SELECT 1 FROM entries WHERE sha256 = ? LIMIT 1', (sha256,)).fetchone():
+            return False
+        try:
+            os.remove(self.blob_path(sha256))
+        except FileNotFoundError:
+            pass
+        return True
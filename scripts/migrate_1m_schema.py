@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+One-off migration of stock_ticker_1m_data.db's TEXT-keyed historical_1m table
+to the integer-time layout (tickers + bars_1m + historical_1m view), then
+VACUUM to actually release the freed pages. Safe to re-run; a migrated DB is
+left as is.
+
+Usage (from repo root): python scripts/migrate_1m_schema.py [path/to/stock_ticker_1m_data.db]
+"""
+import logging
+import os
+import sqlite3
+import sys
+import time
+
+from bars_1m import DB_PATH, create_bars_schema, logger, migrate_legacy_bars
+
+def migrate(db_path: str = DB_PATH):
+    size_before = os.path.getsize(db_path)
+    start = time.time()
+    conn = sqlite3.connect(db_path)
+    rows = migrate_legacy_bars(conn)
+    create_bars_schema(conn)
+    conn.commit()
+    logger.info("Vacuuming to reclaim space...")
+    conn.execute('VACUUM')
+    tickers = conn.execute('SELECT COUNT(*) FROM tickers').fetchone()[0]
+    bars = conn.execute('SELECT COUNT(*) FROM bars_1m').fetchone()[0]
+    conn.close()
+    size_after = os.path.getsize(db_path)
+    logger.info(f"{db_path}: migrated {rows:,} rows in {time.time() - start:.1f}s | "
+                f"{bars:,} bars, {tickers:,} tickers | "
+                f"size {size_before / 1e6:.1f} MB -> {size_after / 1e6:.1f} MB ({size_after / size_before:.0%})")
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    migrate(sys.argv[1] if len(sys.argv) > 1 else DB_PATH)
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+One-off migration of ftd_data.db to the dictionary-encoded layout
+(ftd_securities dimension + ftd_facts + ftd_data view), then VACUUM to
+actually release the freed pages. Safe to re-run; a migrated DB is left as is.
+
+Usage (from repo root): python scripts/migrate_ftd_schema.py [path/to/ftd_data.db]
+"""
+import os
+import sqlite3
+import sys
+import time
+
+from ftd_data_pull import DB_PATH, create_schema, logger, migrate_legacy_schema
+
+def migrate(db_path: str = DB_PATH):
+    size_before = os.path.getsize(db_path)
+    start = time.time()
+    conn = sqlite3.connect(db_path)
+    rows = migrate_legacy_schema(conn)
+    create_schema(conn.cursor())
+    conn.commit()
+    logger.info("Vacuuming to reclaim space...")
+    conn.execute('VACUUM')
+    securities = conn.execute('SELECT COUNT(*) FROM ftd_securities').fetchone()[0]
+    facts = conn.execute('SELECT COUNT(*) FROM ftd_facts').fetchone()[0]
+    conn.close()
+    size_after = os.path.getsize(db_path)
+    logger.info(f"{db_path}: migrated {rows:,} rows in {time.time() - start:.1f}s | "
+                f"{facts:,} facts, {securities:,} securities | "
+                f"size {size_before / 1e6:.1f} MB -> {size_after / 1e6:.1f} MB ({size_after / size_before:.0%})")
+
+if __name__ == '__main__':
+    migrate(sys.argv[1] if len(sys.argv) > 1 else DB_PATH)
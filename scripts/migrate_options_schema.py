@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+One-off migration of gme_data.db's flat options_data table to the integer-keyed
+layout (option_contracts + options_loads + options_facts + options_data view),
+then VACUUM to actually release the freed pages. Safe to re-run; a migrated DB
+is left as is.
+
+Usage (from repo root): python scripts/migrate_options_schema.py [path/to/gme_data.db]
+"""
+import logging
+import os
+import sqlite3
+import sys
+import time
+
+from database import DB_PATH, create_options_schema, logger, migrate_legacy_options
+
+def migrate(db_path: str = DB_PATH):
+    size_before = os.path.getsize(db_path)
+    start = time.time()
+    conn = sqlite3.connect(db_path)
+    rows = migrate_legacy_options(conn)
+    create_options_schema(conn.cursor())
+    conn.commit()
+    logger.info("Vacuuming to reclaim space...")
+    conn.execute('VACUUM')
+    contracts = conn.execute('SELECT COUNT(*) FROM option_contracts').fetchone()[0]
+    facts = conn.execute('SELECT COUNT(*) FROM options_facts').fetchone()[0]
+    conn.close()
+    size_after = os.path.getsize(db_path)
+    logger.info(f"{db_path}: migrated {rows:,} rows in {time.time() - start:.1f}s | "
+                f"{facts:,} facts, {contracts:,} contracts | "
+                f"size {size_before / 1e6:.1f} MB -> {size_after / 1e6:.1f} MB ({size_after / size_before:.0%})")
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    migrate(sys.argv[1] if len(sys.argv) > 1 else DB_PATH)
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Gap index and backfill planning for 1m bars (bars_1m).
+
+Expected bars are every regular-session minute (09:30-16:00 New York, 13:00 on
+early-close days) of every trading day in the cached holiday calendar;
+missing ones are grouped into contiguous gap ranges per ticker. Gaps inside the
+provider's 1m window (MAX_LOOKBACK) are planned as backfill batches: one span
+per ticker from its earliest gap, tickers packed YF_BATCH_SIZE to a request.
+After a clean run each ticker's checked-through minute is recorded, and later
+runs only look for gaps after it, so minutes the provider simply doesn't have
+(illiquid tickers) are not requested again as the window slides.
+
+Usage (from repo root):
+    python scripts/minute_gaps.py [--days 7] [--tickers GME KOSS]   # coverage report
+    python scripts/minute_gaps.py --backfill                          # report, then fetch fetchable gaps
+"""
+import argparse
+import logging
+import os
+import sqlite3
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+from market_holidays import load_holidays_dict
+from stock_ticker_1m_pull import DB_PATH, MAX_LOOKBACK, TICKERS, YF_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+MARKET_TZ = 'America/New_York'
+SESSION_OPEN = '09:30'
+SESSION_MINUTES = 390  # 09:30-15:59
+EARLY_CLOSE_MINUTES = 210  # 09:30-12:59
+GAP_MIN_MINUTES = int(os.getenv('GAP_MIN_MINUTES', '5'))  # Shorter holes are usually just minutes with no trades
+SETTLE_DELAY = timedelta(minutes=15)  # Most recent minutes aren't expected yet
+
+def early_close_dates(years) -> set:
+    """NYSE 13:00 closes: July 3, the day after Thanksgiving and Christmas Eve (when they are weekdays)."""
+    closes = set()
+    for year in years:
+        thanksgiving = pd.Timestamp(year, 11, 1) + pd.offsets.WeekOfMonth(week=3, weekday=3)
+        for day in (date(year, 7, 3), (thanksgiving + timedelta(days=1)).date(), date(year, 12, 24)):
+            if day.weekday() < 5:
+                closes.add(day)
+    return closes
+
+def expected_minutes(start_utc: datetime, end_utc: datetime, holidays: dict = None) -> np.ndarray:
+    """Sorted epoch minutes (UTC) of every regular-session bar in [start_utc, end_utc)."""
+    holidays = load_holidays_dict() if holidays is None else holidays
+    closed = {d for days in holidays.values() for d in days}
+    start_utc, end_utc = pd.Timestamp(start_utc), pd.Timestamp(end_utc)
+    days = pd.bdate_range(start_utc.tz_convert(MARKET_TZ).date(), end_utc.tz_convert(MARKET_TZ).date())
+    days = days[~days.strftime('%Y-%m-%d').isin(closed)]
+    if days.empty:
+        return np.empty(0, dtype=np.int64)
+    early = early_close_dates(set(days.year))
+    opens = (pd.DatetimeIndex(days.strftime('%Y-%m-%d') + ' ' + SESSION_OPEN).tz_localize(MARKET_TZ)
+             .tz_convert('UTC').asi8 // 60_000_000_000)
+    lengths = np.where(np.isin(days.date, list(early)), EARLY_CLOSE_MINUTES, SESSION_MINUTES)
+    minutes = np.repeat(opens, lengths) + (np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths))
+    lo, hi = start_utc.value // 60_000_000_000, end_utc.value // 60_000_000_000
+    return minutes[(minutes >= lo) & (minutes < hi)]
+
+def stored_minutes(conn, tickers, start_utc: datetime, end_utc: datetime) -> dict:
+    """{ticker: sorted epoch minutes stored in [start_utc, end_utc)}, one clustered range scan per ticker."""
+    placeholders = ', '.join('?' * len(tickers))
+    rows = conn.execute(f'''
+    SELECT t.ticker, b.epoch_minute FROM tickers t
+    JOIN bars_1m b ON b.ticker_id = t.ticker_id AND b.epoch_minute >= ? AND b.epoch_minute < ?
+    WHERE t.ticker IN ({placeholders})
+    ''', (pd.Timestamp(start_utc).value // 60_000_000_000, pd.Timestamp(end_utc).value // 60_000_000_000,
+          *tickers)).fetchall()
+    df = pd.DataFrame(rows, columns=['ticker', 'minute'])
+    return {t: np.sort(g['minute'].to_numpy(dtype=np.int64)) for t, g in df.groupby('ticker')}
+
+def gap_ranges(expected: np.ndarray, stored: np.ndarray) -> pd.DataFrame:
+    """Contiguous runs of missing session minutes; a run may span the overnight break between sessions."""
+    missing = ~np.isin(expected, stored)
+    pos = np.flatnonzero(missing)
+    if pos.size == 0:
+        return pd.DataFrame({'start': [], 'end': [], 'minutes': []}, dtype=np.int64)
+    breaks = np.flatnonzero(np.diff(pos) != 1)
+    first = pos[np.r_[0, breaks + 1]]
+    last = pos[np.r_[breaks, pos.size - 1]]
+    return pd.DataFrame({'start': expected[first], 'end': expected[last], 'minutes': last - first + 1})
+
+def find_gaps(conn, tickers, start_utc: datetime, end_utc: datetime, holidays: dict = None,
+              after: dict = None) -> pd.DataFrame:
+    """Gap index: ticker, start/end (epoch minutes, inclusive) and missing minute count per contiguous hole.
+
+    after maps ticker -> epoch minute; only that ticker's minutes after it are considered.
+    """
+    expected = expected_minutes(start_utc, end_utc, holidays)
+    stored = stored_minutes(conn, tickers, start_utc, end_utc)
+    after = after or {}
+    frames = [gap_ranges(expected[expected > after.get(t, -1)], stored.get(t, np.empty(0, dtype=np.int64))).assign(ticker=t)
+              for t in tickers]
+    gaps = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=['start', 'end', 'minutes', 'ticker'])
+    return gaps[['ticker', 'start', 'end', 'minutes']].astype({'start': 'int64', 'end': 'int64', 'minutes': 'int64'})
+
+def coverage_report(conn, tickers, start_utc: datetime, end_utc: datetime, now_utc: datetime = None,
+                    holidays: dict = None) -> pd.DataFrame:
+    """Per ticker: expected/stored/missing session minutes, coverage %, gap count and how many are still fetchable."""
+    now_utc = now_utc or datetime.now(timezone.utc)
+    expected = expected_minutes(start_utc, end_utc, holidays)
+    gaps = find_gaps(conn, tickers, start_utc, end_utc, holidays)
+    window_start = pd.Timestamp(now_utc - MAX_LOOKBACK).value // 60_000_000_000
+    rows = []
+    for ticker in tickers:
+        g = gaps[gaps['ticker'] == ticker]
+        missing = int(g['minutes'].sum())
+        rows.append({
+            'ticker': ticker, 'expected': len(expected), 'stored': len(expected) - missing, 'missing': missing,
+            'coverage_pct': round(100.0 * (len(expected) - missing) / len(expected), 2) if len(expected) else 100.0,
+            'gaps': len(g), 'fetchable_gaps': int((g['end'] >= window_start).sum()),
+        })
+    return pd.DataFrame(rows)
+
+def create_checked_schema(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS historical_1m_gap_checked (
+        ticker TEXT PRIMARY KEY,
+        checked_through INTEGER NOT NULL,
+        checked_at TEXT NOT NULL
+    ) WITHOUT ROWID
+    ''')
+    # Per-gap attempt keys shifted whenever the window start clipped a gap; superseded by the watermark
+    conn.execute('DROP TABLE IF EXISTS historical_1m_gap_attempts')
+
+def plan_backfill(conn, tickers, now_utc: datetime, batch_size: int = YF_BATCH_SIZE, min_minutes: int = GAP_MIN_MINUTES,
+                  holidays: dict = None):
+    """Fetchable gaps in the provider window, packed into [(start, [tickers])] batches; returns (batches, gaps planned).
+
+    Only minutes after each ticker's checked-through watermark count, so a gap already requested is not
+    planned again when the sliding window start clips it or when it keeps growing at the live end.
+    """
+    create_checked_schema(conn)
+    window_start = now_utc - MAX_LOOKBACK
+    checked = dict(conn.execute('SELECT ticker, checked_through FROM historical_1m_gap_checked').fetchall())
+    gaps = find_gaps(conn, tickers, window_start, now_utc - SETTLE_DELAY, holidays, after=checked)
+    gaps = gaps[gaps['minutes'] >= min_minutes]
+    if gaps.empty:
+        return [], gaps
+    # One span per ticker from its earliest gap; the whole window fits a single request, so pack tickers
+    # by span start and let each batch start at its earliest member (extra bars are ignored on insert)
+    spans = gaps.groupby('ticker')['start'].min().sort_values()
+    batches = []
+    for i in range(0, len(spans), batch_size):
+        chunk = spans.iloc[i:i + batch_size]
+        start = max(pd.Timestamp(int(chunk.min()) * 60, unit='s', tz='UTC').to_pydatetime(), window_start)
+        batches.append((start, list(chunk.index)))
+    return batches, gaps
+
+def record_checked(conn, tickers, now_utc: datetime):
+    """Advance the tickers' watermark to the end of the window plan_backfill just checked at now_utc."""
+    through = pd.Timestamp(now_utc - SETTLE_DELAY).value // 60_000_000_000 - 1  # Window end is exclusive
+    now = datetime.now().isoformat()
+    conn.executemany('''
+    INSERT INTO historical_1m_gap_checked VALUES (?, ?, ?)
+    ON CONFLICT(ticker) DO UPDATE SET checked_through = MAX(checked_through, excluded.checked_through),
+        checked_at = excluded.checked_at
+    ''', [(t, through, now) for t in tickers])
+    conn.commit()
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, default=7, help='Report window in calendar days')
+    parser.add_argument('--tickers', nargs='+', default=TICKERS)
+    parser.add_argument('--backfill', action='store_true', help='Fetch fetchable gaps after reporting')
+    args = parser.parse_args()
+    now_utc = datetime.now(timezone.utc)
+    conn = sqlite3.connect(DB_PATH)
+    report = coverage_report(conn, args.tickers, now_utc - timedelta(days=args.days), now_utc - SETTLE_DELAY, now_utc)
+    conn.close()
+    print(report.to_string(index=False))
+    if args.backfill:
+        from stock_ticker_1m_pull import run
+        rows, errors, batch_count = run(args.tickers, backfill=True)
+        print(f"Backfill: {rows:,} rows inserted in {batch_count} batches, {len(errors)} errors")
@@ -24,23 +24,48 @@ start_time = time.time()
 
 # Import fetchers
 from occ_series_fetcher import OCCSeriesFetcher
+FETCHERS = {'OCCSeriesFetcher': OCCSeriesFetcher}  # sources.json 'fetcher' name -> class
 
 # Load config
 with open('sources.json', 'r') as f:
     sources = json.load(f)
 
-# DB setup (fix paren)
-conn = sqlite3.connect(os.path.join('data', 'gme_data.db'))  # Fixed
+# Expand watchlist entries ("params": {"symbols": [...]}) into one source per underlying
+expanded = []
+for src in sources:
+    symbols = src['params'].get('symbols')
+    if not symbols:
+        expanded.append(src)
+        continue
+    for sym in symbols:
+        params = {k: v for k, v in src['params'].items() if k != 'symbols'}
+        params['symbol'] = sym
+        expanded.append({**src, 'name': f"{src['name']}_{sym}", 'params': params})
+sources = expanded
+
+# DB setup is lazy: a run where every snapshot is unchanged never opens the DB
 from database import init_db, get_last_date, insert_data
+from options_history import OPTIONS_STORAGE, init_history_db, ingest_snapshot
 drop_table = os.getenv('DROP_TABLE', 'false').lower() == 'true'
-init_db(drop_table=drop_table)
-logger.info(f"Daily pull started at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} | Sources: {len(sources)} | Drop table: {drop_table}")
+conn = None
+
+def open_db():
+    global conn
+    if conn is None:
+        init_db(drop_table=drop_table)
+        if OPTIONS_STORAGE == 'delta':
+            init_history_db()
+        conn = sqlite3.connect(os.path.join('data', 'gme_data.db'))
+    return conn
+
+logger.info(f"Daily pull started at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} | Sources: {len(sources)} | Drop table: {drop_table} | Storage: {OPTIONS_STORAGE}")
 
 # Trading day check
 today_date = date.today()
 errors = []  # Collect here
 total_inserted = 0
 skipped_sources = 0  # Track skips explicitly
+unchanged_sources = 0  # Snapshot identical to today's stored one (not parsed, no DB work)
 if not is_trading_day(today_date):
     logger.info(f"Non-trading day ({today_date}): {today_date.strftime('%A')} or holiday. Skipping pull.")
     status = 'warning'
@@ -48,33 +73,63 @@ if not is_trading_day(today_date):
 else:
     # Default notes
     notes = f"Processed {len(sources)} sources"
+    # One fetcher per class; classes with fetch_many() pull all their underlyings concurrently up front
+    fetchers = {}
+    prefetched = {}
+    for src in sources:
+        if src['fetcher'] not in fetchers:
+            fetchers[src['fetcher']] = FETCHERS[src['fetcher']]()
+            if drop_table and hasattr(fetchers[src['fetcher']], 'snapshot_state'):
+                fetchers[src['fetcher']].snapshot_state = {}  # Table is being rebuilt; stored hashes no longer apply
+    for class_name, fetcher in fetchers.items():
+        if not hasattr(fetcher, 'fetch_many'):
+            continue
+        batch = [src for src in sources if src['fetcher'] == class_name]
+        symbols = list(dict.fromkeys(src['params'].get('symbol', 'GME') for src in batch))
+        fetch_start = time.time()
+        results = fetcher.fetch_many(symbols)
+        logger.info(f"{class_name}: fetched {len(symbols)} underlyings in {time.time() - fetch_start:.1f}s")
+        for src in batch:
+            prefetched[src['name']] = results[src['params'].get('symbol', 'GME')]
     for src in sources:
         src_name = src['name']
         logger.info(f"Processing {src_name} | Params: {src['params']} | Table: {src['table']}")
         try:
-            fetcher_class = globals()[src['fetcher']]
-            fetcher = fetcher_class()
-            df = fetcher.fetch(src['params'])
+            fetcher = fetchers[src['fetcher']]
+            df = prefetched[src['name']] if src['name'] in prefetched else fetcher.fetch(src['params'])
+            symbol = src['params'].get('symbol', 'GME')
+            if symbol in getattr(fetcher, 'unchanged', {}):
+                logger.info(f"{src_name}: Snapshot unchanged since last stored pull, skipped.")
+                unchanged_sources += 1
+                continue
             if df is None or df.empty:
                 error_msg = f"{src_name}: Fetch returned empty/None, skipped."
                 logger.warning(error_msg)
                 errors.append(error_msg)  # Flag as soft error for status
                 continue
             df = fetcher.normalize(df, src_name)
-            df['ticker'] = src['params'].get('symbol', 'GME')
-            # Delta check
-            last_date = get_last_date(src['table'], conn)
+            df['ticker'] = symbol
+            # Delta check (per ticker, so one underlying's insert doesn't mask the others)
+            conn = open_db()
+            # Both layouts keep a per-(ticker, date) table that answers this without scanning the chain
+            table = 'options_snapshots' if OPTIONS_STORAGE == 'delta' else 'options_loads' if src['table'] == 'options_data' else src['table']
+            last_date = get_last_date(table, conn, ticker=symbol)
             df_date = pd.to_datetime(df['date'].max()).strftime('%Y-%m-%d')
             last_date_str = pd.to_datetime(last_date).strftime('%Y-%m-%d') if last_date != '1900-01-01' else last_date
             logger.debug(f"{src_name}: DF max date '{df_date}' vs DB last '{last_date_str}'")
-            if df_date > last_date_str:
-                insert_data(df, src['table'], conn)
-                post_count = pd.read_sql(f"SELECT COUNT(*) FROM {src['table']}", conn).iloc[0, 0]
-                logger.info(f"{src_name}: Insert complete | Total rows in table now: {post_count}")
-                total_inserted += len(df)
+            if df_date > last_date_str and OPTIONS_STORAGE == 'delta':
+                total_inserted += ingest_snapshot(conn, df)
+            elif df_date > last_date_str:
+                inserted = insert_data(df, src['table'], conn)
+                logger.info(f"{src_name}: Insert complete | {inserted} new rows")
+                total_inserted += inserted
             else:
                 logger.info(f"{src_name}: No new data (max date {df_date} <= {last_date_str}), skipped.")
                 skipped_sources += 1
+            # Only remember the body once today's rows are known to be stored
+            stored_date = get_last_date(table, conn, ticker=symbol)
+            if hasattr(fetcher, 'commit_snapshot') and pd.to_datetime(stored_date).strftime('%Y-%m-%d') >= df_date:
+                fetcher.commit_snapshot(symbol)
         except Exception as e:
             error_msg = f"{src_name}: {str(e)}"
             logger.error(error_msg)
@@ -91,8 +146,12 @@ else:
         else:
             status = 'success'  # Treat no-new-data as success (idempotent run)
             notes += f" | No new data (skipped {skipped_sources})"
+    if unchanged_sources:
+        saved_bytes = sum(sum(getattr(f, 'unchanged', {}).values()) for f in fetchers.values())
+        notes += f" | Unchanged: {unchanged_sources} sources ({saved_bytes / 1024:.0f} KB not parsed)"
 
-conn.close()
+if conn is not None:
+    conn.close()
 duration = time.time() - start_time
 logger.info(f"DROP_TABLE env: {os.getenv('DROP_TABLE', 'false')}")
 logger.info(f"Daily pull complete at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} | Total new rows across sources: {total_inserted}")
@@ -1,21 +1,186 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import pandas as pd
-from io import StringIO
+import numpy as np
+import csv
+from io import BytesIO, StringIO
 from base_fetcher import BaseFetcher
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from throttle import RateLimiter
 import logging
+import os
+import json
+import hashlib
+import re
+import warnings
 
 logger = logging.getLogger(__name__)
 
+OCC_WORKERS = int(os.getenv('OCC_WORKERS', '4'))  # Underlyings fetched concurrently by fetch_many
+OCC_MAX_RPS = float(os.getenv('OCC_MAX_RPS', '2'))  # Global request cap across workers
+SNAPSHOT_STATE_PATH = os.path.join('data', 'occ_snapshot_state.json')  # Hash/validators of the last stored body per symbol
+
+MAX_FIELDS = 16  # Wider than any series row; longer lines are skipped by the tokenizer and logged as missed
+SKIPPED_LINE_RE = re.compile(r'Skipping line (\d+)')
+
+def _to_int(values: np.ndarray) -> np.ndarray:
+    """Strings -> int64, with the slow coercing path only when a value isn't a clean integer."""
+    try:
+        return values.astype(np.int64)
+    except (ValueError, TypeError):
+        return pd.to_numeric(pd.Series(values), errors='coerce').fillna(0).astype(int).to_numpy()
+
+def _factorize_rows(*columns):
+    """Codes for each distinct combination of the given columns, plus the first row index of each combination."""
+    key = np.zeros(len(columns[0]), dtype=np.int64)
+    for col in columns:
+        codes, uniques = pd.factorize(col)
+        key = key * (len(uniques) + 1) + codes + 1
+    _, first_rows, inverse = np.unique(key, return_index=True, return_inverse=True)
+    return inverse.ravel(), first_rows
+
+def _skipped_series_lines(text, line_numbers: list, symbol: str) -> list:
+    """Series lines (first token starting with symbol) among the 1-based line numbers the tokenizer skipped."""
+    lines = text.split(b'\n' if isinstance(text, bytes) else '\n')
+    picked = []
+    for n in line_numbers:
+        line = lines[n - 1]
+        line = (line.decode('utf-8', 'replace') if isinstance(line, bytes) else line).strip()
+        if line.split(maxsplit=1)[0].startswith(symbol):
+            picked.append(line)
+    return picked
+
+def parse_series_text(text, symbol: str = 'GME') -> pd.DataFrame:
+    """Parse an OCC series-search body (str or bytes) into one row per contract with open interest.
+
+    Rows look like: ProductSymbol year Month Day Integer Dec C P call_oi put_oi limit.
+    Lines are tokenized once by pandas' C reader. String formatting (zero padding, OSI roots,
+    strike codes) runs only on the distinct expiries/strikes and is broadcast back by code,
+    so per-row work is integer conversion and one concatenation per contract.
+    """
+    buf = BytesIO(text) if isinstance(text, bytes) else StringIO(text)
+    try:
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always', pd.errors.ParserWarning)
+            raw = pd.read_csv(buf, sep=r'\s+', header=None, names=range(MAX_FIELDS), dtype=str,
+                              quoting=csv.QUOTE_NONE, on_bad_lines='warn', engine='c',
+                              keep_default_na=False, na_values=[''])  # Only absent fields are NaN; NA/NULL are symbols
+    except pd.errors.EmptyDataError:
+        raw = pd.DataFrame(columns=range(MAX_FIELDS), dtype=str)
+        caught = []
+    skipped = []
+    for w in caught:
+        if issubclass(w.category, pd.errors.ParserWarning):
+            skipped += [int(n) for n in SKIPPED_LINE_RE.findall(str(w.message))]
+        else:
+            warnings.warn_explicit(w.message, w.category, w.filename, w.lineno)
+    overlong = _skipped_series_lines(text, skipped, symbol) if skipped else []
+    # Tokens are contiguous, so the field count follows from which trailing columns are filled
+    has = {k: raw[k].notna().to_numpy() for k in (9, 10, 11)}
+    first_codes, firsts = pd.factorize(raw[0])
+    prefix_ok = np.asarray(firsts.str.startswith(symbol), dtype=bool)
+    # Filter for symbol variants (e.g., GME, GME1) with at least 10 fields; everything else is header/noise
+    is_series = has[9] & (first_codes >= 0) & prefix_ok[first_codes]
+    regular = is_series & has[10] & ~has[11] & (raw[6] == 'C').to_numpy() & (raw[7] == 'P').to_numpy()
+    short = is_series & ~has[10]  # Irregular (e.g., put-only): assume C=0, fake 'C' indicator
+    missed = is_series & ~regular & ~short
+    if missed.any() or overlong:
+        missed_lines = overlong + raw[missed].head(3).apply(lambda r: ' '.join(r.dropna()), axis=1).tolist()
+        logger.warning(f"Missed {int(missed.sum()) + len(overlong)} irregular lines: {missed_lines[:3]}...")  # Log first 3
+
+    keep = regular | short
+    rows = raw[keep]
+    if rows.empty:
+        logger.warning("No data rows found.")
+        return pd.DataFrame()
+    is_short = short[keep]
+    # 10-field rows shift by the missing call column: P at 6, put_oi at 7
+    call_oi = np.where(is_short, 0, _to_int(np.where(is_short, '0', rows[8].to_numpy())))
+    put_oi = _to_int(np.where(is_short, rows[7].to_numpy(), rows[9].to_numpy()))
+
+    # Expiry pieces per distinct (ProductSymbol, year, Month, Day)
+    exp_codes, exp_rows = _factorize_rows(rows[0], rows[1], rows[2], rows[3])
+    expiries = rows.iloc[exp_rows, :4].to_numpy()
+    roots = np.array([f"{p}{y}{m.zfill(2)}{d.zfill(2)}" for p, y, m, d in expiries], dtype=object)
+    exp_dates = np.array([f"{y}-{m.zfill(2)}-{d.zfill(2)}" for _, y, m, d in expiries], dtype=object)
+    # Strike pieces per distinct (Integer, Dec)
+    strike_codes, strike_rows = _factorize_rows(rows[4], rows[5])
+    integers = pd.to_numeric(rows[4].iloc[strike_rows].reset_index(drop=True), errors='coerce')
+    decs = rows[5].iloc[strike_rows].reset_index(drop=True).str.zfill(3)  # '000'
+    strike_prices = np.asarray(integers + pd.to_numeric('0.' + decs), dtype=float)
+    strike_suffix = np.asarray(integers.astype(str).str.zfill(5) + decs + '00', dtype=object)
+
+    has_call = call_oi > 0
+    has_put = put_oi > 0
+    exp_idx = np.concatenate([exp_codes[has_call], exp_codes[has_put]])
+    strike_idx = np.concatenate([strike_codes[has_call], strike_codes[has_put]])
+    put_call = np.repeat(np.array(['C', 'P'], dtype=object), [has_call.sum(), has_put.sum()])
+    df = pd.DataFrame({
+        'contract_symbol': roots[exp_idx] + put_call + strike_suffix[strike_idx],
+        'put_call': put_call,
+        'strike_price': strike_prices[strike_idx],
+        'expiration_date': exp_dates[exp_idx],
+        'open_interest': np.concatenate([call_oi[has_call], put_oi[has_put]]),
+    })
+    if df.empty:
+        return pd.DataFrame()
+
+    # Add metadata (ticker added in daily_pull.py)
+    df.insert(0, 'date', datetime.now().strftime('%Y-%m-%d'))
+    df['volume'] = 0  # Placeholder; merge Polygon for volume/prices
+    df['last_price'] = 0.0
+    df['bid'] = 0.0
+    df['ask'] = 0.0
+    df['source'] = 'OCC'
+    logger.info(f"Fetched {len(df)} series for {symbol}. Unique ProductSymbols: {len(set(expiries[:, 0]))}.")
+    return df
+
+def create_session(pool_size: int = OCC_WORKERS):
+    """Pooled keep-alive session so each underlying doesn't pay a fresh TCP+TLS handshake."""
+    session = requests.Session()
+    retry_strategy = Retry(total=3, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504])
+    adapter = HTTPAdapter(max_retries=retry_strategy, pool_connections=1, pool_maxsize=max(pool_size, 1))
+    session.mount("https://", adapter)
+    session.headers.update({
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+    })
+    return session
+
+def load_snapshot_state(path: str = SNAPSHOT_STATE_PATH) -> dict:
+    """Load {symbol: {sha256, etag, last_modified, date, bytes}} for the last stored snapshot per underlying."""
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            return json.load(f)
+    return {}
+
 class OCCSeriesFetcher(BaseFetcher):
+    def __init__(self, session=None, state_path: str = SNAPSHOT_STATE_PATH):
+        self.session = session or create_session()
+        self.state_path = state_path
+        self.snapshot_state = load_snapshot_state(state_path)
+        self.pending = {}  # symbol -> state of the body just fetched; saved by commit_snapshot() after insert
+        self.unchanged = {}  # symbol -> body bytes not parsed because today's snapshot is already stored
+
     def fetch(self, params: dict) -> pd.DataFrame:
         symbol = params.get('symbol', 'GME')
         url = f"https://marketdata.theocc.com/series-search?symbolType=U&symbol={symbol}"
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        
-        resp = requests.get(url, headers=headers, timeout=10)
+        today = datetime.now().strftime('%Y-%m-%d')
+        # Only today's stored snapshot can make a fetch redundant; a new day always gets its own row
+        known = self.snapshot_state.get(symbol)
+        if known and known.get('date') != today:
+            known = None
+        headers = {}
+        if known and known.get('etag'):
+            headers['If-None-Match'] = known['etag']
+        if known and known.get('last_modified'):
+            headers['If-Modified-Since'] = known['last_modified']
+        resp = self.session.get(url, headers=headers, timeout=10)
+        if resp.status_code == 304 and known:
+            logger.info(f"{symbol}: OCC returned 304 Not Modified; skipping parse.")
+            self.unchanged[symbol] = known.get('bytes', 0)
+            return pd.DataFrame()
         if resp.status_code != 200:
             logger.error(f"OCC fetch failed: {resp.status_code}")
             return pd.DataFrame()
@@ -24,108 +189,51 @@ class OCCSeriesFetcher(BaseFetcher):
         if 'octet-stream' not in content_type and 'text/plain' not in content_type and 'txt' not in content_type:
             logger.warning(f"Unexpected content-type: {content_type}")
             return pd.DataFrame()
+
+        body_hash = hashlib.sha256(resp.content).hexdigest()
+        if known and known.get('sha256') == body_hash:
+            logger.info(f"{symbol}: Body unchanged since today's stored snapshot ({body_hash[:12]}); skipping parse.")
+            self.unchanged[symbol] = len(resp.content)
+            return pd.DataFrame()
+        self.pending[symbol] = {
+            'sha256': body_hash,
+            'etag': resp.headers.get('ETag'),
+            'last_modified': resp.headers.get('Last-Modified'),
+            'date': today,
+            'bytes': len(resp.content),
+        }
         
-        # Robust line-by-line parse: Filter for GME variants, handle 10/11 fields
         try:
-            lines = resp.text.splitlines()
-            data_rows = []
-            missed_lines = []  # For logging anomalies
-            for line in lines:
-                fields = line.split()  # Whitespace split
-                if len(fields) < 10 or not fields[0].startswith('GME'):
-                    continue  # Skip non-data/non-GME
-                
-                if len(fields) == 11:
-                    # Standard: ProductSymbol year Month Day Integer Dec C P call_oi put_oi limit
-                    if fields[6] == 'C' and fields[7] == 'P':  # Expected C/P order
-                        data_rows.append(fields)
-                    else:
-                        missed_lines.append(line)
-                elif len(fields) == 10:
-                    # Irregular (e.g., put-only): Assume C=0, insert fake 'C' '0' before put_oi
-                    fields.insert(7, '0')  # call_oi=0
-                    fields.insert(6, 'C')  # Fake C indicator
-                    data_rows.append(fields)
-                else:
-                    missed_lines.append(line)
-            
-            if missed_lines:
-                logger.warning(f"Missed {len(missed_lines)} irregular lines: {missed_lines[:3]}...")  # Log first 3
-            
-            if not data_rows:
-                logger.warning("No data rows found.")
-                return pd.DataFrame()
-            
-            # Build DF with columns
-            df_raw = pd.DataFrame(data_rows, columns=[
-                'ProductSymbol', 'year', 'Month', 'Day', 'Integer', 'Dec', 
-                'C_indicator', 'P_indicator', 'call_oi', 'put_oi', 'limit'
-            ])
-            
-            # Clean: Numeric types
-            df_raw['Integer'] = pd.to_numeric(df_raw['Integer'], errors='coerce')
-            df_raw['Dec'] = df_raw['Dec'].astype(str).str.zfill(3)  # '000'
-            df_raw['call_oi'] = pd.to_numeric(df_raw['call_oi'], errors='coerce').fillna(0).astype(int)
-            df_raw['put_oi'] = pd.to_numeric(df_raw['put_oi'], errors='coerce').fillna(0).astype(int)
-            df_raw['limit'] = pd.to_numeric(df_raw['limit'], errors='coerce').fillna(0).astype(int)
-            
-            # Drop invalid
-            df_raw = df_raw.dropna(subset=['ProductSymbol'])
-            
-            # Compute strike and expiry
-            df_raw['strike_price'] = df_raw['Integer'] + pd.to_numeric('0.' + df_raw['Dec'])
-            df_raw['expiration_date'] = (
-                df_raw['year'].astype(str) + '-' + 
-                df_raw['Month'].astype(str).str.zfill(2) + '-' + 
-                df_raw['Day'].astype(str).str.zfill(2)
-            )
-            
-            # Duplicate for calls/puts (only if OI >0)
-            calls = df_raw[df_raw['call_oi'] > 0].copy()
-            if not calls.empty:
-                calls['put_call'] = 'C'
-                calls['open_interest'] = calls['call_oi']
-                calls['contract_symbol'] = (
-                    calls['ProductSymbol'].astype(str) + 
-                    calls['year'].astype(str) + 
-                    calls['Month'].astype(str).str.zfill(2) + 
-                    calls['Day'].astype(str).str.zfill(2) + 'C' + 
-                    calls['Integer'].astype(str).str.zfill(5) + calls['Dec'] + '00'
-                )
-            
-            puts = df_raw[df_raw['put_oi'] > 0].copy()
-            if not puts.empty:
-                puts['put_call'] = 'P'
-                puts['open_interest'] = puts['put_oi']
-                puts['contract_symbol'] = (
-                    puts['ProductSymbol'].astype(str) + 
-                    puts['year'].astype(str) +  # Fixed: puts['year']
-                    puts['Month'].astype(str).str.zfill(2) + 
-                    puts['Day'].astype(str).str.zfill(2) + 'P' + 
-                    puts['Integer'].astype(str).str.zfill(5) + puts['Dec'] + '00'
-                )
-            
-            df = pd.concat([calls, puts], ignore_index=True)
-            if df.empty:
-                return pd.DataFrame()
-            
-            # Add metadata (ticker added in daily_pull.py)
-            df['date'] = datetime.now().strftime('%Y-%m-%d')
-            df['volume'] = 0  # Placeholder; merge Polygon for volume/prices
-            df['last_price'] = 0.0
-            df['bid'] = 0.0
-            df['ask'] = 0.0
-            df['source'] = 'OCC'
-            
-            # Select schema columns (date first, source last; ticker post-fetch)
-            df = df[[
-                'date', 'contract_symbol', 'put_call', 'strike_price', 'expiration_date', 
-                'open_interest', 'volume', 'last_price', 'bid', 'ask', 'source'
-            ]]
-            
-            logger.info(f"Fetched {len(df)} series for {symbol}. Unique ProductSymbols: {df_raw['ProductSymbol'].nunique()}.")
-            return df
-            
+            return parse_series_text(resp.content, symbol)
         except Exception as e:
             logger.error(f"Parse error: {e}")
             return pd.DataFrame()
+
+    def commit_snapshot(self, symbol: str):
+        """Record the fetched body as stored, so later runs today can skip it; call only after a successful insert."""
+        entry = self.pending.pop(symbol, None)
+        if entry is None:
+            return
+        self.snapshot_state[symbol] = entry
+        with open(self.state_path, 'w') as f:
+            json.dump(self.snapshot_state, f, indent=2)
+
+    def fetch_many(self, symbols: list, workers: int = OCC_WORKERS, max_rps: float = OCC_MAX_RPS) -> dict:
+        """Fetch several underlyings over the shared session; returns {symbol: df} in input order.
+
+        Up to `workers` requests are in flight at once, and all of them share one RateLimiter
+        capped at max_rps. A failed symbol yields an empty DataFrame instead of sinking the batch.
+        """
+        limiter = RateLimiter(max_rps)
+
+        def task(symbol):
+            limiter.wait()
+            try:
+                return self.fetch({'symbol': symbol})
+            except Exception as e:
+                logger.error(f"OCC fetch failed for {symbol}: {e}")
+                return pd.DataFrame()
+
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='occ') as pool:
+            results = list(pool.map(task, symbols))
+        return dict(zip(symbols, results))
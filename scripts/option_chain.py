@@ -0,0 +1,182 @@
+"""
+In-memory, array-backed view of one (ticker, date) options chain.
+
+OptionChain holds the snapshot as NumPy columns sorted by (expiration, strike,
+put_call), so expiry lookups and strike-range queries are binary searches and
+per-expiry slices are zero-copy. get_chain() keeps recently used chains in a
+process-wide LRU cache bounded by memory (OPTION_CHAIN_CACHE_MB), keyed on the
+snapshot's options_loads row so a re-ingested date is reloaded automatically.
+
+Example:
+    from option_chain import get_chain
+    chain = get_chain('GME', '2025-06-02')
+    strikes, call_oi, put_oi = chain.oi_by_strike('2025-06-20')
+    idx = chain.strike_range(20, 30, expiration='2025-06-20')
+"""
+import logging
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = os.path.join('data', 'gme_data.db')
+CACHE_MAX_BYTES = int(os.getenv('OPTION_CHAIN_CACHE_MB', '256')) * 1024 * 1024  # Evict LRU chains beyond this
+
+class OptionChain:
+    """One ticker's chain on one date as sorted NumPy columns (expiration, strike, is_call, open_interest, symbol)."""
+    def __init__(self, ticker: str, date: str, expiration, strike, is_call, open_interest, contract_symbol):
+        self.ticker = ticker
+        self.date = date
+        self.expiration = np.asarray(expiration, dtype='datetime64[D]')
+        self.strike = np.asarray(strike, dtype=np.float64)
+        self.is_call = np.asarray(is_call, dtype=bool)
+        self.open_interest = np.asarray(open_interest, dtype=np.int64)
+        self.contract_symbol = np.asarray(contract_symbol, dtype=object)
+        # Rows are sorted by expiry, so each expiry is one contiguous [start, stop) block
+        self.expirations, self._starts = np.unique(self.expiration, return_index=True)
+        self._stops = np.append(self._starts[1:], len(self.expiration))
+        # Secondary order for strike ranges across all expiries
+        self._by_strike = np.argsort(self.strike, kind='stable')
+        self._sorted_strike = self.strike[self._by_strike]
+
+    @classmethod
+    def load(cls, ticker: str, date: str, conn=None, db_path: str = DB_PATH) -> 'OptionChain':
+        own = conn is None
+        conn = conn or sqlite3.connect(db_path)
+        rows = conn.execute('''
+        SELECT expiration_date, strike_price, put_call, open_interest, contract_symbol
+        FROM options_data WHERE ticker = ? AND date = ?
+        ORDER BY expiration_date, strike_price, put_call
+        ''', (ticker, date)).fetchall()
+        if own:
+            conn.close()
+        if not rows:
+            raise KeyError(f"No options_data rows for {ticker} on {date}")
+        expiration, strike, put_call, oi, symbol = zip(*rows)
+        return cls(ticker, date, expiration, strike, np.array(put_call) == 'C',
+                   [o or 0 for o in oi], symbol)
+
+    def __len__(self) -> int:
+        return len(self.strike)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate resident size, used for cache accounting."""
+        arrays = (self.expiration, self.strike, self.is_call, self.open_interest, self.contract_symbol,
+                  self.expirations, self._starts, self._stops, self._by_strike, self._sorted_strike)
+        symbols = sum(len(s) + 49 for s in self.contract_symbol)  # str object overhead
+        return sum(a.nbytes for a in arrays) + symbols
+
+    def expiry_slice(self, expiration) -> slice:
+        """Row slice for one expiration (empty if it isn't listed)."""
+        exp = np.datetime64(expiration, 'D')
+        i = np.searchsorted(self.expirations, exp)
+        if i == len(self.expirations) or self.expirations[i] != exp:
+            return slice(0, 0)
+        return slice(int(self._starts[i]), int(self._stops[i]))
+
+    def expirations_between(self, start=None, end=None) -> np.ndarray:
+        lo = 0 if start is None else np.searchsorted(self.expirations, np.datetime64(start, 'D'), side='left')
+        hi = len(self.expirations) if end is None else np.searchsorted(self.expirations, np.datetime64(end, 'D'), side='right')
+        return self.expirations[lo:hi]
+
+    def strike_range(self, low: float, high: float, expiration=None) -> np.ndarray:
+        """Row indices with low <= strike <= high, for one expiration or across the whole chain."""
+        if expiration is not None:
+            s = self.expiry_slice(expiration)
+            strikes = self.strike[s]
+            lo, hi = np.searchsorted(strikes, low, side='left'), np.searchsorted(strikes, high, side='right')
+            return np.arange(s.start + lo, s.start + hi)
+        lo, hi = np.searchsorted(self._sorted_strike, low, side='left'), np.searchsorted(self._sorted_strike, high, side='right')
+        return np.sort(self._by_strike[lo:hi])
+
+    def oi_by_strike(self, expiration):
+        """(strikes, call_oi, put_oi) for one expiration, one entry per listed strike."""
+        s = self.expiry_slice(expiration)
+        strikes, inverse = np.unique(self.strike[s], return_inverse=True)
+        oi, calls = self.open_interest[s], self.is_call[s]
+        call_oi = np.bincount(inverse, weights=np.where(calls, oi, 0), minlength=len(strikes)).astype(np.int64)
+        put_oi = np.bincount(inverse, weights=np.where(calls, 0, oi), minlength=len(strikes)).astype(np.int64)
+        return strikes, call_oi, put_oi
+
+    def oi_by_expiry(self):
+        """(expirations, call_oi, put_oi) across the chain."""
+        codes = np.repeat(np.arange(len(self.expirations)), self._stops - self._starts)
+        call_oi = np.bincount(codes, weights=np.where(self.is_call, self.open_interest, 0), minlength=len(self.expirations))
+        put_oi = np.bincount(codes, weights=np.where(self.is_call, 0, self.open_interest), minlength=len(self.expirations))
+        return self.expirations, call_oi.astype(np.int64), put_oi.astype(np.int64)
+
+    def to_frame(self, rows=None) -> pd.DataFrame:
+        """Materialize some rows (an index array or slice; all by default) as a DataFrame."""
+        rows = slice(None) if rows is None else rows
+        return pd.DataFrame({
+            'contract_symbol': self.contract_symbol[rows], 'expiration_date': self.expiration[rows],
+            'strike_price': self.strike[rows], 'put_call': np.where(self.is_call[rows], 'C', 'P'),
+            'open_interest': self.open_interest[rows],
+        })
+
+class _ChainCache:
+    """Thread-safe LRU of OptionChain objects bounded by their total nbytes."""
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.stats = {'hit': 0, 'miss': 0, 'evicted': 0}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            chain = self._entries.get(key)
+            if chain is not None:
+                self._entries.move_to_end(key)
+                self.stats['hit'] += 1
+            else:
+                self.stats['miss'] += 1
+            return chain
+
+    def put(self, key, chain: OptionChain):
+        size = chain.nbytes
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old.nbytes
+            self._entries[key] = chain
+            self.bytes += size
+            while self.bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= evicted.nbytes
+                self.stats['evicted'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+_cache = _ChainCache(CACHE_MAX_BYTES)
+
+def get_chain(ticker: str, date: str, db_path: str = DB_PATH) -> OptionChain:
+    """Cached OptionChain for (ticker, date); the key includes the load's row count and ingest time."""
+    date = pd.to_datetime(date).strftime('%Y-%m-%d')
+    conn = sqlite3.connect(db_path)
+    try:
+        version = conn.execute('SELECT row_count, ingest_timestamp FROM options_loads WHERE ticker = ? AND date = ?',
+                               (ticker, date)).fetchone()
+        key = (db_path, ticker, date, version)
+        chain = _cache.get(key)
+        if chain is None:
+            chain = OptionChain.load(ticker, date, conn=conn)
+            _cache.put(key, chain)
+    finally:
+        conn.close()
+    return chain
+
+def cache_info() -> dict:
+    return {**_cache.stats, 'bytes': _cache.bytes, 'entries': len(_cache._entries), 'max_bytes': _cache.max_bytes}
+
+def clear_cache():
+    _cache.clear()
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Vectorized Black-Scholes implied volatility and Greeks over the stored options
+history, written to the derived options_greeks table in gme_data.db.
+
+IV is solved for every contract of a batch at once: Newton steps on vega,
+falling back to bisection wherever a step leaves the bracket. The underlying
+comes from the daily `historical` table in stock_ticker_data.db (last close on
+or before each date). OCC series data carries no option prices (the price
+columns are zero placeholders), so a contract without a usable price has its
+Greeks computed from the underlying's trailing realized volatility instead. iv
+holds market implied vol only (NULL otherwise), realized_vol the fallback, and
+iv_source records which one the Greeks used ('market' or 'realized').
+
+Dates are processed in chunks on a process pool (GREEKS_WORKERS), and only
+dates not yet attempted are computed unless --recompute is given. Contracts
+with neither market IV nor realized vol get no row. A date that yields no rows
+(e.g. no underlying close on or before it, or too little price history for a
+realized vol) is recorded in options_greeks_skipped rather than retried on
+every run.
+
+Usage (from repo root): python scripts/options_greeks.py [--ticker GME] [--workers 4] [--recompute]
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from database import bulk_write
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = os.path.join('data', 'gme_data.db')
+STOCK_DB_PATH = os.path.join('data', 'stock_ticker_data.db')
+RISK_FREE_RATE = float(os.getenv('RISK_FREE_RATE', '0.04'))  # Continuously compounded, flat across tenors
+REALIZED_VOL_WINDOW = 30  # Trading days of log returns behind the fallback volatility
+GREEKS_WORKERS = int(os.getenv('GREEKS_WORKERS', str(os.cpu_count() or 1)))
+DATES_PER_TASK = 20  # Snapshot dates handed to a worker at once
+
+IV_LOW, IV_HIGH = 1e-4, 5.0  # Solver bracket (annualized)
+IV_TOL = 1e-6  # Price tolerance
+IV_MAX_ITER = 60
+
+def norm_cdf(x: np.ndarray) -> np.ndarray:
+    """Standard normal CDF to double precision (Hart 1968, as given by West 2005) without SciPy."""
+    x = np.asarray(x, dtype=np.float64)
+    a = np.abs(x)
+    e = np.exp(-0.5 * a * a)
+    num = ((((((0.0352624965998911 * a + 0.700383064443688) * a + 6.37396220353165) * a + 33.912866078383) * a
+             + 112.079291497871) * a + 221.213596169931) * a + 220.206867912376)
+    den = (((((((0.0883883476483184 * a + 1.75566716318264) * a + 16.064177579207) * a + 86.7807322029461) * a
+              + 296.564248779674) * a + 637.333633378831) * a + 793.826512519948) * a + 440.413735824752)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tail_cf = a + 1.0 / (a + 2.0 / (a + 3.0 / (a + 4.0 / (a + 0.65))))
+        tail = np.where(a < 7.07106781186547, e * num / den, e / tail_cf / 2.506628274631)
+    tail = np.where(a > 37.0, 0.0, tail)
+    return np.where(x > 0, 1.0 - tail, tail)
+
+def norm_pdf(x: np.ndarray) -> np.ndarray:
+    return np.exp(-0.5 * x * x) / np.sqrt(2.0 * np.pi)
+
+def _d1_d2(spot, strike, t, rate, sigma):
+    vol_t = sigma * np.sqrt(t)
+    d1 = (np.log(spot / strike) + (rate + 0.5 * sigma * sigma) * t) / vol_t
+    return d1, d1 - vol_t
+
+def bs_price(spot, strike, t, rate, sigma, is_call):
+    d1, d2 = _d1_d2(spot, strike, t, rate, sigma)
+    disc = strike * np.exp(-rate * t)
+    call = spot * norm_cdf(d1) - disc * norm_cdf(d2)
+    return np.where(is_call, call, call - spot + disc)  # Put via parity
+
+def bs_greeks(spot, strike, t, rate, sigma, is_call):
+    """(delta, gamma, vega) per contract; vega is per 1.00 (100 vol points) change in sigma."""
+    d1, _ = _d1_d2(spot, strike, t, rate, sigma)
+    pdf = norm_pdf(d1)
+    delta = np.where(is_call, norm_cdf(d1), norm_cdf(d1) - 1.0)
+    gamma = pdf / (spot * sigma * np.sqrt(t))
+    vega = spot * pdf * np.sqrt(t)
+    return delta, gamma, vega
+
+def implied_vol(price, spot, strike, t, rate, is_call, max_iter: int = IV_MAX_ITER, tol: float = IV_TOL) -> np.ndarray:
+    """Solve sigma for every row at once; NaN where the price violates no-arbitrage bounds or doesn't converge."""
+    price, spot, strike, t = (np.asarray(v, dtype=np.float64) for v in (price, spot, strike, t))
+    disc = strike * np.exp(-rate * t)
+    lower = np.where(is_call, np.maximum(spot - disc, 0.0), np.maximum(disc - spot, 0.0))
+    upper = np.where(is_call, spot, disc)
+    valid = (price > lower) & (price < upper)
+    lo = np.full(price.shape, IV_LOW)
+    hi = np.full(price.shape, IV_HIGH)
+    sigma = np.full(price.shape, 0.5)
+    done = ~valid
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        for _ in range(max_iter):
+            active = ~done
+            if not active.any():
+                break
+            s, k, tt, sig, ic = spot[active], strike[active], t[active], sigma[active], is_call[active]
+            diff = bs_price(s, k, tt, rate, sig, ic) - price[active]
+            converged = np.abs(diff) < tol
+            # Shrink the bracket around the root, then take Newton where it stays inside, else bisect
+            hi[active] = np.where(diff > 0, sig, hi[active])
+            lo[active] = np.where(diff <= 0, sig, lo[active])
+            _, _, vega = bs_greeks(s, k, tt, rate, sig, ic)
+            newton = sig - diff / vega
+            inside = np.isfinite(newton) & (newton > lo[active]) & (newton < hi[active])
+            step = np.where(inside, newton, 0.5 * (lo[active] + hi[active]))
+            sigma[active] = np.where(converged, sig, step)
+            done[active] = converged | (hi[active] - lo[active] < 1e-10)
+    return np.where(valid & done, sigma, np.nan)
+
+def create_greeks_schema(cursor):
+    # Keyed like options_facts, so it joins straight onto the contract layout
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS options_greeks (
+        date_ordinal INTEGER NOT NULL,
+        contract_id INTEGER NOT NULL,
+        underlying_price REAL NOT NULL,
+        t_years REAL NOT NULL,
+        iv REAL,
+        realized_vol REAL,
+        iv_source TEXT NOT NULL,
+        delta REAL,
+        gamma REAL,
+        vega REAL,
+        computed_at TEXT NOT NULL,
+        PRIMARY KEY (date_ordinal, contract_id)
+    ) WITHOUT ROWID
+    ''')
+    if 'realized_vol' not in [r[1] for r in cursor.execute('PRAGMA table_info(options_greeks)').fetchall()]:
+        # Older tables stored the realized-vol fallback in iv; move it to its own column
+        cursor.execute('ALTER TABLE options_greeks ADD COLUMN realized_vol REAL')
+        cursor.execute("UPDATE options_greeks SET realized_vol = iv, iv = NULL WHERE iv_source = 'realized'")
+    # Dates attempted without producing a row, so pending_ordinals() stops returning them
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS options_greeks_skipped (
+        ticker TEXT NOT NULL,
+        date_ordinal INTEGER NOT NULL,
+        attempted_at TEXT NOT NULL,
+        PRIMARY KEY (ticker, date_ordinal)
+    ) WITHOUT ROWID
+    ''')
+
+def load_underlying(ticker: str, stock_db_path: str = STOCK_DB_PATH) -> pd.DataFrame:
+    """Daily close and trailing realized vol by date ordinal (days since 1970-01-01)."""
+    conn = sqlite3.connect(stock_db_path)
+    df = pd.read_sql_query('''
+    SELECT substr(Date, 1, 10) AS date, Close AS close, "Adj Close" AS adj_close
+    FROM historical WHERE ticker = ? ORDER BY Date
+    ''', conn, params=(ticker,))
+    conn.close()
+    df['ordinal'] = (pd.to_datetime(df['date']) - pd.Timestamp('1970-01-01')).dt.days
+    log_ret = np.log(df['adj_close']).diff()
+    df['realized_vol'] = log_ret.rolling(REALIZED_VOL_WINDOW, min_periods=5).std() * np.sqrt(252)
+    return df[['ordinal', 'close', 'realized_vol']].dropna(subset=['close'])
+
+def compute_chunk(db_path: str, stock_db_path: str, ticker: str, ordinals: list, rate: float = RISK_FREE_RATE) -> pd.DataFrame:
+    """IV and Greeks for every contract of `ticker` on the given date ordinals (runs in a worker process)."""
+    underlying = load_underlying(ticker, stock_db_path)
+    conn = sqlite3.connect(db_path)
+    placeholders = ', '.join('?' * len(ordinals))
+    rows = pd.read_sql_query(f'''
+    SELECT f.date_ordinal, f.contract_id, c.put_call, c.strike_price,
+           CAST(julianday(c.expiration_date) - 2440587.5 AS INTEGER) AS expiry_ordinal,
+           f.last_price, f.bid, f.ask
+    FROM options_facts f
+    JOIN option_contracts c ON c.contract_id = f.contract_id
+    WHERE c.ticker = ? AND f.date_ordinal IN ({placeholders})
+    ''', conn, params=(ticker, *ordinals))
+    conn.close()
+    if rows.empty or underlying.empty:
+        return pd.DataFrame()
+    # Underlying as of each snapshot date: last close on or before it
+    pos = np.searchsorted(underlying['ordinal'].to_numpy(), rows['date_ordinal'].to_numpy(), side='right') - 1
+    days = (rows['expiry_ordinal'] - rows['date_ordinal']).to_numpy()
+    keep = (pos >= 0) & (days >= 0) & (rows['strike_price'].to_numpy() > 0)
+    rows, pos, days = rows[keep].reset_index(drop=True), pos[keep], days[keep]
+    spot = underlying['close'].to_numpy()[pos]
+    realized = underlying['realized_vol'].to_numpy()[pos]
+    strike = rows['strike_price'].to_numpy(dtype=np.float64)
+    t = np.maximum(days, 1) / 365.0  # Same-day expiries priced with one day left
+    is_call = (rows['put_call'] == 'C').to_numpy()
+    bid, ask = rows['bid'].fillna(0).to_numpy(), rows['ask'].fillna(0).to_numpy()
+    last = rows['last_price'].fillna(0).to_numpy()
+    price = np.where((bid > 0) & (ask > 0), 0.5 * (bid + ask), last)
+    iv = np.full(len(rows), np.nan)
+    priced = price > 0
+    if priced.any():
+        iv[priced] = implied_vol(price[priced], spot[priced], strike[priced], t[priced], rate, is_call[priced])
+    market = np.isfinite(iv)
+    sigma = np.where(market, iv, realized)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        delta, gamma, vega = bs_greeks(spot, strike, t, rate, sigma, is_call)
+    df = pd.DataFrame({
+        'date_ordinal': rows['date_ordinal'].to_numpy(), 'contract_id': rows['contract_id'].to_numpy(),
+        'underlying_price': spot, 't_years': t, 'iv': iv, 'realized_vol': realized,
+        'iv_source': np.where(market, 'market', 'realized'),
+        'delta': delta, 'gamma': gamma, 'vega': vega,
+    })
+    return df[np.isfinite(delta)].reset_index(drop=True)  # No market IV and NaN realized vol: nothing to price with
+
+def pending_ordinals(conn, ticker: str, recompute: bool = False) -> list:
+    sql = 'SELECT date_ordinal FROM options_loads WHERE ticker = ?'
+    if not recompute:
+        sql += '''
+        AND NOT EXISTS (
+            SELECT 1 FROM options_greeks g JOIN option_contracts c ON c.contract_id = g.contract_id
+            WHERE g.date_ordinal = options_loads.date_ordinal AND c.ticker = options_loads.ticker
+              AND g.delta IS NOT NULL  -- NULL-Greek rows from older runs don't count as computed
+        )
+        AND NOT EXISTS (
+            SELECT 1 FROM options_greeks_skipped s
+            WHERE s.ticker = options_loads.ticker AND s.date_ordinal = options_loads.date_ordinal
+        )'''
+    return [r[0] for r in conn.execute(sql + ' ORDER BY date_ordinal', (ticker,)).fetchall()]
+
+def write_greeks(conn, ticker: str, ordinals: list, df: pd.DataFrame) -> int:
+    """Store one chunk and commit, so worker reads never wait on a long-held write lock.
+
+    Dates of the chunk without any computed row are recorded in options_greeks_skipped, and
+    NULL-Greek rows left by older runs are dropped for every date of the chunk.
+    """
+    now = datetime.now().isoformat()
+    computed = set(df['date_ordinal'].tolist()) if not df.empty else set()
+    skipped = [o for o in ordinals if o not in computed]
+    if skipped:
+        logger.warning(f"{ticker}: no Greeks for {len(skipped)} date(s) (no underlying close, no live contracts "
+                       f"or no volatility); "
+                       f"marked skipped")
+    try:
+        conn.executemany('''
+        DELETE FROM options_greeks WHERE date_ordinal = ? AND delta IS NULL
+        AND contract_id IN (SELECT contract_id FROM option_contracts WHERE ticker = ?)
+        ''', [(o, ticker) for o in ordinals])
+        conn.executemany('DELETE FROM options_greeks_skipped WHERE ticker = ? AND date_ordinal = ?',
+                         [(ticker, o) for o in computed])
+        conn.executemany('INSERT OR REPLACE INTO options_greeks_skipped VALUES (?, ?, ?)',
+                         [(ticker, o, now) for o in skipped])
+        if not df.empty:
+            bulk_write(conn, 'options_greeks', df.assign(computed_at=now), key=['date_ordinal', 'contract_id'],
+                       update=[c for c in df.columns if c not in ('date_ordinal', 'contract_id')] + ['computed_at'],
+                       commit=False)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return len(df)
+
+def run(ticker: str = 'GME', workers: int = GREEKS_WORKERS, recompute: bool = False,
+        db_path: str = DB_PATH, stock_db_path: str = STOCK_DB_PATH) -> int:
+    """Compute and store Greeks for every pending date of `ticker`; returns rows written."""
+    conn = sqlite3.connect(db_path)
+    create_greeks_schema(conn.cursor())
+    conn.commit()
+    ordinals = pending_ordinals(conn, ticker, recompute)
+    if not ordinals:
+        logger.info(f"{ticker}: options_greeks is up to date.")
+        conn.close()
+        return 0
+    chunks = [ordinals[i:i + DATES_PER_TASK] for i in range(0, len(ordinals), DATES_PER_TASK)]
+    logger.info(f"{ticker}: computing Greeks for {len(ordinals)} dates in {len(chunks)} chunks on {workers} worker(s)")
+    written = 0
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(compute_chunk, *zip(*[(db_path, stock_db_path, ticker, c) for c in chunks]))
+            for chunk, df in zip(chunks, results):
+                written += write_greeks(conn, ticker, chunk, df)
+    else:
+        for chunk in chunks:
+            written += write_greeks(conn, ticker, chunk, compute_chunk(db_path, stock_db_path, ticker, chunk))
+    conn.close()
+    return written
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ticker', default='GME')
+    parser.add_argument('--workers', type=int, default=GREEKS_WORKERS)
+    parser.add_argument('--recompute', action='store_true', help='Recompute dates already in options_greeks or skipped')
+    args = parser.parse_args()
+    start = time.time()
+    rows = run(args.ticker, args.workers, args.recompute)
+    logger.info(f"{args.ticker}: wrote {rows:,} options_greeks rows in {time.time() - start:.1f}s")
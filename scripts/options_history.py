@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Delta-encoded open-interest history, an optional alternative to one full
+options_data row per contract per day (OPTIONS_STORAGE=delta).
+
+Each snapshot only writes the contracts whose open interest changed, as
+intervals in options_oi_intervals: a row holds one OI value over
+[valid_from, valid_to), with valid_to NULL while it is still current.
+options_snapshots records which dates were pulled per ticker, so a day's full
+chain is every interval covering it; the options_history view exposes that in
+the options_data column layout.
+
+Example:
+    from options_history import get_chain_snapshot
+    df = get_chain_snapshot('GME', '2025-06-02')
+
+Backfill from existing options_data rows (from repo root):
+    python scripts/options_history.py [path/to/gme_data.db]
+"""
+import logging
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from options_rollups import create_rollup_schema, write_expiry_stats
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = os.path.join('data', 'gme_data.db')
+OPTIONS_STORAGE = os.getenv('OPTIONS_STORAGE', 'full').lower()  # 'full' (options_data rows) or 'delta' (intervals)
+
+def create_history_schema(cursor):
+    """Create the interval table, snapshot calendar and the options_history view."""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS options_snapshots (
+        ticker TEXT NOT NULL,
+        date TEXT NOT NULL,
+        contracts INTEGER NOT NULL,
+        changed INTEGER NOT NULL,
+        source TEXT NOT NULL,
+        ingest_timestamp TEXT NOT NULL,
+        PRIMARY KEY (ticker, date)
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS options_oi_intervals (
+        ticker TEXT NOT NULL,
+        contract_symbol TEXT NOT NULL,
+        put_call TEXT,
+        strike_price REAL,
+        expiration_date TEXT,
+        open_interest INTEGER,
+        valid_from TEXT NOT NULL,
+        valid_to TEXT
+    )
+    ''')
+    # Open intervals are what each new snapshot is diffed against
+    cursor.execute('''
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_oi_intervals_open
+    ON options_oi_intervals (ticker, contract_symbol) WHERE valid_to IS NULL
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_oi_intervals_from ON options_oi_intervals (ticker, valid_from)')
+    # Same columns as options_data; volume/prices are the fetcher's zero placeholders
+    cursor.execute('''
+    CREATE VIEW IF NOT EXISTS options_history AS
+    SELECT s.date, i.ticker, i.contract_symbol, i.put_call, i.strike_price, i.expiration_date, i.open_interest,
+           0 AS volume, 0.0 AS last_price, 0.0 AS bid, 0.0 AS ask, s.source, s.ingest_timestamp
+    FROM options_snapshots s
+    JOIN options_oi_intervals i ON i.ticker = s.ticker AND i.valid_from <= s.date
+                                AND (i.valid_to IS NULL OR i.valid_to > s.date)
+    ''')
+    create_rollup_schema(cursor)
+
+def init_history_db(db_path: str = DB_PATH):
+    conn = sqlite3.connect(db_path)
+    create_history_schema(conn.cursor())
+    conn.commit()
+    conn.close()
+    logger.info("Options history tables initialized.")
+
+def ingest_snapshot(conn, df: pd.DataFrame) -> int:
+    """Diff one ticker's daily chain against the open intervals and write only the changes; returns rows written.
+
+    Snapshots must arrive in date order per ticker; an older or repeated date is skipped.
+    """
+    if df.empty:
+        logger.warning("Empty DataFrame for options history, skipping.")
+        return 0
+    ticker = df['ticker'].iloc[0]
+    snap_date = pd.to_datetime(df['date'].max()).strftime('%Y-%m-%d')
+    last = conn.execute('SELECT MAX(date) FROM options_snapshots WHERE ticker = ?', (ticker,)).fetchone()[0]
+    if last is not None and snap_date <= last:
+        logger.warning(f"{ticker}: Snapshot {snap_date} is not after the last stored one ({last}), skipping.")
+        return 0
+    chain = df.drop_duplicates('contract_symbol', keep='last')
+    rows = chain[['contract_symbol', 'put_call', 'strike_price', 'expiration_date', 'open_interest']].astype(object)
+    rows = rows.where(rows.notna(), None)
+    try:
+        conn.execute('''
+        CREATE TEMP TABLE IF NOT EXISTS oi_stage (
+            contract_symbol TEXT PRIMARY KEY, put_call TEXT, strike_price REAL, expiration_date TEXT, open_interest INTEGER
+        )
+        ''')
+        conn.execute('DELETE FROM oi_stage')
+        conn.executemany('INSERT OR REPLACE INTO oi_stage VALUES (?, ?, ?, ?, ?)', rows.itertuples(index=False, name=None))
+        # Close intervals whose contract vanished or whose OI moved...
+        closed = conn.execute('''
+        UPDATE options_oi_intervals SET valid_to = ?
+        WHERE ticker = ? AND valid_to IS NULL AND NOT EXISTS (
+            SELECT 1 FROM oi_stage s
+            WHERE s.contract_symbol = options_oi_intervals.contract_symbol
+              AND s.open_interest IS options_oi_intervals.open_interest
+        )
+        ''', (snap_date, ticker)).rowcount
+        # ...then open one for every contract left without a current interval
+        opened = conn.execute('''
+        INSERT INTO options_oi_intervals
+            (ticker, contract_symbol, put_call, strike_price, expiration_date, open_interest, valid_from, valid_to)
+        SELECT ?, s.contract_symbol, s.put_call, s.strike_price, s.expiration_date, s.open_interest, ?, NULL
+        FROM oi_stage s
+        WHERE NOT EXISTS (
+            SELECT 1 FROM options_oi_intervals i
+            WHERE i.ticker = ? AND i.contract_symbol = s.contract_symbol AND i.valid_to IS NULL
+        )
+        ''', (ticker, snap_date, ticker)).rowcount
+        conn.execute('INSERT INTO options_snapshots VALUES (?, ?, ?, ?, ?, ?)',
+                     (ticker, snap_date, len(chain), opened, str(df['source'].iloc[0]), datetime.now().isoformat()))
+        conn.execute('DELETE FROM oi_stage')
+        write_expiry_stats(conn, chain.assign(date=snap_date))
+        conn.commit()
+        logger.info(f"options_history: {ticker} {snap_date} | {len(chain)} contracts, "
+                    f"{opened} changed/new, {closed} closed")
+        return opened
+    except Exception as e:
+        logger.error(f"Options history insert failed for {ticker} {snap_date}: {e}")
+        conn.rollback()
+        return 0
+
+def get_chain_snapshot(ticker: str, date: str, conn=None, db_path: str = DB_PATH) -> pd.DataFrame:
+    """Full chain for one ticker as of `date` (the latest stored snapshot on or before it), options_data columns."""
+    own = conn is None
+    conn = conn or sqlite3.connect(db_path)
+    date = pd.to_datetime(date).strftime('%Y-%m-%d')
+    snap = conn.execute('SELECT MAX(date) FROM options_snapshots WHERE ticker = ? AND date <= ?', (ticker, date)).fetchone()[0]
+    if snap is None:
+        if own:
+            conn.close()
+        return pd.DataFrame()
+    df = pd.read_sql_query('''
+    SELECT * FROM options_history WHERE ticker = ? AND date = ? ORDER BY expiration_date, strike_price, put_call
+    ''', conn, params=(ticker, snap))
+    if own:
+        conn.close()
+    return df
+
+def backfill_from_options_data(conn) -> int:
+    """Replay every (ticker, date) already in options_data, oldest first; returns snapshots ingested."""
+    create_history_schema(conn.cursor())
+    done = set(conn.execute('SELECT ticker, date FROM options_snapshots').fetchall())
+    keys = [k for k in conn.execute('SELECT DISTINCT ticker, date FROM options_data ORDER BY date, ticker').fetchall()
+            if k not in done]
+    for ticker, day in keys:
+        df = pd.read_sql_query('SELECT * FROM options_data WHERE ticker = ? AND date = ?', conn, params=(ticker, day))
+        ingest_snapshot(conn, df)
+    return len(keys)
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    db_path = sys.argv[1] if len(sys.argv) > 1 else DB_PATH
+    start = time.time()
+    conn = sqlite3.connect(db_path)
+    snapshots = backfill_from_options_data(conn)
+    full_rows = conn.execute('SELECT COUNT(*) FROM options_data').fetchone()[0]
+    intervals = conn.execute('SELECT COUNT(*) FROM options_oi_intervals').fetchone()[0]
+    conn.close()
+    logger.info(f"{db_path}: backfilled {snapshots:,} snapshots in {time.time() - start:.1f}s | "
+                f"{full_rows:,} options_data rows -> {intervals:,} intervals")
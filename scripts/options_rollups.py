@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Per-expiry open-interest aggregates, materialized at ingest into
+options_expiry_stats: call/put OI, put/call ratio, OI-weighted strike and
+max-pain strike for each (ticker, date, expiration_date).
+
+database.insert_options_data() and options_history.ingest_snapshot() call
+write_expiry_stats() for the dates they just stored, inside the same
+transaction, so the rollup never disagrees with the chain.
+
+Example:
+    from options_rollups import get_expiry_stats, get_daily_totals
+    df = get_expiry_stats('GME', start='2025-01-01')
+
+Backfill every stored date (from repo root):
+    python scripts/options_rollups.py [path/to/gme_data.db]
+"""
+import logging
+import os
+import sqlite3
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = os.path.join('data', 'gme_data.db')
+
+STATS_COLUMNS = ['ticker', 'date', 'expiration_date', 'call_oi', 'put_oi', 'put_call_ratio',
+                 'oi_weighted_strike', 'max_pain_strike', 'contracts']
+
+def create_rollup_schema(cursor):
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS options_expiry_stats (
+        ticker TEXT NOT NULL,
+        date TEXT NOT NULL,
+        expiration_date TEXT NOT NULL,
+        call_oi INTEGER NOT NULL,
+        put_oi INTEGER NOT NULL,
+        put_call_ratio REAL,
+        oi_weighted_strike REAL,
+        max_pain_strike REAL,
+        contracts INTEGER NOT NULL,
+        PRIMARY KEY (ticker, date, expiration_date)
+    ) WITHOUT ROWID
+    ''')
+
+def compute_expiry_stats(chain: pd.DataFrame) -> pd.DataFrame:
+    """Aggregate one or more (ticker, date) chains to one row per expiration (STATS_COLUMNS)."""
+    if chain.empty:
+        return pd.DataFrame(columns=STATS_COLUMNS)
+    keys = ['ticker', 'date', 'expiration_date']
+    oi = chain['open_interest'].fillna(0).astype('int64')
+    is_call = (chain['put_call'] == 'C').to_numpy()
+    # Per-strike call and put OI, sorted by strike within each expiry
+    strikes = pd.DataFrame({
+        'ticker': chain['ticker'].to_numpy(), 'date': chain['date'].to_numpy(),
+        'expiration_date': chain['expiration_date'].to_numpy(), 'strike': chain['strike_price'].astype('float64').to_numpy(),
+        'c': np.where(is_call, oi, 0), 'p': np.where(is_call, 0, oi),
+    }).groupby(keys + ['strike'], sort=True)[['c', 'p']].sum().reset_index()
+    strikes['ck'] = strikes['c'] * strikes['strike']
+    strikes['pk'] = strikes['p'] * strikes['strike']
+    grouped = strikes.groupby(keys, sort=False)
+    # Max pain: total writer payout if price settles at each listed strike K, via running sums:
+    #   calls below K pay K*sum(c) - sum(c*k); puts above K pay sum(p*k) - K*sum(p)
+    cum = grouped[['c', 'ck', 'p', 'pk']].cumsum()
+    tot = grouped[['p', 'pk']].transform('sum')
+    k = strikes['strike']
+    call_pain = k * cum['c'] - cum['ck']
+    put_pain = (tot['pk'] - cum['pk'] + strikes['pk']) - k * (tot['p'] - cum['p'] + strikes['p'])
+    strikes['pain'] = call_pain + put_pain
+    max_pain = strikes.loc[strikes.groupby(keys, sort=False)['pain'].idxmin(), keys + ['strike']]
+    stats = grouped.agg(call_oi=('c', 'sum'), put_oi=('p', 'sum'), ck=('ck', 'sum'), pk=('pk', 'sum')).reset_index()
+    stats = stats.merge(max_pain.rename(columns={'strike': 'max_pain_strike'}), on=keys, how='left')
+    total = stats['call_oi'] + stats['put_oi']
+    stats['put_call_ratio'] = (stats['put_oi'] / stats['call_oi'].where(stats['call_oi'] > 0)).astype('float64')
+    stats['oi_weighted_strike'] = ((stats['ck'] + stats['pk']) / total.where(total > 0)).astype('float64')
+    stats['contracts'] = chain.groupby(keys, sort=False).size().reindex(pd.MultiIndex.from_frame(stats[keys])).to_numpy()
+    return stats[STATS_COLUMNS]
+
+def write_expiry_stats(conn, chain: pd.DataFrame) -> int:
+    """Replace the rollup rows for every (ticker, date) in `chain`; no commit, the caller owns the transaction."""
+    stats = compute_expiry_stats(chain)
+    for ticker, day in chain[['ticker', 'date']].drop_duplicates().itertuples(index=False, name=None):
+        conn.execute('DELETE FROM options_expiry_stats WHERE ticker = ? AND date = ?', (ticker, day))
+    rows = stats.astype(object).where(stats.notna(), None)
+    conn.executemany(f"INSERT INTO options_expiry_stats VALUES ({', '.join('?' * len(STATS_COLUMNS))})",
+                     rows.itertuples(index=False, name=None))
+    return len(stats)
+
+def get_expiry_stats(ticker: str, start: str = '1900-01-01', end: str = '9999-12-31', expirations=None,
+                     db_path: str = DB_PATH) -> pd.DataFrame:
+    """Rollup rows for one ticker over [start, end], optionally limited to some expirations."""
+    sql = 'SELECT * FROM options_expiry_stats WHERE ticker = ? AND date BETWEEN ? AND ?'
+    params = [ticker, start, end]
+    if expirations is not None:
+        expirations = [expirations] if isinstance(expirations, str) else list(expirations)
+        sql += f" AND expiration_date IN ({', '.join('?' * len(expirations))})"
+        params += expirations
+    conn = sqlite3.connect(db_path)
+    df = pd.read_sql_query(sql + ' ORDER BY date, expiration_date', conn, params=params)
+    conn.close()
+    return df
+
+def get_daily_totals(ticker: str, start: str = '1900-01-01', end: str = '9999-12-31', db_path: str = DB_PATH) -> pd.DataFrame:
+    """Whole-chain call/put OI and put/call ratio per date for one ticker."""
+    conn = sqlite3.connect(db_path)
+    df = pd.read_sql_query('''
+    SELECT date, SUM(call_oi) AS call_oi, SUM(put_oi) AS put_oi,
+           CAST(SUM(put_oi) AS REAL) / NULLIF(SUM(call_oi), 0) AS put_call_ratio, COUNT(*) AS expirations
+    FROM options_expiry_stats WHERE ticker = ? AND date BETWEEN ? AND ?
+    GROUP BY date ORDER BY date
+    ''', conn, params=(ticker, start, end))
+    conn.close()
+    return df
+
+def backfill(conn, table: str = 'options_data') -> int:
+    """Rebuild the rollup for every (ticker, date) in `table` (options_data or options_history)."""
+    create_rollup_schema(conn.cursor())
+    keys = conn.execute(f'SELECT DISTINCT ticker, date FROM {table} ORDER BY date, ticker').fetchall()
+    for ticker, day in keys:
+        chain = pd.read_sql_query(f'''
+        SELECT ticker, date, expiration_date, put_call, strike_price, open_interest FROM {table}
+        WHERE ticker = ? AND date = ?
+        ''', conn, params=(ticker, day))
+        write_expiry_stats(conn, chain)
+        conn.commit()
+    return len(keys)
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    db_path = sys.argv[1] if len(sys.argv) > 1 else DB_PATH
+    start = time.time()
+    conn = sqlite3.connect(db_path)
+    dates = backfill(conn)
+    conn.close()
+    logger.info(f"{db_path}: rebuilt options_expiry_stats for {dates:,} (ticker, date) chains in {time.time() - start:.1f}s")
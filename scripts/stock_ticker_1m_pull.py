@@ -1,133 +1,186 @@
 import time
 import logging
-import yfinance as yf
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone  # Added timezone
 import os
 import sqlite3
 import sys  # For StreamHandler
+from throttle import RateLimiter
+from bars_1m import create_bars_schema, last_minutes, migrate_legacy_bars, to_epoch_minutes, write_bars
 
 # Suppress yfinance logging
 logging.getLogger('yfinance').setLevel(logging.WARNING)
 
-# Logging setup: Manual handlers only (no basicConfig to avoid dupes)
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
 
-# File handler (shared cron log)
-file_handler = logging.FileHandler('logs/fetcher_cron.log', mode='a')
-file_handler.setLevel(logging.INFO)
-file_formatter = logging.Formatter('%(asctime)s - %(message)s')
-file_handler.setFormatter(file_formatter)
-logger.addHandler(file_handler)
-
-# Console handler (for cron >> per-script log)
-console_handler = logging.StreamHandler(sys.stdout)
-console_handler.setLevel(logging.INFO)
-console_formatter = logging.Formatter('%(asctime)s - %(message)s')
-console_handler.setFormatter(console_formatter)
-logger.addHandler(console_handler)
-
-# Start timer
-start_time = time.time()
 DATA_DIR = "data"
 DB_PATH = os.path.join(DATA_DIR, "stock_ticker_1m_data.db")
-os.makedirs(DATA_DIR, exist_ok=True)
-TICKERS = ["GME", "KOSS"]
-now_utc = datetime.now(timezone.utc)  # UTC-aware "now"
-conn = sqlite3.connect(DB_PATH)
-# conn.execute("DROP TABLE IF EXISTS historical_1m")  # Comment out after first successful run!
-conn.execute("""
-CREATE TABLE IF NOT EXISTS historical_1m (
-    Datetime TEXT,
-    ticker TEXT NOT NULL,
-    Open REAL,
-    High REAL,
-    Low REAL,
-    Close REAL,
-    Volume INTEGER,
-    PRIMARY KEY (Datetime, ticker)
-)
-""")
-conn.commit()
+TICKERS = [t.strip() for t in os.getenv('TICKERS_1M', 'GME,KOSS').split(',') if t.strip()]  # Tolerates 'GME, KOSS' and trailing commas
+MAX_LOOKBACK = timedelta(days=7)  # yfinance only serves 1m bars for the last 7 days
+YF_BATCH_SIZE = int(os.getenv('YF_BATCH_SIZE', '50'))  # Tickers per yf.download call
+YF_WORKERS = int(os.getenv('YF_WORKERS', '4'))  # Batches downloaded concurrently
+YF_MAX_RPS = float(os.getenv('YF_MAX_RPS', '2'))  # Global request cap across workers
+BACKFILL_GAPS = os.getenv('BACKFILL_1M_GAPS', 'true').lower() == 'true'  # Also refetch holes inside the 1m window
+BAR_CACHE = os.getenv('BAR_CACHE', 'true').lower() == 'true'  # Keep the memory-mapped bar cache (bar_cache.py) current
+BAR_COLUMNS = ['ticker', 'epoch_minute', 'Open', 'High', 'Low', 'Close', 'Volume']
+
+def setup_logging():
+    """Manual handlers only (no basicConfig to avoid dupes)."""
+    logger.setLevel(logging.INFO)
+    logger.propagate = False  # Own handlers only (imported modules may configure the root logger)
+    # File handler (shared cron log)
+    file_handler = logging.FileHandler('logs/fetcher_cron.log', mode='a')
+    file_handler.setLevel(logging.INFO)
+    file_handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
+    logger.addHandler(file_handler)
+    # Console handler (for cron >> per-script log)
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setLevel(logging.INFO)
+    console_handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
+    logger.addHandler(console_handler)
 
-# One-time index creation (safe to run every time; placed BEFORE any data processing)
-cursor = conn.cursor()
-cursor.execute("SELECT name FROM sqlite_master WHERE type='index' AND name='idx_ticker_datetime';")
-if not cursor.fetchone():
-    logger.info("Creating index idx_ticker_datetime for query performance...")
-    cursor.execute("CREATE INDEX idx_ticker_datetime ON historical_1m(ticker, Datetime);")
+def init_db(conn):
+    migrate_legacy_bars(conn)
+    create_bars_schema(conn)
     conn.commit()
-    logger.info("Index created successfully.")
-cursor.close()  # Clean up cursor
 
-errors = []
-total_new_rows = 0
-for ticker in TICKERS:
-    try:
-        logger.info(f"\n--- Processing {ticker} ---")
-        last_row = pd.read_sql("SELECT MAX(Datetime) as last_date FROM historical_1m WHERE ticker=?", conn, params=(ticker,))
-        if not last_row.empty and pd.notna(last_row['last_date'].iloc[0]):
-            # Ensure scalar extraction
-            last_date_scalar = last_row['last_date'].iloc[0]
-            last_dt = pd.to_datetime(last_date_scalar, utc=True)
-            start_dt = last_dt + timedelta(minutes=1)
-            logger.info(f"Last DB datetime for {ticker}: {last_dt}. Fetching from next minute.")
-            fetch_method = "start_end"
-        else:
-            logger.info(f"No data for {ticker}. Fetching last 7 days via period='7d' (API-safe).")
-            fetch_method = "period"
-        logger.info(f"Current UTC time: {now_utc}")
-        if fetch_method == "period":
-            data_new = yf.download(ticker, period="7d", interval="1m", auto_adjust=False, progress=False)
+def last_datetimes(conn, tickers) -> dict:
+    """{ticker: last stored bar as UTC Timestamp} in one query; tickers with no rows are absent."""
+    return {t: pd.Timestamp(m * 60, unit='s', tz='UTC') for t, m in last_minutes(conn, tickers).items()}
+
+def plan_batches(tickers, last_dts: dict, now_utc: datetime, batch_size: int = YF_BATCH_SIZE) -> list:
+    """Group tickers sharing a fetch start into [(start or None for period='7d', [tickers])] of at most batch_size."""
+    groups = {}
+    for ticker in tickers:
+        last_dt = last_dts.get(ticker)
+        if last_dt is None:
+            start_dt = None
         else:
-            # Cap to avoid API limits
-            delta = (now_utc - start_dt).days
-            if delta > 7:
-                start_dt = now_utc - timedelta(days=7)
-                logger.info(f"Capping fetch for {ticker} to last 7 days due to API limits.")
+            start_dt = max(last_dt + timedelta(minutes=1), now_utc - MAX_LOOKBACK)  # Cap to avoid API limits
             # If start > now, no new data—skip fetch
             if start_dt > now_utc:
                 logger.info(f"Start ({start_dt}) after now ({now_utc}) for {ticker}—no new data.")
                 continue
-            logger.info(f"Fetching data for {ticker} from {start_dt} to {now_utc}...")
-            data_new = yf.download(ticker, start=start_dt, end=now_utc, interval="1m", auto_adjust=False, progress=False)
-        
-        logger.info(f"yfinance returned {len(data_new)} raw rows for {ticker}.")
-        if data_new.empty:
-            logger.warning(f"No data returned for {ticker}—check trading days or API availability.")
+        groups.setdefault(start_dt, []).append(ticker)
+    return [(start_dt, members[i:i + batch_size])
+            for start_dt, members in groups.items()
+            for i in range(0, len(members), batch_size)]
+
+def yf_download(tickers: list, start: datetime, end: datetime) -> pd.DataFrame:
+    """One yf.download call for a batch; start=None pulls the full 7-day window via period='7d' (API-safe)."""
+    import yfinance as yf
+    window = {'period': '7d'} if start is None else {'start': start, 'end': end}
+    return yf.download(tickers, interval="1m", auto_adjust=False, progress=False, group_by='ticker',
+                       threads=False, **window)
+
+def split_batch(data: pd.DataFrame, tickers: list) -> dict:
+    """Split a (possibly multi-index) batch result into one bar frame per ticker, in DB column format."""
+    frames = {}
+    if data is None or data.empty:
+        return frames
+    for ticker in tickers:
+        if isinstance(data.columns, pd.MultiIndex):
+            level = next((i for i in range(data.columns.nlevels) if ticker in data.columns.get_level_values(i)), None)
+            if level is None:
+                continue
+            part = data.xs(ticker, axis=1, level=level)
+        elif len(tickers) == 1:
+            part = data
+        else:
             continue
-        
-        if isinstance(data_new.columns, pd.MultiIndex):
-            data_new.columns = data_new.columns.get_level_values(0)
-        data_new['ticker'] = ticker
-        data_new = data_new.reset_index()
-        logger.info(f"Processed shape for {ticker}: {data_new.shape}")
-        logger.info(f"Raw datetime range: {data_new['Datetime'].min()} to {data_new['Datetime'].max()}")
-        logger.info(data_new.head(3).to_string())  # Short preview
-        
-        # Format for DB: Convert to UTC string (drops tz, but parse back with utc=True)
-        data_new['Datetime'] = data_new['Datetime'].dt.tz_convert('UTC').dt.strftime('%Y-%m-%d %H:%M:%S')
-        data_new = data_new[['Datetime', 'Open', 'High', 'Low', 'Close', 'Volume', 'ticker']]
-        
-        logger.info(f"Inserting {len(data_new)} rows into DB...")
-        data_new.to_sql("historical_1m", conn, if_exists="append", index=False)
-        new_rows = len(data_new)
-        total_new_rows += new_rows
-        logger.info(f"Appended {new_rows} new rows for {ticker}.")
-    except Exception as e:
-        error_msg = f"{ticker}: {str(e)}"
-        logger.error(error_msg)
-        errors.append(error_msg)
+        # Batches share one index, so minutes where this ticker didn't trade are all-NaN rows
+        part = part.dropna(how='all')
+        if part.empty:
+            continue
+        part = part.reset_index()
+        part['ticker'] = ticker
+        part['epoch_minute'] = to_epoch_minutes(part[part.columns[0]])  # Naive timestamps are taken as UTC
+        frames[ticker] = part[BAR_COLUMNS]
+    return frames
+
+def download_batches(batches: list, now_utc: datetime, downloader=yf_download, workers: int = YF_WORKERS,
+                     max_rps: float = YF_MAX_RPS):
+    """Yield (batch tickers, {ticker: frame}, error) per batch as downloads complete, on a bounded pool."""
+    limiter = RateLimiter(max_rps)
+
+    def fetch(batch):
+        start_dt, tickers = batch
+        limiter.wait()
+        try:
+            return tickers, split_batch(downloader(tickers, start_dt, now_utc), tickers), None
+        except Exception as e:
+            return tickers, {}, str(e)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        yield from pool.map(fetch, batches)
+
+def run(tickers=TICKERS, db_path: str = DB_PATH, downloader=yf_download, workers: int = YF_WORKERS,
+        batch_size: int = YF_BATCH_SIZE, max_rps: float = YF_MAX_RPS, now_utc: datetime = None,
+        backfill: bool = BACKFILL_GAPS):
+    """Plan, download and store new 1m bars; returns (rows inserted, errors, batches downloaded)."""
+    now_utc = now_utc or datetime.now(timezone.utc)  # UTC-aware "now"
+    conn = sqlite3.connect(db_path)
+    init_db(conn)
+    last_dts = last_datetimes(conn, tickers)
+    gap_batches, gaps = [], None
+    if backfill and last_dts:
+        from minute_gaps import plan_backfill, record_checked
+        # Gap batches run from the earliest hole to now, so they carry those tickers' tail as well
+        gap_batches, gaps = plan_backfill(conn, list(last_dts), now_utc, batch_size)
+        if gap_batches:
+            logger.info(f"Backfilling {len(gaps)} gaps ({gaps['minutes'].sum()} minutes) for "
+                        f"{sum(len(b[1]) for b in gap_batches)} tickers in {len(gap_batches)} batches")
+    gap_tickers = {t for _, members in gap_batches for t in members}
+    batches = plan_batches([t for t in tickers if t not in gap_tickers], last_dts, now_utc, batch_size) + gap_batches
+    logger.info(f"Current UTC time: {now_utc} | {len(tickers)} tickers in {len(batches)} batches on {workers} workers")
+    errors = []
+    frames = []
+    for batch_tickers, per_ticker, error in download_batches(batches, now_utc, downloader, workers, max_rps):
+        if error:
+            error_msg = f"{','.join(batch_tickers)}: {error}"
+            logger.error(error_msg)
+            errors.append(error_msg)
+            continue
+        for ticker in batch_tickers:
+            if ticker not in per_ticker:
+                logger.warning(f"No data returned for {ticker}—check trading days or API availability.")
+                continue
+            df = per_ticker[ticker]
+            first, last = (pd.Timestamp(m * 60, unit='s', tz='UTC') for m in (df['epoch_minute'].min(), df['epoch_minute'].max()))
+            logger.info(f"{ticker}: {len(df)} rows, {first} to {last}")
+            frames.append(df)
+    total_new_rows = write_bars(conn, frames) if frames else 0
+    if frames:
+        from bar_rollups import update_rollups
+        buckets = update_rollups(conn, frames)
+        logger.info(f"Updated {buckets:,} 5m/15m/1h/1d rollup buckets")
+    if frames and BAR_CACHE:
+        from bar_cache import update_cache
+        cache_dir = os.path.join(os.path.dirname(db_path), 'bar_cache')
+        logger.info(f"Refreshed {update_cache(conn, frames, cache_dir=cache_dir):,} cached rows in {cache_dir}")
+    if backfill and last_dts and not errors:
+        record_checked(conn, list(last_dts), now_utc)  # Whatever is still missing now isn't available from the provider
+    conn.close()
+    return total_new_rows, errors, len(batches)
 
-conn.close()  # Close only after everything (including index if needed)
-duration = time.time() - start_time
-status = 'success' if total_new_rows > 0 and not errors else ('warning' if errors else 'error')
-notes = f"Updated {len(TICKERS)} tickers"
-logger.info(f"\n--- Summary: Appended {total_new_rows} total new rows to {DB_PATH} ---")
-logger.info("Ready for Syncthing sync to Windows!")
-try:
-    from cron_logger import log_job_summary
-    log_job_summary('1m Ticker Intraday Data', status, total_new_rows, errors, duration, notes)
-except ImportError:
-    logger.warning("cron_logger not found—skipping summary log.")
+if __name__ == '__main__':
+    setup_logging()
+    # Start timer
+    start_time = time.time()
+    os.makedirs(DATA_DIR, exist_ok=True)
+    try:
+        total_new_rows, errors, batch_count = run()
+    except Exception as e:
+        total_new_rows, errors, batch_count = 0, [str(e)], 0
+        logger.error(f"1m pull failed: {e}")
+    duration = time.time() - start_time
+    status = 'success' if total_new_rows > 0 and not errors else ('warning' if errors else 'error')
+    notes = f"Updated {len(TICKERS)} tickers in {batch_count} batches"
+    logger.info(f"\n--- Summary: Appended {total_new_rows} total new rows to {DB_PATH} ---")
+    logger.info("Ready for Syncthing sync to Windows!")
+    try:
+        from cron_logger import log_job_summary
+        log_job_summary('1m Ticker Intraday Data', status, total_new_rows, errors, duration, notes)
+    except ImportError:
+        logger.warning("cron_logger not found—skipping summary log.")
@@ -1,75 +1,156 @@
+import argparse
 import time
 import logging # Add
-import yfinance as yf
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 import os
 import sqlite3
-# Optional logging (replaces prints)
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s', handlers=[logging.FileHandler('logs/fetcher_cron.log', mode='a')])
+
+from database import bulk_write
+
 logger = logging.getLogger(__name__)
-# Start timer
-start_time = time.time()
+
 DATA_DIR = "data"
 DB_PATH = os.path.join(DATA_DIR, "stock_ticker_data.db")  # Updated DB name
-os.makedirs(DATA_DIR, exist_ok=True)
-TICKERS = ["GME", "KOSS"]
-end_date = datetime.now()
-start_date_full = end_date - timedelta(days=365*10)
-conn = sqlite3.connect(DB_PATH)
-conn.execute("DROP TABLE IF EXISTS historical") # Comment out after first run
-conn.execute("""
-CREATE TABLE historical (
-    Date TEXT,
-    ticker TEXT NOT NULL,
-    Open REAL,
-    High REAL,
-    Low REAL,
-    Close REAL,
-    "Adj Close" REAL,
-    Volume INTEGER,
-    PRIMARY KEY (Date, ticker)
-)
-""")
-conn.commit()
-errors = []
-total_new_rows = 0
-for ticker in TICKERS:
+TICKERS = [t.strip() for t in os.getenv('TICKERS_DAILY', 'GME,KOSS').split(',') if t.strip()]  # Tolerates 'GME, KOSS' and trailing commas
+HISTORY_DAYS = 365 * 10  # Depth of a full (re)fetch
+OVERLAP_SESSIONS = int(os.getenv('DAILY_OVERLAP_SESSIONS', '10'))  # Stored sessions re-downloaded to detect re-adjustment
+ADJ_CLOSE_RTOL = float(os.getenv('ADJ_CLOSE_RTOL', '1e-4'))  # Relative Adj Close change treated as a new split/dividend
+COLUMNS = ['Date', 'ticker', 'Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']
+
+def init_db(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS historical (
+        Date TEXT,
+        ticker TEXT NOT NULL,
+        Open REAL,
+        High REAL,
+        Low REAL,
+        Close REAL,
+        "Adj Close" REAL,
+        Volume INTEGER,
+        PRIMARY KEY (Date, ticker)
+    )
+    """)
+    conn.commit()
+
+def yf_download(ticker: str, start, end) -> pd.DataFrame:
+    import yfinance as yf
+    return yf.download(ticker, start=start, end=end, interval="1d", auto_adjust=False, progress=False)
+
+def normalize(data: pd.DataFrame, ticker: str) -> pd.DataFrame:
+    """yfinance frame -> historical rows (Date as 'YYYY-MM-DD HH:MM:SS' text, as to_sql stored it)."""
+    if data is None or data.empty:
+        return pd.DataFrame(columns=COLUMNS)  # yfinance's answer to a failed download
+    if isinstance(data.columns, pd.MultiIndex):
+        data = data.copy()
+        data.columns = data.columns.get_level_values(0)
+    df = data.reset_index()
+    df['ticker'] = ticker
+    df['Date'] = pd.to_datetime(df['Date']).dt.tz_localize(None).dt.strftime('%Y-%m-%d %H:%M:%S')
+    return df[COLUMNS].dropna(subset=['Close'])
+
+def overlap_window(conn, ticker: str, sessions: int = OVERLAP_SESSIONS) -> pd.DataFrame:
+    """Last `sessions` stored rows (Date, Adj Close) for a ticker, oldest first; empty if it has no history."""
+    return pd.read_sql_query('''
+    SELECT Date, "Adj Close" FROM historical WHERE ticker = ? ORDER BY Date DESC LIMIT ?
+    ''', conn, params=(ticker, sessions)).iloc[::-1].reset_index(drop=True)
+
+def adjustment_changed(stored: pd.DataFrame, fresh: pd.DataFrame, rtol: float = ADJ_CLOSE_RTOL) -> bool:
+    """True if the provider's Adj Close moved on any stored overlap date (new split/dividend), or dates vanished."""
+    merged = stored.merge(fresh[['Date', 'Adj Close']], on='Date', how='left', suffixes=('', '_new'))
+    if merged['Adj Close_new'].isna().any():
+        return True
+    return not np.allclose(merged['Adj Close_new'], merged['Adj Close'], rtol=rtol, atol=0)
+
+def write_rows(conn, df: pd.DataFrame, replace_ticker: str = None) -> int:
+    """Insert rows in one transaction (replace_ticker: delete its history first); returns rows inserted."""
     try:
-        logger.info(f"\n--- Processing {ticker} ---")
-        last_row = pd.read_sql("SELECT MAX(Date) as last_date FROM historical WHERE ticker=?", conn, params=(ticker,))
-        if not last_row.empty and pd.notna(last_row['last_date'].iloc[0]):
-            last_date = pd.to_datetime(last_row['last_date'].iloc[0]).date()
-            logger.info(f"Last DB date for {ticker}: {last_date}. Fetching from next day.")
-            start_date = (pd.to_datetime(last_date) + timedelta(days=1)).date()
-        else:
-            logger.info(f"No data for {ticker}. Fetching full 10 years.")
-            start_date = start_date_full.date()
-        data_new = yf.download(ticker, start=start_date, end=end_date, interval="1d", auto_adjust=False)
-        if data_new.empty:
-            logger.info(f"No new data for {ticker} today.")
-            continue
-        if isinstance(data_new.columns, pd.MultiIndex):
-            data_new.columns = data_new.columns.get_level_values(0)
-        data_new['ticker'] = ticker
-        data_new = data_new.reset_index()
-        data_new = data_new[['Date', 'Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume', 'ticker']]
-        logger.info(data_new.head().to_string()) # Preview
-        logger.info(f"New data for {ticker}: {data_new.shape} (rows x columns)")
-        logger.info(f"New date range: {data_new['Date'].dt.date.min()} to {data_new['Date'].dt.date.max()}")
-        data_new.to_sql("historical", conn, if_exists="append", index=False)
-        new_rows = len(data_new)
-        total_new_rows += new_rows
-        logger.info(f"Appended {new_rows} new rows for {ticker}.")
-    except Exception as e:
-        error_msg = f"{ticker}: {str(e)}"
-        logger.error(error_msg)
-        errors.append(error_msg)
-conn.close()
-duration = time.time() - start_time
-status = 'success' if total_new_rows > 0 and not errors else ('warning' if errors else 'error')
-notes = f"Updated {len(TICKERS)} tickers"
-logger.info(f"\n--- Summary: Appended {total_new_rows} total new rows to {DB_PATH} ---")
-logger.info("Ready for Syncthing sync to Windows!")
-from cron_logger import log_job_summary
-log_job_summary('Ticker Historical Data', status, total_new_rows, errors, duration, notes)
+        if replace_ticker:
+            conn.execute('DELETE FROM historical WHERE ticker = ?', (replace_ticker,))
+        inserted = bulk_write(conn, 'historical', df[COLUMNS], key=['Date', 'ticker'], commit=False)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return inserted
+
+def replace_history(conn, ticker: str, fresh: pd.DataFrame, earliest: str = None) -> int:
+    """Swap a ticker's stored history for a full refetch; refuses (ValueError) a refetch that is empty or
+    doesn't reach back to the earliest stored Date, so a failed download can't erase history."""
+    if fresh.empty:
+        raise ValueError("full refetch returned no rows; stored history kept")
+    if earliest and fresh['Date'].min() > earliest:
+        raise ValueError(f"full refetch starts {fresh['Date'].min()[:10]}, after stored history ({earliest[:10]}); "
+                         f"stored history kept")
+    return write_rows(conn, fresh, replace_ticker=ticker)
+
+def update_ticker(conn, ticker: str, end_date: datetime, downloader=yf_download, full: bool = False):
+    """Append new sessions for one ticker, refetching its full history if adjustments changed; returns (rows, mode)."""
+    earliest = conn.execute('SELECT MIN(Date) FROM historical WHERE ticker = ?', (ticker,)).fetchone()[0]
+    start_full = (end_date - timedelta(days=HISTORY_DAYS)).date()
+    if earliest:
+        start_full = min(start_full, pd.to_datetime(earliest).date())  # A refetch never covers less than is stored
+    stored = pd.DataFrame() if full else overlap_window(conn, ticker)
+    if stored.empty:
+        logger.info(f"No data for {ticker} (or full refresh). Fetching full history from {start_full}.")
+        fresh = normalize(downloader(ticker, start_full, end_date), ticker)
+        return replace_history(conn, ticker, fresh, earliest), 'full'
+    last_date = stored['Date'].iloc[-1]
+    overlap_start = pd.to_datetime(stored['Date'].iloc[0]).date()
+    logger.info(f"Last DB date for {ticker}: {last_date[:10]}. Fetching from {overlap_start} ({len(stored)} sessions overlap).")
+    data = downloader(ticker, overlap_start, end_date)
+    if data is None or data.empty:
+        logger.info(f"No new data for {ticker} today.")
+        return 0, 'unchanged'
+    fresh = normalize(data, ticker)
+    if adjustment_changed(stored, fresh):
+        logger.warning(f"{ticker}: Adj Close changed in the overlap window (split/dividend); refetching full history.")
+        fresh = normalize(downloader(ticker, start_full, end_date), ticker)
+        return replace_history(conn, ticker, fresh, earliest), 'refetched'
+    new = fresh[fresh['Date'] > last_date]
+    if new.empty:
+        logger.info(f"No new data for {ticker} today.")
+        return 0, 'unchanged'
+    logger.info(f"New date range for {ticker}: {new['Date'].min()[:10]} to {new['Date'].max()[:10]}")
+    return write_rows(conn, new), 'appended'
+
+def run(tickers=TICKERS, db_path: str = DB_PATH, downloader=yf_download, end_date: datetime = None, full: bool = False):
+    """Incremental daily update; returns (rows inserted, errors, {ticker: mode})."""
+    end_date = end_date or datetime.now()
+    conn = sqlite3.connect(db_path)
+    init_db(conn)
+    errors, modes, total_new_rows = [], {}, 0
+    for ticker in tickers:
+        try:
+            logger.info(f"\n--- Processing {ticker} ---")
+            rows, modes[ticker] = update_ticker(conn, ticker, end_date, downloader, full)
+            total_new_rows += rows
+            logger.info(f"Wrote {rows} rows for {ticker} ({modes[ticker]}).")
+        except Exception as e:
+            error_msg = f"{ticker}: {str(e)}"
+            logger.error(error_msg)
+            errors.append(error_msg)
+    conn.close()
+    return total_new_rows, errors, modes
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Incremental daily bars for TICKERS_DAILY into stock_ticker_data.db')
+    parser.add_argument('--full', action='store_true', help='Refetch the full history of every ticker')
+    args = parser.parse_args()
+    # Optional logging (replaces prints)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s', handlers=[logging.FileHandler('logs/fetcher_cron.log', mode='a')])
+    logging.getLogger('yfinance').setLevel(logging.WARNING)
+    # Start timer
+    start_time = time.time()
+    os.makedirs(DATA_DIR, exist_ok=True)
+    total_new_rows, errors, modes = run(full=args.full)
+    duration = time.time() - start_time
+    status = 'success' if total_new_rows > 0 and not errors else ('warning' if errors else 'error')
+    refetched = [t for t, m in modes.items() if m in ('full', 'refetched')]
+    notes = f"Updated {len(TICKERS)} tickers" + (f"; full history for {', '.join(refetched)}" if refetched else "")
+    logger.info(f"\n--- Summary: Appended {total_new_rows} total new rows to {DB_PATH} ---")
+    logger.info("Ready for Syncthing sync to Windows!")
+    from cron_logger import log_job_summary
+    log_job_summary('Ticker Historical Data', status, total_new_rows, errors, duration, notes)
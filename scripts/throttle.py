@@ -0,0 +1,101 @@
+import threading
+import time
+import logging
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+class RateLimiter:
+    """Thread-safe global request-rate cap shared by all workers of a job."""
+    def __init__(self, max_per_second: float):
+        self.interval = 1.0 / max_per_second if max_per_second > 0 else 0.0  # <= 0 disables the cap
+        self._lock = threading.Lock()
+        self._next_slot = time.monotonic()
+
+    def wait(self):
+        """Block until the caller may send its next request (slots are evenly spaced, no bursts)."""
+        if self.interval <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` requests/second on average, bursts of up to `burst` back-to-back."""
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate  # <= 0 disables the cap
+        self.capacity = max(1.0, float(burst))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def block_for(self, seconds: float):
+        """Hold every caller for `seconds` (e.g. a server's Retry-After); the bucket restarts empty afterwards."""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+            self._updated = self._blocked_until
+
+    def wait(self):
+        """Block until a token is available, then take it."""
+        if self.rate <= 0 and not self._blocked_until:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    delay = self._blocked_until - now
+                elif self.rate <= 0:
+                    return
+                else:
+                    self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+
+class HostRateLimiter:
+    """One TokenBucket per URL host, created on first use, so each site gets its own budget."""
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, url: str) -> TokenBucket:
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(self.rate, self.burst)
+            return self._buckets[host]
+
+    def wait(self, url: str):
+        self.bucket(url).wait()
+
+    def retry_after(self, url: str, response, default: float = 30.0) -> float:
+        """Pause the host for the response's Retry-After (seconds or HTTP date; `default` if absent); returns the pause."""
+        seconds = parse_retry_after(response.headers.get('Retry-After'), default)
+        logger.warning(f"{urlsplit(url).netloc}: HTTP {response.status_code}, pausing host for {seconds:.0f}s")
+        self.bucket(url).block_for(seconds)
+        return seconds
+
+def parse_retry_after(value, default: float = 30.0) -> float:
+    if not value:
+        return default
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())